@@ -1,3 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from outbox.models import OutboundEmail
+from profiles.models import AuthorStats
+
+User = get_user_model()
+
+
+class RegistrationTests(TestCase):
+    def register(self, **overrides):
+        data = {
+            'username': 'newcomer',
+            'email': 'newcomer@example.com',
+            'first_name': 'New',
+            'last_name': 'Comer',
+            'role': 'author',
+            'password1': 'a-long-test-password',
+            'password2': 'a-long-test-password',
+        }
+        data.update(overrides)
+        return self.client.post(reverse('accounts:register'), data)
+
+    def test_verification_email_is_queued_not_sent(self):
+        response = self.register()
+        self.assertRedirects(response, reverse('accounts:login'), fetch_redirect_response=False)
+        user = User.objects.get(email='newcomer@example.com')
+        self.assertFalse(user.is_active)
+
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, 'queued')
+        self.assertEqual(queued.to, ['newcomer@example.com'])
+        self.assertIn(reverse('accounts:verify_email', kwargs={'token': user.email_verification_token}), queued.body)
+
+    def test_invalid_registration_queues_nothing(self):
+        response = self.register(password2='something-else')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_verification_activates_and_allows_login(self):
+        self.register()
+        user = User.objects.get(email='newcomer@example.com')
+        login = {'username': 'newcomer@example.com', 'password': 'a-long-test-password'}
+        self.assertEqual(self.client.post(reverse('accounts:login'), login).status_code, 200)
+
+        self.client.get(reverse('accounts:verify_email', kwargs={'token': user.email_verification_token}))
+        user.refresh_from_db()
+        self.assertTrue(user.is_active)
+        self.assertTrue(user.is_email_verified)
+        response = self.client.post(reverse('accounts:login'), login)
+        self.assertRedirects(response, reverse('blog:home'), fetch_redirect_response=False)
+
+
+class AuthorDirectoryTests(TestCase):
+    """User changes keep the author directory columns of AuthorStats current"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='writer', email='writer@example.com', password='password', first_name='Wendy',
+        )
+        self.client.force_login(self.user)
+
+    def test_new_users_get_a_stats_row(self):
+        stats = AuthorStats.objects.get(user=self.user)
+        self.assertFalse(stats.is_listed)
+        self.assertEqual(stats.sort_name, 'wendy')
+
+    def test_role_change_lists_the_author(self):
+        self.client.post(reverse('accounts:change_role'), {'role': 'author'})
+        self.assertTrue(AuthorStats.objects.get(user=self.user).is_listed)
+        self.client.post(reverse('accounts:change_role'), {'role': 'nobody'})
+        self.assertTrue(AuthorStats.objects.get(user=self.user).is_listed)
+
+    def test_profile_edit_updates_the_sort_name(self):
+        self.client.post(reverse('accounts:profile'), {
+            'first_name': 'Wendy', 'last_name': 'Writer', 'email': 'writer@example.com',
+        })
+        self.assertEqual(AuthorStats.objects.get(user=self.user).sort_name, 'wendy writer')
+
+    def test_last_login_update_skips_the_directory(self):
+        AuthorStats.objects.filter(user=self.user).update(sort_name='stale')
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(AuthorStats.objects.get(user=self.user).sort_name, 'stale')
@@ -2,10 +2,11 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from outbox.queue import queue_mail
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, UserProfileForm
 import uuid
 
@@ -15,22 +16,22 @@ def register_view(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.is_active = False  # User needs to verify email first
-            user.save()
-            
-            # Send verification email
-            verification_url = request.build_absolute_uri(
-                reverse('accounts:verify_email', kwargs={'token': user.email_verification_token})
-            )
-            
-            send_mail(
-                'Verify your email address',
-                f'Please click the following link to verify your email: {verification_url}',
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=False,
-            )
+            with transaction.atomic():
+                user = form.save(commit=False)
+                user.is_active = False  # User needs to verify email first
+                user.save()
+                
+                # Queue the verification email with the user; the outbox worker delivers it
+                verification_url = request.build_absolute_uri(
+                    reverse('accounts:verify_email', kwargs={'token': user.email_verification_token})
+                )
+                
+                queue_mail(
+                    'Verify your email address',
+                    f'Please click the following link to verify your email: {verification_url}',
+                    settings.DEFAULT_FROM_EMAIL,
+                    [user.email],
+                )
             
             messages.success(request, 'Registration successful! Please check your email to verify your account.')
             return redirect('accounts:login')
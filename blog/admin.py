@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Blog, Category, Favorite, Rating
+from .exports import export_csv, export_jsonl
+from .models import Blog, BlogImport, Category, Favorite, Leaderboard, Rating
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -10,12 +11,14 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Blog)
 class BlogAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'category', 'status', 'views_count', 'created_at', 'published_at')
+    list_display = ('title', 'author', 'category', 'status', 'views_count', 'rating_average', 'rating_count', 'created_at', 'published_at')
     list_filter = ('status', 'category', 'created_at', 'published_at')
     search_fields = ('title', 'body', 'author__username', 'author__email')
     prepopulated_fields = {'slug': ('title',)}
     ordering = ('-created_at',)
+    actions = [export_jsonl, export_csv]
     date_hierarchy = 'created_at'
+    readonly_fields = ('views_count', 'rating_sum', 'rating_count', 'rating_average')
     
     fieldsets = (
         ('Basic Information', {
@@ -25,7 +28,7 @@ class BlogAdmin(admin.ModelAdmin):
             'fields': ('excerpt', 'body', 'featured_image')
         }),
         ('Metadata', {
-            'fields': ('views_count', 'published_at'),
+            'fields': ('views_count', 'published_at', 'rating_sum', 'rating_count', 'rating_average'),
             'classes': ('collapse',)
         }),
     )
@@ -39,6 +42,7 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('user__username', 'user__email', 'blog__title')
     ordering = ('-created_at',)
+    actions = [export_jsonl, export_csv]
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'blog')
@@ -49,6 +53,24 @@ class RatingAdmin(admin.ModelAdmin):
     list_filter = ('score', 'created_at')
     search_fields = ('user__username', 'user__email', 'blog__title', 'review')
     ordering = ('-created_at',)
+    actions = [export_jsonl, export_csv]
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'blog')
+
+@admin.register(Leaderboard)
+class LeaderboardAdmin(admin.ModelAdmin):
+    list_display = ('board', 'refreshed_at', 'get_staleness')
+    readonly_fields = ('board', 'entries', 'refreshed_at')
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(BlogImport)
+class BlogImportAdmin(admin.ModelAdmin):
+    list_display = ('name', 'position', 'imported', 'rejected', 'started_at', 'updated_at', 'finished_at')
+    readonly_fields = ('name', 'fingerprint', 'position', 'imported', 'rejected', 'started_at', 'updated_at', 'finished_at')
+    search_fields = ('name',)
+    
+    def has_add_permission(self, request):
+        return False
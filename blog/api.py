@@ -0,0 +1,409 @@
+"""
+Read-only JSON API over posts, categories, authors, ratings and follows,
+mounted at ``api/v1/`` (see ``blog.api_urls``).
+
+Every resource is a ``values()`` projection: rows are fetched as dicts of
+the selected columns and never become model instances.  Query parameters:
+
+``fields=title,slug``
+    The members of the requested objects (``fields[<type>]=...`` selects
+    them for any type in the response, included ones too); ``id`` is always
+    present.  Lists leave out the large members by default (a post's
+    ``body``, ``body_html`` and ``body_toc``); a single object has them all.
+``include=author,category``
+    Side-load the related objects into ``included``, keyed by type, with
+    one query per type however many objects the page refers to.
+``page_size`` and ``cursor``
+    Lists are keyset-paginated on an indexed ordering (``blog.pagination``);
+    ``links.next`` and ``links.prev`` hold the neighbouring pages.  A cursor
+    that does not decode is a 400, like any other bad parameter.
+Any declared filter, e.g. ``/api/v1/blogs/?category=python``.
+
+A post's ``viewer`` member holds the signed-in reader's state for it
+(``blog.viewerstate``: favorited, their rating, whether they follow the
+author), loaded for the whole page in one query; it is ``null`` for
+anonymous requests.  Such responses are private and vary on ``Cookie``.
+
+Responses carry a strong ``ETag`` of the body and answer a matching
+``If-None-Match`` with ``304 Not Modified``.  Errors are
+``{"errors": [{"status": ..., "detail": ...}]}``.  Configured with the
+``API`` setting:
+
+    API = {
+        'PAGE_SIZE': 20,       # objects per list page by default
+        'MAX_PAGE_SIZE': 1000, # largest page_size a client may ask for
+        'MAX_AGE': 0,          # Cache-Control max-age sent to clients
+    }
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from profiles.models import AuthorStats, Follow
+
+from . import markup, viewerstate
+from .feeds import conditional_response
+from .models import Blog, Category, Rating
+from .pagination import CURSOR_PARAM, CursorPaginator, InvalidCursor
+
+User = get_user_model()
+
+VERSION = 'v1'
+CONTENT_TYPE = 'application/json'
+FIELDS_PARAM = 'fields'
+INCLUDE_PARAM = 'include'
+PAGE_SIZE_PARAM = 'page_size'
+
+DEFAULTS = {
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 1000,
+    'MAX_AGE': 0,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'API', {}))
+    return config
+
+
+class ApiError(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def _names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class Resource:
+    """
+    One type of object: ``fields`` maps output members to ORM lookups (in
+    output order, ``id`` first; ``None`` for members computed by
+    ``serialize()``), ``relations`` maps members holding a
+    foreign key to the type they refer to, ``filters`` maps list query
+    parameters to lookups.  ``visible`` limits every request, ``listed``
+    only lists; ``key`` is the lookup of the detail URL's argument.
+    """
+
+    def __init__(self, type, model, fields, relations=None, hidden_in_lists=(), filters=None,
+                 ordering=('-id',), key='pk', visible=None, listed=None, requires=None):
+        self.type = type
+        self.model = model
+        self.fields = fields
+        self.relations = relations or {}
+        self.hidden_in_lists = set(hidden_in_lists)
+        self.filters = filters or {}
+        self.ordering = ordering
+        self.key = key
+        self.visible = visible or Q()
+        self.listed = listed or Q()
+        # Output member -> further lookups serialize() needs for it
+        self.requires = requires or {}
+
+    def queryset(self):
+        return self.model._default_manager.filter(self.visible).order_by()
+
+    def select(self, value, detail):
+        """The output members named by a ``fields`` value; the defaults for ``None``"""
+        if value is None:
+            return [name for name in self.fields if detail or name not in self.hidden_in_lists]
+        names = set(_names(value))
+        unknown = names - set(self.fields)
+        if unknown:
+            raise ApiError(
+                f'Unknown {self.type} fields: {", ".join(sorted(unknown))}; '
+                f'expected some of {", ".join(self.fields)}'
+            )
+        return [name for name in self.fields if name == 'id' or name in names]
+
+    def parse_include(self, value):
+        names = list(dict.fromkeys(_names(value or '')))
+        unknown = [name for name in names if name not in self.relations]
+        if unknown:
+            expected = ', '.join(self.relations) or 'nothing'
+            raise ApiError(f'Cannot include {", ".join(unknown)} with {self.type}; expected some of {expected}')
+        return names
+
+    def lookups(self, fields, extra=()):
+        """The columns to fetch for ``fields``, plus ``extra``, without duplicates"""
+        lookups = dict.fromkeys(self.fields[name] for name in fields if self.fields[name] is not None)
+        for name in fields:
+            lookups.update(dict.fromkeys(self.requires.get(name, ())))
+        lookups.update(dict.fromkeys(extra))
+        return list(lookups)
+
+    def filter(self, queryset, params):
+        for param, lookup in self.filters.items():
+            value = params.get(param)
+            if value:
+                queryset = queryset.filter(**{lookup: value})
+        return queryset
+
+    def serialize(self, rows, fields, user):
+        pairs = [(name, self.fields[name]) for name in fields if self.fields[name] is not None]
+        return [{name: row[lookup] for name, lookup in pairs} for row in rows]
+
+
+class BlogResource(Resource):
+    RENDERED = ('body_html', 'body_toc', 'word_count', 'reading_time')
+
+    def serialize(self, rows, fields, user):
+        # Bulk-loaded posts not rendered yet (see Blog.rendered_body): render them from one extra query
+        if any(name in fields for name in self.RENDERED):
+            pending = [row for row in rows if not row['body_hash']]
+            if pending:
+                bodies = dict(Blog.objects.filter(pk__in=[row['id'] for row in pending]).values_list('pk', 'body'))
+                for row in pending:
+                    rendered = markup.render(bodies[row['id']])
+                    row.update((name, rendered[name]) for name in self.RENDERED if name in row)
+        data = super().serialize(rows, fields, user)
+        if 'viewer' in fields:
+            state = None
+            if user.is_authenticated:
+                state = viewerstate.load(user, [row['id'] for row in rows], [row['author_id'] for row in rows])
+            for row, item in zip(rows, data):
+                item['viewer'] = state.as_dict(row['id'], row['author_id']) if state else None
+        return data
+
+
+RESOURCES = {
+    resource.type: resource
+    for resource in [
+        BlogResource(
+            'blogs', Blog,
+            fields={
+                'id': 'id',
+                'slug': 'slug',
+                'title': 'title',
+                'excerpt': 'excerpt',
+                'body': 'body',
+                'body_html': 'body_html',
+                'body_toc': 'body_toc',
+                'author': 'author_id',
+                'category': 'category_id',
+                'published_at': 'published_at',
+                'updated_at': 'updated_at',
+                'views_count': 'views_count',
+                'rating_average': 'rating_average',
+                'rating_count': 'rating_count',
+                'word_count': 'word_count',
+                'reading_time': 'reading_time',
+                'viewer': None,
+            },
+            relations={'author': 'authors', 'category': 'categories'},
+            hidden_in_lists=('body', 'body_html', 'body_toc'),
+            filters={'category': 'category__slug', 'author': 'author__username'},
+            ordering=('-published_at', '-id'),
+            key='slug',
+            visible=Q(status='published'),
+            requires={
+                **{name: ('id', 'body_hash') for name in BlogResource.RENDERED},
+                'viewer': ('id', 'author_id'),
+            },
+        ),
+        Resource(
+            'categories', Category,
+            fields={
+                'id': 'id',
+                'slug': 'slug',
+                'name': 'name',
+                'description': 'description',
+                'created_at': 'created_at',
+            },
+            ordering=('name',),
+            key='slug',
+        ),
+        # Any user can be included (as a rater or follower); the list only has authors
+        Resource(
+            'authors', User,
+            fields={
+                'id': 'id',
+                'username': 'username',
+                'first_name': 'first_name',
+                'last_name': 'last_name',
+                'bio': 'author_profile__bio',
+                'website': 'author_profile__website',
+                'location': 'author_profile__location',
+                'published_count': 'author_stats__published_count',
+                'followers_count': 'author_stats__followers_count',
+                'following_count': 'author_stats__following_count',
+                'rating_average': 'author_stats__rating_average',
+            },
+            ordering=('username',),
+            key='username',
+            listed=Q(role__in=AuthorStats.LISTED_ROLES),
+        ),
+        Resource(
+            'ratings', Rating,
+            fields={
+                'id': 'id',
+                'blog': 'blog_id',
+                'user': 'user_id',
+                'score': 'score',
+                'review': 'review',
+                'created_at': 'created_at',
+                'updated_at': 'updated_at',
+            },
+            relations={'blog': 'blogs', 'user': 'authors'},
+            filters={'blog': 'blog__slug', 'user': 'user__username'},
+            visible=Q(blog__status='published'),
+        ),
+        Resource(
+            'follows', Follow,
+            fields={
+                'id': 'id',
+                'follower': 'follower_id',
+                'following': 'following_id',
+                'created_at': 'created_at',
+            },
+            relations={'follower': 'authors', 'following': 'authors'},
+            filters={'follower': 'follower__username', 'following': 'following__username'},
+        ),
+    ]
+}
+
+
+def get_resource(type):
+    return RESOURCES[type]
+
+
+def _requested_fields(request, resource, primary):
+    value = request.GET.get(f'{FIELDS_PARAM}[{resource.type}]')
+    if value is None and primary:
+        value = request.GET.get(FIELDS_PARAM)
+    return value
+
+
+def get_page_size(request, config):
+    value = request.GET.get(PAGE_SIZE_PARAM)
+    if value is None:
+        return config['PAGE_SIZE']
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if not 1 <= size <= config['MAX_PAGE_SIZE']:
+        raise ApiError(f'{PAGE_SIZE_PARAM} must be a number from 1 to {config["MAX_PAGE_SIZE"]}')
+    return size
+
+
+def side_load(request, resource, rows, include):
+    """The objects ``rows`` refer to through ``include``, by type; one query per type"""
+    wanted = {}
+    for name in include:
+        lookup = resource.fields[name]
+        ids = wanted.setdefault(resource.relations[name], set())
+        ids.update(row[lookup] for row in rows if row[lookup] is not None)
+    included = {}
+    for type, ids in wanted.items():
+        related = RESOURCES[type]
+        fields = related.select(_requested_fields(request, related, primary=False), detail=False)
+        related_rows = []
+        if ids:
+            related_rows = list(related.queryset().filter(pk__in=ids).order_by('pk').values(*related.lookups(fields)))
+        included[type] = related.serialize(related_rows, fields, request.user)
+    return included
+
+
+def _page_link(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params[CURSOR_PARAM] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def content_etag(content):
+    return '"{}"'.format(hashlib.sha256(content).hexdigest()[:32])
+
+
+def error_response(status, detail):
+    content = json.dumps({'errors': [{'status': str(status), 'detail': detail}]}, separators=(',', ':'))
+    return HttpResponse(content, content_type=CONTENT_TYPE, status=status)
+
+
+def api_view(view):
+    """Run ``view(request, config, ...)`` and send its payload as JSON, answering conditional requests"""
+
+    @functools.wraps(view)
+    @require_safe
+    def wrapper(request, *args, **kwargs):
+        config = get_config()
+        try:
+            payload = view(request, config, *args, **kwargs)
+        except ApiError as error:
+            return error_response(error.status, error.detail)
+        content = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        response = conditional_response(
+            request, content_etag(content), None,
+            lambda: HttpResponse(content, content_type=CONTENT_TYPE), config,
+        )
+        # Viewer state makes a signed-in reader's response theirs alone
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    return wrapper
+
+
+@api_view
+def index_view(request, config):
+    return {
+        'version': VERSION,
+        'links': {type: request.build_absolute_uri(reverse(f'api:{type}')) for type in RESOURCES},
+    }
+
+
+@api_view
+def list_view(request, config, type):
+    resource = get_resource(type)
+    fields = resource.select(_requested_fields(request, resource, primary=True), detail=False)
+    include = resource.parse_include(request.GET.get(INCLUDE_PARAM))
+    per_page = get_page_size(request, config)
+    # Related ids for side-loading and the ordering columns for the cursor, whatever the fieldset
+    extra = [resource.fields[name] for name in include] + [name.lstrip('-') for name in resource.ordering] + ['pk']
+    queryset = resource.filter(resource.queryset().filter(resource.listed), request.GET)
+    paginator = CursorPaginator(queryset.values(*resource.lookups(fields, extra)), per_page, resource.ordering)
+    try:
+        page = paginator.get_page(request.GET.get(CURSOR_PARAM), strict=True)
+    except InvalidCursor:
+        raise ApiError('Invalid cursor')
+    rows = page.object_list
+
+    payload = {'data': resource.serialize(rows, fields, request.user)}
+    if include:
+        payload['included'] = side_load(request, resource, rows, include)
+    payload['links'] = {
+        'next': _page_link(request, page.next_cursor),
+        'prev': _page_link(request, page.previous_cursor),
+    }
+    return payload
+
+
+@api_view
+def detail_view(request, config, type, key):
+    resource = get_resource(type)
+    fields = resource.select(_requested_fields(request, resource, primary=True), detail=True)
+    include = resource.parse_include(request.GET.get(INCLUDE_PARAM))
+    extra = [resource.fields[name] for name in include]
+    rows = list(resource.queryset().filter(**{resource.key: key}).values(*resource.lookups(fields, extra))[:1])
+    if not rows:
+        raise ApiError(f'No {resource.type} object {key!r}', status=404)
+
+    payload = {'data': resource.serialize(rows, fields, request.user)[0]}
+    if include:
+        payload['included'] = side_load(request, resource, rows, include)
+    return payload
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [path('', api.index_view, name='index')]
+for type, key in [('blogs', 'slug:key'), ('categories', 'slug:key'), ('authors', 'str:key'),
+                  ('ratings', 'int:key'), ('follows', 'int:key')]:
+    urlpatterns += [
+        path(f'{type}/', api.list_view, {'type': type}, name=type),
+        path(f'{type}/<{key}>/', api.detail_view, {'type': type}, name=f'{type}_detail'),
+    ]
@@ -0,0 +1,148 @@
+"""
+Native async versions of the read-heavy blog views, routed instead of the
+ones in blog.views when ``ASYNC_READ_VIEWS`` is on (as it is under ASGI, see
+blog_site/asgi.py).
+
+They use the async ORM and gather independent queries with
+``asyncio.gather``.  Everything a template reads is loaded before rendering,
+including the search form's select options, because a lazy query raised
+from a template in async code is an error rather than a slow path.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.shortcuts import aget_object_or_404, render
+
+from . import leaderboards, search, viewerstate
+from .forms import RatingForm, SearchForm
+from .models import Blog, Category
+from .pagecache import add_cache_tags, cache_anonymous_page, set_cache_meta
+from .pagination import apaginate
+from .viewcounts import arecord_view, get_view_counter
+from .views import search_home_blogs, sort_home_blogs
+
+User = get_user_model()
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def load_choices(field):
+    """Evaluate a ModelChoiceField's options now, so rendering it runs no query"""
+    iterator = field.iterator(field)
+    choices = [('', field.empty_label)] if field.empty_label is not None else []
+    choices += [iterator.choice(obj) async for obj in field.queryset]
+    field.choices = choices
+
+
+@cache_anonymous_page
+async def home_view(request):
+    add_cache_tags(request, 'blogs', 'ratings', 'categories')
+    blogs = Blog.objects.filter(status='published').select_related('author', 'category')
+
+    search_form = SearchForm(request.GET)
+    if request.GET.get('category') or request.GET.get('author'):
+        # Validating a submitted category or author looks it up
+        await sync_to_async(search_form.is_valid)()
+    if request.GET.get('query'):
+        await search.afts_available()
+    blogs, query = search_home_blogs(blogs, search_form)
+    blogs, ordering, sort_by = sort_home_blogs(request, blogs, query)
+
+    page_obj, featured_blogs, _, _ = await asyncio.gather(
+        apaginate(request, blogs, 6, ordering),
+        leaderboards.aget_featured('rating', 3),
+        load_choices(search_form.fields['category']),
+        load_choices(search_form.fields['author']),
+    )
+    add_cache_tags(request, 'leaderboard')
+    await viewerstate.aannotate(request.user, page_obj)
+
+    return render(request, 'blog/home.html', {
+        'page_obj': page_obj,
+        'search_form': search_form,
+        'featured_blogs': featured_blogs,
+        'sort_by': sort_by,
+        'query': query,
+    })
+
+
+async def _record_cached_view(request, meta):
+    await arecord_view(request, meta['blog_id'])
+
+
+async def _related_blogs(blog):
+    """Neighbours from the similarity index, else the newest posts of the same category"""
+    related_blogs = [
+        entry.related async for entry in blog.related_entries.filter(
+            related__status='published'
+        ).select_related('related__author')[:3]
+    ]
+    if not related_blogs and blog.category_id:
+        related_blogs = await alist(
+            Blog.objects.filter(category_id=blog.category_id, status='published')
+            .exclude(id=blog.id).select_related('author')[:3]
+        )
+    return related_blogs
+
+
+@cache_anonymous_page(on_hit=_record_cached_view)
+async def blog_detail_view(request, slug):
+    blog = await aget_object_or_404(
+        Blog.objects.select_related('author', 'category'), slug=slug, status='published'
+    )
+    add_cache_tags(request, f'blog:{blog.pk}', f'author:{blog.author_id}', f'category:{blog.category_id}')
+    set_cache_meta(request, blog_id=blog.pk)
+
+    await arecord_view(request, blog.pk)
+    blog.views_count += get_view_counter().pending(blog.pk)
+
+    ratings, related_blogs, _ = await asyncio.gather(
+        alist(blog.ratings.all().select_related('user')),
+        _related_blogs(blog),
+        viewerstate.aannotate(request.user, [blog]),
+    )
+    add_cache_tags(request, *(f'blog:{related.pk}' for related in related_blogs))
+
+    return render(request, 'blog/blog_detail.html', {
+        'blog': blog,
+        'is_favorited': blog.viewer_favorited,
+        'user_rating': blog.viewer_rating,
+        'ratings': ratings,
+        'average_rating': blog.get_average_rating(),
+        'rating_count': blog.get_rating_count(),
+        'rating_form': RatingForm(),
+        'related_blogs': related_blogs,
+    })
+
+
+@cache_anonymous_page
+async def category_detail_view(request, slug):
+    category = await aget_object_or_404(Category, slug=slug)
+    add_cache_tags(request, f'category:{category.pk}', f'category-blogs:{category.pk}')
+    blogs = Blog.objects.filter(category=category, status='published').select_related('author')
+    page_obj = await apaginate(request, blogs, 6, ('-published_at',))
+    add_cache_tags(request, *(f'blog:{blog.pk}' for blog in page_obj))
+    await viewerstate.aannotate(request.user, page_obj)
+
+    return render(request, 'blog/category_detail.html', {
+        'category': category,
+        'page_obj': page_obj,
+    })
+
+
+@cache_anonymous_page
+async def author_blogs_view(request, username):
+    author = await aget_object_or_404(User, username=username)
+    add_cache_tags(request, f'author:{author.pk}', f'author-blogs:{author.pk}')
+    blogs = Blog.objects.filter(author=author, status='published').select_related('category')
+    page_obj = await apaginate(request, blogs, 6, ('-published_at',))
+    add_cache_tags(request, *(f'blog:{blog.pk}' for blog in page_obj))
+    await viewerstate.aannotate(request.user, page_obj)
+
+    return render(request, 'blog/author_blogs.html', {
+        'author': author,
+        'page_obj': page_obj,
+    })
@@ -0,0 +1,111 @@
+"""
+Shared pieces of the ``benchmark_*`` management commands.
+
+``isolated_database()`` runs a benchmark against a throwaway database built
+like a test database, so it never touches the configured one.
+``stand_in_templates()`` writes minimal versions of the page templates the
+repository does not ship yet, so every route can be rendered; the stand-ins
+touch the same context objects the views prepare, keeping query counts
+honest.  ``stand_in_template_settings()`` serves them from memory instead,
+for tests.
+"""
+import math
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+STAND_IN_TEMPLATES = {
+    'blog/category_detail.html': (
+        '{% for blog in page_obj %}{{ blog.title }} {{ blog.author.username }} {{ blog.viewer_favorited }}\n{% endfor %}'
+    ),
+    'blog/author_blogs.html': (
+        '{{ author.username }}{% for blog in page_obj %}{{ blog.title }} {{ blog.category.name }} {{ blog.viewer_favorited }}\n{% endfor %}'
+    ),
+    'blog/my_blogs.html': (
+        '{% for blog in page_obj %}{{ blog.title }} {{ blog.status }} {{ blog.views_count }}\n{% endfor %}'
+    ),
+    'blog/my_favorites.html': (
+        '{% for favorite in page_obj %}{{ favorite.blog.title }} {{ favorite.created_at }}\n{% endfor %}'
+    ),
+    'blog/blog_confirm_delete.html': '{{ blog.title }}<form method="post">{% csrf_token %}</form>',
+    'profiles/author_detail.html': (
+        '{{ author.get_full_name }} {{ profile.bio }} {{ total_blogs }} {{ followers_count }} {{ is_following }}'
+        '{% for blog in page_obj %}{{ blog.title }}\n{% endfor %}'
+    ),
+    'profiles/authors_list.html': (
+        '{% for author in page_obj %}{{ author.get_full_name }} {{ author.author_stats.published_count }}\n{% endfor %}'
+    ),
+    'profiles/edit_profile.html': '<form method="post">{% csrf_token %}{{ form }}</form>',
+    'profiles/followers.html': (
+        '{{ title }} {{ author.username }}{% for follow in page_obj %}{{ follow.follower.username }}\n{% endfor %}'
+    ),
+    'profiles/following.html': (
+        '{{ title }} {{ author.username }}{% for follow in page_obj %}{{ follow.following.username }}\n{% endfor %}'
+    ),
+}
+
+
+@contextmanager
+def isolated_database(name=None):
+    """
+    Swap the default database for a fresh, migrated one for the duration of
+    the block: in memory, or the SQLite file ``name`` (needed when other
+    processes must open it)
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if name is not None:
+        test_settings['NAME'] = name
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        test_settings['NAME'] = old_test_name
+
+
+def missing_templates():
+    """Names in ``STAND_IN_TEMPLATES`` the configured loaders cannot find"""
+    missing = []
+    for name in STAND_IN_TEMPLATES:
+        try:
+            get_template(name)
+        except TemplateDoesNotExist:
+            missing.append(name)
+    return missing
+
+
+def stand_in_templates(directory, names=None):
+    """Write the stand-ins for ``names`` (default: all) under ``directory``"""
+    for name in STAND_IN_TEMPLATES if names is None else names:
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as handle:
+            handle.write(STAND_IN_TEMPLATES[name])
+    return directory
+
+
+def stand_in_template_settings():
+    """``TEMPLATES`` with the stand-ins loaded from memory behind the real templates"""
+    engine = dict(settings.TEMPLATES[0], APP_DIRS=False)
+    engine['OPTIONS'] = dict(engine.get('OPTIONS', {}), loaders=[
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+        ('django.template.loaders.locmem.Loader', STAND_IN_TEMPLATES),
+    ])
+    return [engine] + list(settings.TEMPLATES[1:])
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[max(math.ceil(len(ordered) * fraction) - 1, 0)]
@@ -0,0 +1,253 @@
+"""
+Deterministic synthetic datasets for load tests and benchmarks.
+
+``generate(counts, seed)`` bulk-inserts users, author profiles,
+categories, posts, ratings, favorites and follows, then rebuilds the
+derived tables (rating aggregates, author statistics, search indexes,
+leaderboards, following timelines) that the per-row signals would
+otherwise maintain.  The same counts and seed always produce the same rows, so timings can be compared
+across commits; every table draws from its own seeded generator, so
+changing one count does not reshuffle the others.
+
+Timestamps are spread over ``SPAN_DAYS`` before an anchor (midnight UTC
+today by default), keeping "trending" windows and feed ages meaningful
+whatever day the dataset is built.  Every user's password is
+``PASSWORD``.
+"""
+import random
+from datetime import datetime, time as datetime_time, timedelta, timezone as datetime_timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Blog, Category, Favorite, Rating
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-password'
+
+SCALES = {
+    'tiny': {
+        'users': 50, 'authors': 10, 'categories': 5, 'blogs': 200,
+        'ratings': 600, 'favorites': 400, 'follows': 150,
+    },
+    'small': {
+        'users': 500, 'authors': 50, 'categories': 10, 'blogs': 2_000,
+        'ratings': 10_000, 'favorites': 6_000, 'follows': 2_000,
+    },
+    'medium': {
+        'users': 10_000, 'authors': 500, 'categories': 30, 'blogs': 50_000,
+        'ratings': 250_000, 'favorites': 150_000, 'follows': 50_000,
+    },
+    'large': {
+        'users': 100_000, 'authors': 5_000, 'categories': 60, 'blogs': 500_000,
+        'ratings': 2_500_000, 'favorites': 1_500_000, 'follows': 500_000,
+    },
+}
+
+SPAN_DAYS = 365
+DRAFT_RATIO = 0.1
+
+WORDS = (
+    'django python async database query template cache server index view model '
+    'form signal queue worker router replica search feed author reader rating '
+    'favorite follow page image static stream import export profile timeline '
+    'benchmark latency memory request response session cookie header middleware'
+).split()
+FIRST_NAMES = 'Ada Alan Barbara Dennis Edsger Frances Grace Guido Ken Linus Margaret Radia Tim Yukihiro'.split()
+LAST_NAMES = 'Lovelace Turing Liskov Ritchie Dijkstra Allen Hopper Rossum Thompson Torvalds Hamilton Perlman Peters Matsumoto'.split()
+
+
+def get_counts(scale='small', **overrides):
+    counts = dict(SCALES[scale])
+    counts.update({name: value for name, value in overrides.items() if value is not None})
+    counts['authors'] = min(counts['authors'], counts['users'])
+    return counts
+
+
+def default_anchor():
+    return datetime.combine(timezone.now().date(), datetime_time(), tzinfo=datetime_timezone.utc)
+
+
+def _rng(seed, table):
+    return random.Random(f'{seed}:{table}')
+
+
+def _skewed(rng, size, exponent=2.0):
+    """An index in ``range(size)``, low indices (the "popular" rows) far more likely"""
+    return min(int(size * rng.random() ** exponent), size - 1)
+
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(model, rows, batch_size, log):
+    """bulk_create ``rows`` (an iterable) in batches, one transaction per batch"""
+    written = 0
+    for batch in _batched(rows, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=batch_size)
+        written += len(batch)
+        if log and written % (batch_size * 20) < batch_size:
+            log(f'  {model._meta.label}: {written}')
+    return written
+
+
+def _spread(rng, total, owners):
+    """Split ``total`` rows over ``owners`` with a skew towards the first ones"""
+    shares = [0] * owners
+    for _ in range(total):
+        shares[_skewed(rng, owners, 1.5)] += 1
+    return shares
+
+
+def _distinct_picks(rng, count, size, exponent=2.0):
+    """``count`` distinct skewed indices from ``range(size)``"""
+    count = min(count, size)
+    if count > size // 2:
+        return rng.sample(range(size), count)
+    picked = set()
+    for _ in range(count * 10):
+        if len(picked) == count:
+            break
+        picked.add(_skewed(rng, size, exponent))
+    if len(picked) < count:
+        # The skew keeps landing on taken rows; draw the rest uniformly
+        remaining = [index for index in range(size) if index not in picked]
+        picked.update(rng.sample(remaining, count - len(picked)))
+    return sorted(picked)
+
+
+def generate(counts, seed=0, anchor=None, batch_size=5000, derived=True, log=None):
+    """Insert a dataset of ``counts`` rows (see ``SCALES``); returns the counts written"""
+    from profiles.models import AuthorProfile, Follow
+
+    anchor = anchor or default_anchor()
+    span = SPAN_DAYS * 24 * 3600
+
+    def moment(rng):
+        return anchor - timedelta(seconds=rng.randrange(span))
+
+    # One hash for everyone; the salt is fixed for determinism and long enough
+    # that logging in does not rehash (and invalidate other sessions)
+    password = make_password(PASSWORD, salt='syntheticbenchmarkdataset0')
+    rng = _rng(seed, 'users')
+
+    def users():
+        for number in range(counts['users']):
+            joined = moment(rng)
+            yield User(
+                username=f'user{number}', email=f'user{number}@example.com', password=password,
+                first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                role='author' if number < counts['authors'] else 'reader',
+                is_email_verified=True, date_joined=joined, created_at=joined,
+            )
+
+    written = {'users': _insert(User, users(), batch_size, log)}
+    user_ids = list(User.objects.filter(username__startswith='user').order_by('pk').values_list('pk', flat=True))
+    author_ids = user_ids[:counts['authors']]
+
+    rng = _rng(seed, 'profiles')
+    _insert(AuthorProfile, (
+        AuthorProfile(user_id=user_id, bio=_sentence(rng, 8, 30), location=rng.choice(LAST_NAMES))
+        for user_id in author_ids
+    ), batch_size, log)
+
+    rng = _rng(seed, 'categories')
+    written['categories'] = _insert(Category, (
+        Category(name=f'Category {number}', slug=f'category-{number}', description=_sentence(rng, 5, 15))
+        for number in range(counts['categories'])
+    ), batch_size, log)
+    category_ids = list(Category.objects.order_by('pk').values_list('pk', flat=True))
+
+    rng = _rng(seed, 'blogs')
+
+    def blogs():
+        for number in range(counts['blogs']):
+            title = _sentence(rng, 3, 8).capitalize()
+            body = '\n\n'.join(_sentence(rng, 40, 120) + '.' for _ in range(rng.randint(2, 8)))
+            published = rng.random() >= DRAFT_RATIO
+            created = moment(rng)
+            yield Blog(
+                title=title, slug=f'{slugify(title)[:180]}-{number}',
+                author_id=author_ids[_skewed(rng, len(author_ids), 1.5)],
+                category_id=rng.choice(category_ids) if category_ids else None,
+                body=body,
+                # As Blog.save() derives it
+                excerpt=body[:297] + '...' if len(body) > 300 else body,
+                status='published' if published else 'draft',
+                created_at=created,
+                published_at=min(created + timedelta(hours=rng.randint(0, 48)), anchor) if published else None,
+                views_count=int(5000 * rng.random() ** 3),
+            )
+
+    written['blogs'] = _insert(Blog, blogs(), batch_size, log)
+    blog_ids = list(Blog.objects.filter(status='published').order_by('pk').values_list('pk', flat=True))
+
+    def pairs(table, total, targets, make):
+        """``total`` rows of distinct (user, target) pairs, skewed on both sides"""
+        rng = _rng(seed, table)
+        for user_index, share in enumerate(_spread(rng, total, len(user_ids))):
+            for target_index in _distinct_picks(rng, share, len(targets)):
+                row = make(rng, user_ids[user_index], targets[target_index])
+                if row is not None:
+                    yield row
+
+    if blog_ids:
+        written['ratings'] = _insert(Rating, pairs('ratings', counts['ratings'], blog_ids, lambda rng, user_id, blog_id: Rating(
+            user_id=user_id, blog_id=blog_id, score=min(5, max(0, round(rng.gauss(3.5, 1.2)))),
+            review=_sentence(rng, 5, 25) if rng.random() < 0.2 else '', created_at=moment(rng),
+        )), batch_size, log)
+        written['favorites'] = _insert(Favorite, pairs('favorites', counts['favorites'], blog_ids, lambda rng, user_id, blog_id: Favorite(
+            user_id=user_id, blog_id=blog_id, created_at=moment(rng),
+        )), batch_size, log)
+    written['follows'] = _insert(Follow, pairs('follows', counts['follows'], author_ids, lambda rng, user_id, author_id: Follow(
+        follower_id=user_id, following_id=author_id, created_at=moment(rng),
+    ) if user_id != author_id else None), batch_size, log)
+
+    if derived:
+        rebuild_derived(log)
+    return written
+
+
+def rebuild_derived(log=None):
+    """Recompute what the signals maintain row by row, after a bulk load"""
+    from profiles import feed, search as author_search
+    from profiles.models import AuthorStats
+    from . import leaderboards, search
+
+    def timelines():
+        config = feed.get_config()
+        recent = Blog.objects.filter(
+            status='published', published_at__gte=timezone.now() - timedelta(days=config['MAX_AGE_DAYS'])
+        )
+        for blog_id in list(recent.order_by('published_at').values_list('pk', flat=True)):
+            feed.fan_out(blog_id, config)
+
+    steps = (
+        ('rating aggregates', Blog.rebuild_rating_aggregates),
+        ('author statistics', AuthorStats.rebuild),
+        ('post search index', search.rebuild_index),
+        ('author search index', author_search.rebuild_index),
+        ('leaderboards', leaderboards.refresh_all),
+        ('following timelines', timelines),
+    )
+    for label, step in steps:
+        if log:
+            log(f'  rebuilding {label}')
+        step()
@@ -0,0 +1,213 @@
+"""
+RSS and Atom feeds of the latest published posts: site-wide, per category
+and per author.
+
+Feed bodies are cached (in the page cache's cache) per path together with
+the versions of the page cache tags they depend on, so the signals that
+invalidate the HTML listings invalidate the feeds too.  Responses carry a
+strong ``ETag`` (a hash of the body) and ``Last-Modified`` (the newest
+``updated_at`` in the feed); while the cached body is fresh a conditional
+request is answered ``304 Not Modified`` from the cache alone, without a
+database query.  Configured with the ``SYNDICATION`` setting:
+
+    SYNDICATION = {
+        'ITEMS': 20,            # posts per feed
+        'TIMEOUT': 3600,        # seconds a generated body may be served
+        'MAX_AGE': 300,         # Cache-Control max-age sent to readers
+        'SITEMAP_SHARD_SIZE': 50000,  # post ids per sitemap file (see blog.sitemaps)
+    }
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date, parse_http_date_safe
+
+from .models import Blog, Category
+from .pagecache import add_cache_tags, get_cache, tags_fresh, track_cache_tags
+
+User = get_user_model()
+
+DEFAULTS = {
+    'ITEMS': 20,
+    'TIMEOUT': 3600,
+    'MAX_AGE': 300,
+    'SITEMAP_SHARD_SIZE': 50000,
+}
+
+PREFIX = 'syndication'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SYNDICATION', {}))
+    return config
+
+
+def strong_etag(*parts):
+    return '"{}"'.format(hashlib.sha256('\x1f'.join(map(str, parts)).encode()).hexdigest()[:32])
+
+
+def conditional_response(request, etag, last_modified, make_response, config=None):
+    """
+    ``304 Not Modified`` if the request's validators match, else
+    ``make_response()``; both carry the validators and the max-age
+    """
+    config = config or get_config()
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = make_response()
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=config['MAX_AGE'])
+    return response
+
+
+def cached_feed(view):
+    """Serve ``view`` from a tag-validated cache of its body, answering conditional requests"""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        config = get_config()
+        cache = get_cache()
+        key = f'{PREFIX}:feed:{hashlib.md5(request.path.encode()).hexdigest()}'
+        entry = cache.get(key)
+        if entry is None or not tags_fresh(entry['tags'], cache):
+            tags = track_cache_tags(request)
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': strong_etag(response.content),
+                'last_modified': parse_http_date_safe(response.get('Last-Modified', '')),
+                'tags': tags,
+            }
+            cache.set(key, entry, config['TIMEOUT'])
+        return conditional_response(
+            request, entry['etag'], entry['last_modified'],
+            lambda: HttpResponse(entry['content'], content_type=entry['content_type']), config,
+        )
+
+    return wrapper
+
+
+class LatestBlogsFeed(Feed):
+    title = 'Latest posts'
+    description = 'The most recently published posts.'
+
+    def get_object(self, request):
+        add_cache_tags(request, 'blogs')
+        return None
+
+    def link(self):
+        return reverse('blog:home')
+
+    def published(self, obj):
+        return Blog.objects.filter(status='published')
+
+    def items(self, obj):
+        return (
+            self.published(obj)
+            .select_related('author', 'category')
+            .only(
+                'title', 'slug', 'excerpt', 'published_at', 'updated_at',
+                'author__username', 'author__first_name', 'author__last_name', 'category__name',
+            )
+            .order_by('-published_at', '-id')[:get_config()['ITEMS']]
+        )
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return item.excerpt
+
+    def item_pubdate(self, item):
+        return item.published_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_author_link(self, item):
+        return reverse('blog:author_blogs', kwargs={'username': item.author.username})
+
+    def item_categories(self, item):
+        return (item.category.name,) if item.category else ()
+
+
+class LatestBlogsAtomFeed(LatestBlogsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestBlogsFeed.description
+
+
+class CategoryFeed(LatestBlogsFeed):
+    def get_object(self, request, slug):
+        category = get_object_or_404(Category, slug=slug)
+        add_cache_tags(request, f'category:{category.pk}', f'category-blogs:{category.pk}')
+        return category
+
+    def title(self, obj):
+        return f'Latest posts in {obj.name}'
+
+    def description(self, obj):
+        return obj.description or self.title(obj)
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def published(self, obj):
+        return Blog.objects.filter(status='published', category=obj)
+
+
+class CategoryAtomFeed(CategoryFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AuthorFeed(LatestBlogsFeed):
+    def get_object(self, request, username):
+        author = get_object_or_404(User, username=username)
+        add_cache_tags(request, f'author:{author.pk}', f'author-blogs:{author.pk}')
+        return author
+
+    def title(self, obj):
+        return f'Latest posts by {obj.get_full_name() or obj.username}'
+
+    def description(self, obj):
+        return self.title(obj)
+
+    def link(self, obj):
+        return reverse('blog:author_blogs', kwargs={'username': obj.username})
+
+    def published(self, obj):
+        return Blog.objects.filter(status='published', author=obj)
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+latest_rss = cached_feed(LatestBlogsFeed())
+latest_atom = cached_feed(LatestBlogsAtomFeed())
+category_rss = cached_feed(CategoryFeed())
+category_atom = cached_feed(CategoryAtomFeed())
+author_rss = cached_feed(AuthorFeed())
+author_atom = cached_feed(AuthorAtomFeed())
@@ -66,6 +66,7 @@ class RatingForm(forms.ModelForm):
 class SearchForm(forms.Form):
     query = forms.CharField(
         max_length=200,
+        required=False,
         widget=forms.TextInput(attrs={
             'placeholder': 'Search blogs...',
             'class': 'form-control'
@@ -0,0 +1,280 @@
+"""
+Resized and WebP derivatives of uploaded images.
+
+Every image field listed in ``IMAGE_FIELDS`` gets a set of named variants
+(``card``, ``detail``, ``avatar``) written next to the original, each as a
+JPEG/PNG plus a WebP copy:
+
+    blog_images/sunset.jpg
+    blog_images/sunset.card.jpg    blog_images/sunset.card.webp
+    blog_images/sunset.detail.jpg  blog_images/sunset.detail.webp
+
+They are generated off the request path: saving a model whose image changed
+schedules ``refresh()`` on a small thread pool once the transaction commits
+(Pillow releases the GIL while decoding, resizing and encoding).  What was
+generated is recorded in a ``<field>_variants`` JSON column (source name,
+spec key and each variant's files and dimensions) which the
+``responsive_image`` template tag turns into ``srcset`` markup; until then
+the original is served.  The ``generate_image_derivatives`` command
+backfills existing media across processes.  Configured with the
+``IMAGE_DERIVATIVES`` setting:
+
+    IMAGE_DERIVATIVES = {
+        'BACKEND': 'thread',   # 'thread' (background pool) or 'sync'
+        'WORKERS': 2,          # threads in the background pool
+        'QUALITY': 82,         # JPEG quality of the fallback files
+        'WEBP_QUALITY': 80,
+    }
+"""
+import hashlib
+import io
+import json
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'thread',
+    'WORKERS': 2,
+    'QUALITY': 82,
+    'WEBP_QUALITY': 80,
+    'WEBP_METHOD': 4,
+    'VARIANTS': {
+        'card': {'width': 480},
+        'detail': {'width': 1200},
+        'avatar': {'width': 160, 'height': 160, 'crop': True},
+    },
+}
+
+# Image fields with derivatives, and the variants generated for each
+IMAGE_FIELDS = {
+    'blog.Blog': {'featured_image': ('card', 'detail')},
+    'profiles.AuthorProfile': {'profile_picture': ('avatar',)},
+}
+
+# Sent after a new variants record has been stored; receivers invalidate
+# cached pages showing the image.  Arguments: sender (model), pk, field.
+variants_updated = Signal()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'IMAGE_DERIVATIVES', {}))
+    return config
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def image_fields():
+    """(model, field name, variant names) for every image field with derivatives"""
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        for field_name, variant_names in fields.items():
+            yield model, field_name, variant_names
+
+
+def spec_key(variant_names, config=None):
+    """Short hash of everything that affects the output, so stale records can be found"""
+    config = config or get_config()
+    spec = {
+        'variants': {name: config['VARIANTS'][name] for name in variant_names},
+        'quality': [config['QUALITY'], config['WEBP_QUALITY'], config['WEBP_METHOD']],
+    }
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def needs_refresh(source, record, variant_names, config=None):
+    if not source:
+        return bool(record)
+    return not record or record.get('source') != source or record.get('spec') != spec_key(variant_names, config)
+
+
+def _target_size(variant, width, height):
+    """Output size of ``variant`` for a ``width`` x ``height`` original, never upscaled"""
+    max_width = variant['width']
+    max_height = variant.get('height')
+    if variant.get('crop'):
+        scale = min(1.0, width / max_width, height / max_height)
+        return max(1, round(max_width * scale)), max(1, round(max_height * scale))
+    scale = min(1.0, max_width / width, (max_height / height) if max_height else 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode(image, fmt, config):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=config['QUALITY'], optimize=True, progressive=True)
+    elif fmt == 'PNG':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, 'WEBP', quality=config['WEBP_QUALITY'], method=config['WEBP_METHOD'])
+    return buffer.getvalue()
+
+
+def _write(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+def render_variants(storage, source, variant_names, config=None):
+    """
+    Generate ``variant_names`` for the image stored at ``source``.
+
+    Returns the variants record; raises ``OSError`` (including Pillow's
+    ``UnidentifiedImageError``) when the original cannot be read.
+    """
+    config = config or get_config()
+    variants = {name: config['VARIANTS'][name] for name in variant_names}
+    with storage.open(source, 'rb') as handle:
+        image = Image.open(handle)
+        fmt = 'PNG' if image.format in ('PNG', 'GIF') else 'JPEG'
+        if image.format == 'JPEG':
+            # Let libjpeg decode at the smallest 1/2, 1/4 or 1/8 scale that is
+            # still at least as large as every variant needs
+            width, height = image.size
+            if image.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                width, height = height, width
+            sizes = [_target_size(variant, width, height) for variant in variants.values()]
+            need = (max(size[0] for size in sizes), max(size[1] for size in sizes))
+            if (width, height) != image.size:
+                need = need[::-1]
+            image.draft('RGB', need)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA' if fmt == 'PNG' else 'RGB')
+
+    stem, _ = posixpath.splitext(source)
+    extension = 'png' if fmt == 'PNG' else 'jpg'
+    rendered = {}
+    base = image
+    # Largest first, so each smaller uncropped variant is resized from the previous one
+    for name in sorted(variants, key=lambda name: -variants[name]['width']):
+        variant = variants[name]
+        size = _target_size(variant, *image.size)
+        if variant.get('crop'):
+            resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        else:
+            resized = base.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0) if base.size != size else base
+            base = resized
+        rendered[name] = (resized, {
+            'width': resized.width,
+            'height': resized.height,
+            'file': _write(storage, f'{stem}.{name}.{extension}', _encode(resized, fmt, config)),
+            'webp': _write(storage, f'{stem}.{name}.webp', _encode(resized, 'WEBP', config)),
+        })
+    return {
+        'source': source,
+        'spec': spec_key(variant_names, config),
+        'variants': {name: info for name, (_, info) in rendered.items()},
+    }
+
+
+def record_files(record):
+    return {
+        path for info in (record or {}).get('variants', {}).values()
+        for path in (info['file'], info['webp'])
+    }
+
+
+def discard_files(storage, paths):
+    for path in paths:
+        try:
+            storage.delete(path)
+        except OSError:
+            logger.warning('Could not delete image derivative %s', path, exc_info=True)
+
+
+def store(model, field_name, pk, source, old_record, record):
+    """
+    Save ``record`` for ``pk`` unless its image changed in the meantime.
+
+    Files only referenced by the replaced record are deleted; if the image
+    changed again, the files just generated are discarded instead and the
+    newer save's job produces the right ones.
+    """
+    storage = model._meta.get_field(field_name).storage
+    current = Q(**{field_name: source}) if source else Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True})
+    updated = model._default_manager.filter(current, pk=pk).update(**{variants_field(field_name): record})
+    if updated:
+        discard_files(storage, record_files(old_record) - record_files(record))
+        variants_updated.send(sender=model, pk=pk, field=field_name)
+    else:
+        discard_files(storage, record_files(record) - record_files(old_record))
+    return bool(updated)
+
+
+def refresh(model_label, pk, field_name, force=False):
+    """Bring one object's derivatives in line with its current image"""
+    model = apps.get_model(model_label)
+    variant_names = IMAGE_FIELDS[model_label][field_name]
+    row = model._default_manager.filter(pk=pk).values(field_name, variants_field(field_name)).first()
+    if row is None:
+        return False
+    source, old_record = row[field_name] or '', row[variants_field(field_name)] or {}
+    config = get_config()
+    if not force and not needs_refresh(source, old_record, variant_names, config):
+        return False
+    record = {}
+    if source:
+        storage = model._meta.get_field(field_name).storage
+        record = render_variants(storage, source, variant_names, config)
+    return store(model, field_name, pk, source, old_record, record)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception('Image job %s%r failed', job.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def _submit(job, *args):
+    global _executor
+    config = get_config()
+    if config['BACKEND'] != 'thread':
+        _run(job, *args)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config['WORKERS'], thread_name_prefix='image-derivatives')
+    _executor.submit(_run, job, *args)
+
+
+def image_saved(instance, field_name):
+    """Schedule a refresh when the saved image no longer matches its derivatives"""
+    model = type(instance)
+    source = getattr(instance, field_name).name or ''
+    record = getattr(instance, variants_field(field_name)) or {}
+    if needs_refresh(source, record, IMAGE_FIELDS[model._meta.label][field_name]):
+        label, pk = model._meta.label, instance.pk
+        transaction.on_commit(lambda: _submit(refresh, label, pk, field_name))
+
+
+def image_deleted(instance, field_name):
+    storage = instance._meta.get_field(field_name).storage
+    paths = record_files(getattr(instance, variants_field(field_name)))
+    if paths:
+        transaction.on_commit(lambda: discard_files(storage, paths))
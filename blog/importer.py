@@ -0,0 +1,478 @@
+"""
+Bulk import of posts from JSONL or CSV.
+
+``import_blogs(source)`` streams records from a file (or any text stream),
+validates them in batches and writes each batch with ``bulk_create`` in one
+transaction.  Authors are matched on email or username and categories on
+slug or name through in-process caches, so a batch costs a handful of
+queries however many posts it holds.  Slugs are allocated in bulk and never
+collide: a taken slug gets the next free ``-2``, ``-3``... suffix, as checked
+against both the database and the slugs handed out earlier in the run.
+Excerpts and publication dates are derived by ``Blog.fill_derived_fields``,
+exactly as ``Blog.save`` derives them.
+
+Because ``bulk_create`` sends no signals, each batch also indexes its posts
+for search, refreshes its authors' statistics, fans recent published posts
+out to followers' timelines and invalidates the listing pages, inside the
+same transaction.  Leaderboards are refreshed once at the end; rendering
+the Markdown bodies and related posts are left to the ``render_blog_bodies``
+and ``rebuild_related_posts`` commands, which run them in bulk (until then the
+detail page renders an imported body on the fly).
+
+A named import records its position in a ``BlogImport`` row committed with
+every batch, so after a failure the same call resumes with the first record
+not yet written.  Records use the field names of ``blog.exports``:
+
+    {"title": "...", "body": "...", "author": "ada@example.com", "category": "python",
+     "status": "published", "slug": "", "excerpt": "", "created_at": "2024-05-01T09:30:00Z",
+     "published_at": "", "views_count": 0}
+
+Only ``title``, ``body`` and ``author`` are required.
+"""
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime, time as datetime_time, timedelta
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import slugify
+
+from . import leaderboards, search
+from .models import Blog, BlogImport, Category
+from .pagecache import invalidate_tags
+
+User = get_user_model()
+
+FORMATS = ('jsonl', 'csv')
+SLUG_MAX_LENGTH = Blog._meta.get_field('slug').max_length
+TITLE_MAX_LENGTH = Blog._meta.get_field('title').max_length
+STATUSES = {value for value, label in Blog.STATUS_CHOICES}
+FINGERPRINT_BYTES = 64 * 1024
+CSV_FIELD_LIMIT = 16 * 1024 * 1024
+# Rejected records kept on the result for reporting; the count is always complete
+MAX_REPORTED_REJECTIONS = 1000
+# Bound on the variables of one IN list or OR chain
+LOOKUP_CHUNK = 500
+
+
+class BlogImportError(Exception):
+    pass
+
+
+class RecordRejected(Exception):
+    pass
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson', 'json'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    raise BlogImportError(f'Cannot tell the format of {path}; pass jsonl or csv explicitly')
+
+
+def fingerprint(path):
+    """Hash of the start of ``path``: appending records keeps it, rewriting the file does not"""
+    with open(path, 'rb') as handle:
+        return hashlib.sha256(handle.read(FINGERPRINT_BYTES)).hexdigest()
+
+
+def read_records(stream, format):
+    """(line number, record dict) for each record of a text stream"""
+    if format == 'csv':
+        # Post bodies easily exceed the csv module's default 128 KiB field limit
+        csv.field_size_limit(max(csv.field_size_limit(), CSV_FIELD_LIMIT))
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif format == 'jsonl':
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                record = RecordRejected(f'invalid JSON: {error}')
+            else:
+                if not isinstance(record, dict):
+                    record = RecordRejected('not a JSON object')
+            yield number, record
+    else:
+        raise BlogImportError(f'Unknown format {format!r}; expected one of {", ".join(FORMATS)}')
+
+
+def _batched(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _text(record, field):
+    value = record.get(field)
+    if isinstance(value, (dict, list)):
+        raise RecordRejected(f'{field}: not a string')
+    return '' if value is None else str(value).strip()
+
+
+def _parse_moment(value, field):
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise RecordRejected(f'{field}: not an ISO 8601 date or datetime: {value!r}')
+        moment = datetime.combine(day, datetime_time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class AuthorLookup:
+    """Email or username to user id, resolved a batch at a time and cached"""
+
+    def __init__(self):
+        self.cache = {}
+
+    def prefetch(self, keys):
+        missing = {key for key in keys if key and key not in self.cache}
+        for chunk in _chunks(missing):
+            for pk, email, username in User.objects.filter(
+                Q(email__in=chunk) | Q(username__in=chunk)
+            ).values_list('pk', 'email', 'username'):
+                self.cache[email] = pk
+                self.cache[username] = pk
+        for key in missing:
+            self.cache.setdefault(key, None)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+
+class CategoryLookup:
+    """Category slug or name (any case) to id; categories are few, so all are loaded"""
+
+    def __init__(self, create=False):
+        self.create = create
+        self.cache = {}
+        for pk, slug, name in Category.objects.values_list('pk', 'slug', 'name'):
+            self._remember(pk, slug, name)
+
+    def _remember(self, pk, slug, name):
+        self.cache[slug] = pk
+        self.cache[name.lower()] = pk
+
+    def get(self, key):
+        if not key:
+            return None
+        pk = self.cache.get(key) or self.cache.get(key.lower()) or self.cache.get(slugify(key))
+        if pk is None:
+            if not self.create:
+                raise RecordRejected(f'category: no category {key!r}')
+            category = Category(name=key)
+            category.save()
+            self._remember(category.pk, category.slug, category.name)
+            pk = category.pk
+        return pk
+
+
+class SlugAllocator:
+    """
+    Hands out slugs unique across the database and everything allocated so
+    far: the wanted slug, else the lowest free ``-N`` suffix
+    """
+
+    def __init__(self, max_length=SLUG_MAX_LENGTH):
+        self.max_length = max_length
+        self.taken = set()
+        self.checked = set()
+        self.scanned = set()
+        self.next_suffix = {}
+
+    def _load(self, slugs):
+        """Add the stored slugs among ``slugs`` to ``taken``; returns those found"""
+        found = set()
+        for chunk in _chunks(set(slugs) - self.checked):
+            found.update(Blog.objects.filter(slug__in=chunk).values_list('slug', flat=True))
+            self.checked.update(chunk)
+        self.taken.update(found)
+        return found
+
+    def _scan(self, bases):
+        """Load every stored ``<base>-...`` slug, so suffixes can be picked without probing"""
+        for chunk in _chunks(set(bases) - self.scanned, 200):
+            self.taken.update(Blog.objects.filter(
+                reduce(or_, (Q(slug__startswith=f'{base}-') for base in chunk))
+            ).values_list('slug', flat=True))
+            self.scanned.update(chunk)
+
+    def exists(self, slugs):
+        """Which of ``slugs`` are already stored"""
+        self._load(slugs)
+        return {slug for slug in slugs if slug in self.taken}
+
+    def _pick(self, base):
+        slug = base
+        number = self.next_suffix.get(base, 2)
+        while slug in self.taken:
+            suffix = f'-{number}'
+            slug = base[:self.max_length - len(suffix)].rstrip('-') + suffix
+            number += 1
+        if slug != base:
+            self.next_suffix[base] = number
+        return slug
+
+    def allocate(self, bases):
+        """One unique slug for each of ``bases``, in order"""
+        self._load(bases)
+        self._scan(base for base in bases if base in self.taken)
+        slugs = [None] * len(bases)
+        pending = list(range(len(bases)))
+        while pending:
+            for index in pending:
+                slugs[index] = self._pick(bases[index])
+                self.taken.add(slugs[index])
+            # Truncated bases can produce suffixed slugs the prefix scan missed
+            clashes = self._load(slugs[index] for index in pending)
+            pending = [index for index in pending if slugs[index] in clashes]
+        return slugs
+
+
+class ImportResult:
+    def __init__(self, name=None, position=0, imported=0, rejected=0):
+        self.name = name
+        self.position = position
+        self.imported = imported
+        self.rejected = rejected
+        self.rejections = []
+        self.resumed_from = position
+        self.batches = 0
+
+    def reject(self, line, reason):
+        self.rejected += 1
+        if len(self.rejections) < MAX_REPORTED_REJECTIONS:
+            self.rejections.append((line, reason))
+
+
+class BlogImporter:
+    """
+    Imports batches of record dicts; see ``import_blogs`` for the options.
+    Holds the lookup caches and slug allocator for the length of one run.
+    """
+
+    def __init__(self, default_author=None, default_status='draft', create_categories=False,
+                 existing='rename', batch_size=2000, log=None):
+        if default_status not in STATUSES:
+            raise BlogImportError(f'Unknown status {default_status!r}')
+        if existing not in ('rename', 'skip'):
+            raise BlogImportError("existing must be 'rename' or 'skip'")
+        self.default_author = default_author
+        self.default_status = default_status
+        self.existing = existing
+        self.batch_size = batch_size
+        self.log = log
+        self.authors = AuthorLookup()
+        self.categories = CategoryLookup(create=create_categories)
+        self.slugs = SlugAllocator()
+        self.feed_horizon = None
+
+    def build(self, record):
+        """An unsaved Blog from one record, slug not yet allocated; raises RecordRejected"""
+        if isinstance(record, RecordRejected):
+            raise record
+        title = _text(record, 'title')
+        # Kept verbatim (Markdown can depend on leading whitespace), so not through _text()
+        body = record.get('body')
+        if body is None:
+            body = ''
+        elif not isinstance(body, str):
+            raise RecordRejected('body: not a string')
+        if not title:
+            raise RecordRejected('title: missing')
+        if len(title) > TITLE_MAX_LENGTH:
+            raise RecordRejected(f'title: longer than {TITLE_MAX_LENGTH} characters')
+        if not body.strip():
+            raise RecordRejected('body: missing')
+        author_key = _text(record, 'author') or self.default_author
+        if not author_key:
+            raise RecordRejected('author: missing')
+        author_id = self.authors.get(author_key)
+        if author_id is None:
+            raise RecordRejected(f'author: no user with email or username {author_key!r}')
+        status = _text(record, 'status') or self.default_status
+        if status not in STATUSES:
+            raise RecordRejected(f'status: {status!r} is not one of {", ".join(sorted(STATUSES))}')
+        views = _text(record, 'views_count') or '0'
+        if not views.isdigit():
+            raise RecordRejected(f'views_count: {views!r} is not a non-negative integer')
+
+        blog = Blog(
+            title=title,
+            body=body,
+            excerpt=_text(record, 'excerpt')[:Blog._meta.get_field('excerpt').max_length],
+            author_id=author_id,
+            category_id=self.categories.get(_text(record, 'category')),
+            status=status,
+            created_at=_parse_moment(_text(record, 'created_at'), 'created_at') or timezone.now(),
+            published_at=_parse_moment(_text(record, 'published_at'), 'published_at'),
+            views_count=int(views),
+        )
+        if status != 'published':
+            blog.published_at = None
+        blog.fill_derived_fields()
+        wanted = _text(record, 'slug')
+        blog._wanted_slug = slugify(wanted) if wanted else ''
+        blog._base_slug = (blog._wanted_slug or slugify(title) or 'post')[:SLUG_MAX_LENGTH].rstrip('-') or 'post'
+        return blog
+
+    def import_batch(self, records, result, checkpoint=None):
+        """Validate and write one batch of (line, record) pairs, with the checkpoint if any"""
+        self.authors.prefetch(
+            {_text(record, 'author') for _, record in records if isinstance(record, dict)}
+            | {self.default_author}
+        )
+        blogs = []
+        for line, record in records:
+            try:
+                blog = self.build(record)
+            except RecordRejected as error:
+                result.reject(line, str(error))
+            else:
+                blog._line = line
+                blogs.append(blog)
+
+        if self.existing == 'skip':
+            stored = self.slugs.exists([blog._wanted_slug for blog in blogs if blog._wanted_slug])
+            kept = []
+            for blog in blogs:
+                if blog._wanted_slug in stored:
+                    result.reject(blog._line, f'slug: {blog._wanted_slug!r} exists, skipped')
+                else:
+                    kept.append(blog)
+            blogs = kept
+
+        with transaction.atomic():
+            for blog, slug in zip(blogs, self.slugs.allocate([blog._base_slug for blog in blogs])):
+                blog.slug = slug
+            Blog.objects.bulk_create(blogs, batch_size=self.batch_size)
+            self.apply_side_effects(blogs)
+            result.imported += len(blogs)
+            result.position += len(records)
+            result.batches += 1
+            if checkpoint is not None:
+                checkpoint.position = result.position
+                checkpoint.imported = result.imported
+                checkpoint.rejected = result.rejected
+                checkpoint.save(update_fields=['position', 'imported', 'rejected', 'updated_at'])
+        if self.log:
+            self.log(f'  {result.position} records read, {result.imported} imported, {result.rejected} rejected')
+
+    def apply_side_effects(self, blogs):
+        """What blog.signals would have done for each post, batched"""
+        from profiles import feed
+        from profiles.models import AuthorStats
+
+        if not blogs:
+            return
+        search.index_blogs(blog.pk for blog in blogs)
+        author_ids = {blog.author_id for blog in blogs}
+        AuthorStats.rebuild(user_ids=author_ids)
+        if self.feed_horizon is None:
+            config = feed.get_config()
+            self.feed_horizon = timezone.now() - timedelta(days=config['MAX_AGE_DAYS'])
+        feed.fan_out_many(
+            blog.pk for blog in blogs if blog.status == 'published' and blog.published_at >= self.feed_horizon
+        )
+        tags = {'blogs'}
+        tags.update(f'author-blogs:{author_id}' for author_id in author_ids)
+        tags.update(f'category-blogs:{blog.category_id}' for blog in blogs)
+        transaction.on_commit(lambda: invalidate_tags(*tags))
+
+    def run(self, records, result, checkpoint=None):
+        """Import ``records`` (an iterable of (line, record)) batch by batch"""
+        for batch in _batched(records, self.batch_size):
+            self.import_batch(batch, result, checkpoint)
+        if result.imported:
+            leaderboards.refresh_all()
+        return result
+
+
+def import_blogs(source, format=None, name=None, restart=False, **options):
+    """
+    Import posts from ``source``, a path or a text stream, in ``format``
+    ('jsonl' or 'csv'; guessed from a path's extension).
+
+    With a ``name`` (default: the absolute path of a file source) progress
+    is checkpointed, and calling again with the same name resumes after the
+    last committed batch; ``restart=True`` starts over instead.  The other
+    options go to ``BlogImporter``:
+
+    - ``default_author``: email or username for records without an author
+    - ``default_status``: status of records without one ('draft')
+    - ``create_categories``: create unknown categories instead of rejecting the record
+    - ``existing``: a record whose ``slug`` is taken gets a suffixed one
+      ('rename', the default) or is skipped ('skip', for re-running exports)
+    - ``batch_size``: records per transaction (2000)
+    - ``log``: callable receiving progress lines
+
+    Returns an ``ImportResult``; invalid records are counted and listed in
+    ``result.rejections`` rather than aborting the import.
+    """
+    is_path = isinstance(source, (str, os.PathLike))
+    if is_path:
+        source = os.fspath(source)
+        format = format or detect_format(source)
+        if name is None:
+            name = os.path.abspath(source)
+    elif format is None:
+        raise BlogImportError('The format is required when importing from a stream')
+    importer = BlogImporter(**options)
+
+    checkpoint = None
+    result = ImportResult(name)
+    if name is not None:
+        if not is_path:
+            raise BlogImportError('Resumable imports need a file path')
+        digest = fingerprint(source)
+        if restart:
+            BlogImport.objects.filter(name=name).delete()
+        checkpoint, created = BlogImport.objects.get_or_create(name=name, defaults={'fingerprint': digest})
+        if not created and checkpoint.fingerprint != digest:
+            raise BlogImportError(
+                f'{source} changed since import {name!r} started; pass restart=True to import it afresh'
+            )
+        result = ImportResult(name, checkpoint.position, checkpoint.imported, checkpoint.rejected)
+
+    handle = open(source, newline='', encoding='utf-8-sig') if is_path else source
+    try:
+        records = read_records(handle, format)
+        for _ in range(result.position):
+            if next(records, None) is None:
+                break
+        importer.run(records, result, checkpoint)
+    finally:
+        if is_path:
+            handle.close()
+    if checkpoint is not None:
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=['finished_at', 'updated_at'])
+    return result
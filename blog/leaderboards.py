@@ -0,0 +1,229 @@
+"""
+Precomputed top-N leaderboards of published blogs.
+
+Each board (top rated, most viewed, trending) is stored as one
+``Leaderboard`` row of ranked blog ids, so serving one costs a cache hit or
+two small queries instead of an aggregation.  Boards are refreshed by the
+``refresh_leaderboards`` command on a schedule, on a cache miss once they
+are older than ``MAX_AGE``, and the rating board also incrementally when a
+rating change can move it.  A board found stale on a cache miss is still
+served while a background thread refreshes it (``BACKEND = 'sync'`` refreshes
+inline); only a board that does not exist yet is built by the request.
+Settings live in ``LEADERBOARDS``.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Blog, Leaderboard
+from .pagecache import invalidate_tags
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'thread',      # 'thread' (background refresh of stale boards) or 'sync'
+    'SIZE': 10,
+    'MAX_AGE': 300,
+    'TRENDING_WINDOW_DAYS': 14,
+    'TRENDING_GRAVITY': 1.5,
+    'TRENDING_RATING_WEIGHT': 5,
+}
+
+CACHE_KEY = 'leaderboard:{}'
+REFRESHING_KEY = 'leaderboard:{}:refreshing'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LEADERBOARDS', {}))
+    return config
+
+
+def _published():
+    return Blog.objects.filter(status='published')
+
+
+def compute_rating(size, config):
+    rows = _published().order_by('-rating_average', '-views_count').values_list('id', 'rating_average')
+    return [[blog_id, score] for blog_id, score in rows[:size]]
+
+
+def compute_views(size, config):
+    rows = _published().order_by('-views_count', '-published_at').values_list('id', 'views_count')
+    return [[blog_id, score] for blog_id, score in rows[:size]]
+
+
+def compute_trending(size, config):
+    """Views plus weighted rating points, decayed by age in hours (HN-style gravity)"""
+    now = timezone.now()
+    since = now - timezone.timedelta(days=config['TRENDING_WINDOW_DAYS'])
+    rows = _published().filter(published_at__gte=since).values_list(
+        'id', 'views_count', 'rating_sum', 'published_at'
+    )
+    scored = []
+    for blog_id, views, rating_sum, published_at in rows.iterator(chunk_size=2000):
+        age_hours = max((now - published_at).total_seconds() / 3600, 0)
+        points = views + config['TRENDING_RATING_WEIGHT'] * rating_sum
+        scored.append([blog_id, points / (age_hours + 2) ** config['TRENDING_GRAVITY']])
+    scored.sort(key=lambda entry: entry[1], reverse=True)
+    return scored[:size]
+
+
+COMPUTERS = {
+    'rating': compute_rating,
+    'views': compute_views,
+    'trending': compute_trending,
+}
+
+
+def refresh(board):
+    config = get_config()
+    leaderboard = Leaderboard(
+        board=board, entries=COMPUTERS[board](config['SIZE'], config), refreshed_at=timezone.now(),
+    )
+    # A bare UPDATE, or INSERT for a new board: a missing board is built by
+    # the page request, where update_or_create()'s transaction and savepoint
+    # would cost four more queries
+    updated = Leaderboard.objects.filter(board=board).update(
+        entries=leaderboard.entries, refreshed_at=leaderboard.refreshed_at,
+    )
+    if not updated:
+        try:
+            leaderboard.save(force_insert=True)
+        except IntegrityError:
+            # A concurrent refresh created the board first; its ranking is as fresh
+            leaderboard = Leaderboard.objects.get(board=board)
+    cache.delete(CACHE_KEY.format(board))
+    invalidate_tags('leaderboard')
+    return leaderboard
+
+
+def refresh_all():
+    return [refresh(board) for board in COMPUTERS]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run(board):
+    try:
+        refresh(board)
+    except Exception:
+        logger.exception('Refreshing the %s leaderboard failed', board)
+    finally:
+        cache.delete(REFRESHING_KEY.format(board))
+        close_old_connections()
+
+
+def refresh_later(board):
+    """Refresh ``board`` off the request; requests finding it stale meanwhile do not queue more"""
+    global _executor
+    if not cache.add(REFRESHING_KEY.format(board), 1, 60):
+        return
+    if get_config()['BACKEND'] != 'thread':
+        _run(board)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='leaderboards')
+    _executor.submit(_run, board)
+
+
+class FeaturedBlogs:
+    """A served leaderboard: ranked blogs plus when the ranking was computed"""
+
+    def __init__(self, board, blogs, refreshed_at):
+        self.board = board
+        self.blogs = blogs
+        self.refreshed_at = refreshed_at
+
+    def __iter__(self):
+        return iter(self.blogs)
+
+    def __len__(self):
+        return len(self.blogs)
+
+    def __bool__(self):
+        return bool(self.blogs)
+
+    @property
+    def staleness(self):
+        return timezone.now() - self.refreshed_at
+
+
+def get_featured(board, limit=3):
+    key = CACHE_KEY.format(board)
+    featured = cache.get(key)
+    if featured is None:
+        config = get_config()
+        leaderboard = Leaderboard.objects.filter(board=board).first()
+        if leaderboard is None:
+            leaderboard = refresh(board)
+        blog_ids = leaderboard.get_blog_ids()
+        blogs = _published().select_related('author').in_bulk(blog_ids)
+        ranked = [blogs[blog_id] for blog_id in blog_ids if blog_id in blogs]
+        featured = FeaturedBlogs(board, ranked, leaderboard.refreshed_at)
+        cache.set(key, featured, config['MAX_AGE'])
+        staleness = leaderboard.get_staleness()
+        if staleness is None or staleness.total_seconds() > config['MAX_AGE']:
+            # After the set above, so the refresh's cache delete wins
+            refresh_later(board)
+    if len(featured.blogs) > limit:
+        featured = FeaturedBlogs(board, featured.blogs[:limit], featured.refreshed_at)
+    return featured
+
+
+async def aget_featured(board, limit=3):
+    """``get_featured()`` for async views: a cache hit is served without a thread hop"""
+    featured = cache.get(CACHE_KEY.format(board))
+    if featured is None:
+        return await sync_to_async(get_featured)(board, limit)
+    if len(featured.blogs) > limit:
+        featured = FeaturedBlogs(board, featured.blogs[:limit], featured.refreshed_at)
+    return featured
+
+
+def _refresh_rating_board(blog_ids):
+    """Refresh the rating board unless none of ``blog_ids`` can enter or move it"""
+    leaderboard = Leaderboard.objects.filter(board='rating').first()
+    if leaderboard is None:
+        return
+    entries = leaderboard.entries
+    if len(entries) >= get_config()['SIZE'] and not blog_ids & set(leaderboard.get_blog_ids()):
+        best = _published().filter(pk__in=blog_ids).order_by('-rating_average').values_list(
+            'rating_average', flat=True
+        ).first()
+        if best is None or best < entries[-1][1]:
+            return
+    refresh('rating')
+
+
+def rating_changed(blog_id):
+    """Refresh the rating board after commit if the change can alter the ranking
+
+    Blog ids collect in a set on the connection; the first callback to run
+    after commit takes the whole set, so a transaction changing many ratings
+    checks the board once.  A callback is registered per change because a
+    rolled back (savepoint) callback would otherwise strand the set; ids left
+    over from a rollback only cost an extra check at the next commit.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(connection, '_pending_rating_blog_ids', None)
+    if pending is None:
+        pending = connection._pending_rating_blog_ids = set()
+    pending.add(blog_id)
+
+    def refresh_pending():
+        blog_ids = set(pending)
+        pending.clear()
+        if blog_ids:
+            _refresh_rating_board(blog_ids)
+
+    transaction.on_commit(refresh_pending)
@@ -0,0 +1,109 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from blog import api, benchmarks, datasets, markup
+from blog.models import Blog
+
+# (label, query string of /api/v1/blogs/)
+CASES = [
+    ('default fields', ''),
+    ('default fields, include', 'include=author,category'),
+    ('all fields (with body)', 'fields=' + ','.join(api.RESOURCES['blogs'].fields)),
+    ('three fields', 'fields=slug,title,published_at'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure serialization throughput of the JSON API blog list at large page sizes, against '
+        'serializing the same page from model instances. Runs on a synthetic dataset in a throwaway '
+        'database unless --use-current-db is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(datasets.SCALES), default='small')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--use-current-db', action='store_true')
+        parser.add_argument('--page-size', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed pages per case')
+
+    def handle(self, *args, **options):
+        if options['use_current_db']:
+            self.run(options)
+            return
+        with benchmarks.isolated_database():
+            started = time.perf_counter()
+            datasets.generate(datasets.get_counts(options['scale']), seed=options['seed'])
+            # Stored renderings, as on a live site; otherwise every page would render Markdown
+            markup.rerender(markup.stale_ids(), workers=1)
+            self.stdout.write(f'Built the {options["scale"]} dataset in {time.perf_counter() - started:.1f}s')
+            self.run(options)
+
+    def run(self, options):
+        page_size = options['page_size']
+        available = Blog.objects.filter(status='published').count()
+        if available < page_size:
+            raise CommandError(f'Only {available} published posts; use a larger --scale or a smaller --page-size.')
+        factory = RequestFactory()
+        self.stdout.write(f'{page_size} posts per page, median of {options["repeat"]} pages')
+        self.stdout.write(f'{"case":<34} {"queries":>7} {"ms/page":>9} {"items/s":>10} {"KiB":>8}')
+
+        def api_page(query):
+            separator = '&' if query else ''
+            request = factory.get(f'/api/v1/blogs/?page_size={page_size}{separator}{query}')
+            request.user = AnonymousUser()
+            response = api.list_view(request, type='blogs')
+            if response.status_code != 200:
+                raise CommandError(response.content.decode())
+            return response.content
+
+        baseline = lambda: self.instance_page(page_size)
+        for label, run in [('model instances, include', baseline)] + [
+            (f'values: {label}', lambda query=query: api_page(query)) for label, query in CASES
+        ]:
+            content = run()
+            with CaptureQueriesContext(connection) as queries:
+                run()
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+            median = statistics.median(timings)
+            self.stdout.write(
+                f'{label:<34} {len(queries):>7} {median * 1000:>9.1f} {page_size / median:>10.0f} '
+                f'{len(content) / 1024:>8.0f}'
+            )
+
+    def instance_page(self, page_size):
+        """The default list payload with includes, built the usual way from model instances"""
+        resource = api.RESOURCES['blogs']
+        fields = [name for name in resource.select(None, detail=False) if resource.fields[name] is not None]
+        blogs = list(
+            Blog.objects.filter(status='published')
+            .select_related('author', 'category')
+            .order_by('-published_at', '-id')[:page_size + 1]
+        )[:page_size]
+        data = [{name: getattr(blog, resource.fields[name]) for name in fields} for blog in blogs]
+        authors = {blog.author_id: blog.author for blog in blogs}
+        categories = {blog.category_id: blog.category for blog in blogs if blog.category_id}
+        included = {
+            'authors': [
+                {'id': user.pk, 'username': user.username, 'first_name': user.first_name, 'last_name': user.last_name}
+                for user in authors.values()
+            ],
+            'categories': [
+                {'id': category.pk, 'slug': category.slug, 'name': category.name,
+                 'description': category.description, 'created_at': category.created_at}
+                for category in categories.values()
+            ],
+        }
+        payload = {'data': data, 'included': included, 'links': {'next': None, 'prev': None}}
+        return json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from blog import search
+from blog.benchmarks import stand_in_templates
+from blog.models import Blog, Category, Rating
+from profiles import search as author_search
+from profiles.models import AuthorProfile, AuthorStats
+
+User = get_user_model()
+
+# Server processes under test: (label, uvicorn arguments, DJANGO_ASYNC_READ_VIEWS)
+MODES = {
+    'wsgi': ('WSGI, sync views', ['blog_site.wsgi:application', '--interface', 'wsgi'], '0'),
+    'asgi-sync': ('ASGI, sync views', ['blog_site.asgi:application'], '0'),
+    'asgi': ('ASGI, async views', ['blog_site.asgi:application'], '1'),
+}
+
+SETTINGS_TEMPLATE = '''from blog_site.settings import *
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+DATABASES = {{'default': {{**DATABASES['default'], 'NAME': {database!r}}}}}
+TEMPLATES[0]['DIRS'] = [{templates!r}] + list(TEMPLATES[0]['DIRS'])
+STORAGES = {{**STORAGES, 'staticfiles': {{'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}}}
+PAGE_CACHE = {{**PAGE_CACHE, 'ENABLED': {page_cache!r}}}
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the read-heavy pages under uvicorn: WSGI with the sync views, ASGI with '
+        'the sync views, and ASGI with the native async views, against a synthetic '
+        'database. Reports requests per second and latency percentiles.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blogs', type=int, default=5000)
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per mode')
+        parser.add_argument('--concurrency', type=int, default=32, help='Open keep-alive connections')
+        parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--page-cache', action='store_true', help='Leave the anonymous page cache on')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='benchmark-asgi-')
+        database = os.path.join(workdir, 'db.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = database
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            search._fts_available = author_search._fts_available = None
+            started = time.perf_counter()
+            urls = self.populate(options, random.Random(options['seed']))
+            self.stdout.write(f'Built {options["blogs"]} posts in {time.perf_counter() - started:.1f}s')
+            connection.close()
+            settings_module = self.write_settings(workdir, database, options['page_cache'])
+
+            self.stdout.write(f'{"mode":<20}{"req/s":>10}{"p50":>10}{"p99":>10}{"errors":>8}')
+            for mode in options['modes']:
+                label, arguments, async_views = MODES[mode]
+                result = self.run_mode(workdir, settings_module, arguments, async_views, urls, options)
+                self.stdout.write(
+                    f'{label:<20}{result["rps"]:>10.0f}{result["p50"]:>8.1f}ms'
+                    f'{result["p99"]:>8.1f}ms{result["errors"]:>8}'
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            search._fts_available = author_search._fts_available = None
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def populate(self, options, rng):
+        categories = Category.objects.bulk_create([
+            Category(name=f'Category {number}', slug=f'category-{number}') for number in range(12)
+        ])
+        authors = User.objects.bulk_create([
+            User(username=f'author{number}', email=f'author{number}@example.com', first_name='Author',
+                 last_name=str(number), role='author', password='!')
+            for number in range(options['authors'])
+        ])
+        readers = User.objects.bulk_create([
+            User(username=f'reader{number}', email=f'reader{number}@example.com', role='reader', password='!')
+            for number in range(50)
+        ])
+        AuthorProfile.objects.bulk_create([AuthorProfile(user=author, bio='Writes about things.') for author in authors])
+        words = ['django', 'python', 'async', 'database', 'query', 'template', 'cache', 'server', 'index', 'view']
+        now = time.time()
+        blogs = []
+        for number in range(options['blogs']):
+            title = ' '.join(rng.choices(words, k=5)).title()
+            blogs.append(Blog(
+                title=title, slug=f'post-{number}', author=rng.choice(authors), category=rng.choice(categories),
+                body=' '.join(rng.choices(words, k=300)), excerpt=title, status='published',
+                views_count=rng.randint(0, 5000),
+                published_at=_aware(now - rng.randint(0, 365 * 24 * 3600)),
+            ))
+        Blog.objects.bulk_create(blogs, batch_size=1000)
+        blog_ids = list(Blog.objects.values_list('pk', flat=True))
+        Rating.objects.bulk_create([
+            Rating(user=reader, blog_id=blog_id, score=rng.randint(0, 6))
+            for reader in readers for blog_id in rng.sample(blog_ids, 40)
+        ], ignore_conflicts=True)
+        Blog.rebuild_rating_aggregates()
+        AuthorStats.rebuild()
+        AuthorStats.sync_directory()
+        search.rebuild_index()
+        author_search.rebuild_index()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        urls = ['/', '/?sort=popular', '/?sort=rating', '/profiles/authors/', '/profiles/authors/?sort=blogs']
+        urls += [f'/blog/post-{rng.randrange(options["blogs"])}/' for _ in range(200)]
+        urls += [f'/category/category-{number}/' for number in range(12)]
+        urls += [f'/author/author{rng.randrange(options["authors"])}/' for _ in range(20)]
+        urls += [f'/profiles/author/author{rng.randrange(options["authors"])}/' for _ in range(20)]
+        return urls
+
+    def write_settings(self, workdir, database, page_cache):
+        templates = stand_in_templates(os.path.join(workdir, 'templates'))
+        with open(os.path.join(workdir, 'benchmark_settings.py'), 'w') as handle:
+            handle.write(SETTINGS_TEMPLATE.format(database=database, templates=templates, page_cache=page_cache))
+        return 'benchmark_settings'
+
+    def run_mode(self, workdir, settings_module, arguments, async_views, urls, options):
+        port = _free_port()
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=settings_module,
+            DJANGO_ASYNC_READ_VIEWS=async_views,
+            PYTHONPATH=os.pathsep.join([workdir, str(settings.BASE_DIR), os.environ.get('PYTHONPATH', '')]),
+        )
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', *arguments, '--port', str(port), '--workers', str(options['workers']),
+             '--no-access-log', '--log-level', 'warning'],
+            env=env, cwd=str(settings.BASE_DIR),
+        )
+        try:
+            _wait_for_port(port, server)
+            # Warm up every URL once (template loading, leaderboards, per-process caches)
+            asyncio.run(load(port, urls, 1, len(urls) * 2, random.Random(0), limit=len(urls)))
+            return asyncio.run(load(port, urls, options['concurrency'], options['duration'], random.Random(options['seed'])))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def _aware(timestamp):
+    from datetime import datetime, timezone
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise CommandError(f'uvicorn exited with status {server.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError('uvicorn did not start listening')
+
+
+async def fetch(reader, writer, path):
+    """One keep-alive GET; returns the status code"""
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept-Encoding: identity\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1])
+
+
+async def load(port, urls, concurrency, duration, rng, limit=None):
+    """Keep ``concurrency`` connections busy for ``duration`` seconds (or ``limit`` requests)"""
+    timings = []
+    errors = 0
+    issued = 0
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        nonlocal errors, issued
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while time.monotonic() < deadline and (limit is None or issued < limit):
+                issued += 1
+                path = urls[issued % len(urls)] if limit is not None else rng.choice(urls)
+                started = time.perf_counter()
+                try:
+                    status = await fetch(reader, writer, path)
+                except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    writer.close()
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                    continue
+                timings.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    errors += 1
+        finally:
+            writer.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+    timings.sort()
+    if not timings:
+        return {'rps': 0, 'p50': 0, 'p99': 0, 'errors': errors}
+    return {
+        'rps': len(timings) / elapsed,
+        'p50': timings[len(timings) // 2],
+        'p99': timings[max(int(len(timings) * 0.99) - 1, 0)],
+        'errors': errors,
+    }
@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+COUNTER_KEY = 'benchmark:counter'
+
+
+def run_worker(backend, location, options, seed, barrier, results):
+    cache = import_string(backend)(location, {'OPTIONS': options['cache_options'], 'TIMEOUT': None})
+    rng = random.Random(seed)
+    value = os.urandom(options['value_size'])
+    keys = [f'benchmark:{index}' for index in range(options['keys'])]
+    # Zipf-like popularity, as page and fragment caches see
+    weights = [1.0 / rank for rank in range(1, len(keys) + 1)]
+    picks = rng.choices(keys, weights, k=options['operations'])
+    reads = [rng.random() < options['read_ratio'] for _ in picks]
+    barrier.wait()
+
+    hits = misses = 0
+    started = time.perf_counter()
+    for key, read in zip(picks, reads):
+        if read:
+            if cache.get(key) is None:
+                misses += 1
+                cache.set(key, value)
+            else:
+                hits += 1
+        else:
+            cache.set(key, value)
+    elapsed = time.perf_counter() - started
+
+    incr_started = time.perf_counter()
+    for _ in range(options['increments']):
+        cache.incr(COUNTER_KEY)
+    incr_elapsed = time.perf_counter() - incr_started
+    results.put((elapsed, hits, misses, incr_elapsed))
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare get/set throughput, hit ratio and increment atomicity of the locmem, file-based '
+        'and shared-memory cache backends with several worker processes. Uses scratch locations only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=20000, help='get/set operations per process')
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--value-size', type=int, default=512, help='Bytes per value')
+        parser.add_argument('--read-ratio', type=float, default=0.9)
+        parser.add_argument('--increments', type=int, default=500, help='incr() calls per process on one shared key')
+        parser.add_argument('--backends', nargs='+', choices=['locmem', 'file', 'shm'], default=['locmem', 'file', 'shm'])
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='benchmark-cache-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        backends = {
+            'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'benchmark', {'MAX_ENTRIES': options['keys'] * 2}),
+            'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(workdir, 'files'),
+                     {'MAX_ENTRIES': options['keys'] * 2}),
+            'shm': ('blog_site.shmcache.SharedMemoryCache', os.path.join(workdir, 'shared'),
+                    {'SLOTS': options['keys'] * 2, 'SLOT_SIZE': max(1024, options['value_size'] * 2)}),
+        }
+        self.stdout.write(
+            f'{options["processes"]} processes x {options["operations"]} operations, {options["keys"]} keys, '
+            f'{options["value_size"]}-byte values, {options["read_ratio"]:.0%} reads'
+        )
+        self.stdout.write(f'{"backend":<8} {"ops/s":>10} {"hit ratio":>10} {"incr/s":>10} {"counter":>16}')
+        try:
+            for name in options['backends']:
+                backend, location, cache_options = backends[name]
+                self.run_backend(name, backend, location, dict(options, cache_options=cache_options))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_backend(self, name, backend, location, options):
+        cache = import_string(backend)(location, {'OPTIONS': options['cache_options'], 'TIMEOUT': None})
+        cache.clear()
+        cache.set(COUNTER_KEY, 0)
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(options['processes'])
+        results = context.Queue()
+        workers = [
+            context.Process(target=run_worker, args=(backend, location, options, seed, barrier, results))
+            for seed in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        elapsed = max(outcome[0] for outcome in outcomes)
+        hits = sum(outcome[1] for outcome in outcomes)
+        misses = sum(outcome[2] for outcome in outcomes)
+        incr_elapsed = max(outcome[3] for outcome in outcomes)
+        increments = options['increments'] * options['processes']
+        if name == 'locmem':
+            # Every process counted in its own copy
+            counter = 'per process'
+        else:
+            counter = f'{cache.get(COUNTER_KEY)}/{increments}'
+        reads = hits + misses
+        self.stdout.write(
+            f'{name:<8} {options["operations"] * options["processes"] / elapsed:>10.0f} '
+            f'{hits / reads if reads else 0:>10.1%} {increments / incr_elapsed if incr_elapsed else 0:>10.0f} '
+            f'{counter:>16}'
+        )
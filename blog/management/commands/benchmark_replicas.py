@@ -0,0 +1,138 @@
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from blog import search
+from blog.benchmarks import stand_in_templates
+from blog.management.commands import benchmark_asgi
+from profiles import search as author_search
+
+SETTINGS_TEMPLATE = '''from blog_site.settings import *
+from blog_site import sqlite
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+DATABASES = {{'default': sqlite.database({primary!r}, {profile!r})}}
+DATABASES.update({{
+    f'replica{{number}}': sqlite.replica(name, {profile!r}) for number, name in enumerate({replicas!r}, 1)
+}})
+DATABASE_ROUTING = {{**DATABASE_ROUTING, 'REPLICAS': [alias for alias in DATABASES if alias != 'default']}}
+TEMPLATES[0]['DIRS'] = [{templates!r}] + list(TEMPLATES[0]['DIRS'])
+STORAGES = {{**STORAGES, 'staticfiles': {{'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}}}
+PAGE_CACHE = {{**PAGE_CACHE, 'ENABLED': False}}
+'''
+
+# Background write load on the primary: batches of view counts, as the buffer flushes them
+WRITER = '''
+import random, sys, time
+import django
+django.setup()
+from blog.models import Blog
+from blog.viewcounts import write_counts
+rng = random.Random(int(sys.argv[2]))
+blog_ids = list(Blog.objects.values_list('pk', flat=True))
+deadline = time.monotonic() + float(sys.argv[1])
+while time.monotonic() < deadline:
+    write_counts({blog_id: rng.randint(1, 3) for blog_id in rng.sample(blog_ids, 20)})
+    time.sleep(0.005)
+'''
+
+
+class Command(benchmark_asgi.Command):
+    help = (
+        'Load-test the read-heavy pages under uvicorn while another process writes to the '
+        'primary, with 0, 1, 2... local SQLite replicas kept current by sync_replica. '
+        'Reports requests per second and latency percentiles per replica count.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replicas', type=int, nargs='+', default=[0, 1, 2])
+        parser.add_argument('--profile', default='development', help='SQLite profile of every database')
+        parser.add_argument('--blogs', type=int, default=3000)
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument('--duration', type=float, default=8.0, help='Seconds per run')
+        parser.add_argument('--concurrency', type=int, default=16, help='Open keep-alive connections')
+        parser.add_argument('--workers', type=int, default=2, help='uvicorn worker processes')
+        parser.add_argument('--writers', type=int, default=1, help='Processes writing to the primary')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='benchmark-replicas-')
+        template = os.path.join(workdir, 'template.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = template
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            search._fts_available = author_search._fts_available = None
+            urls = self.populate(options, random.Random(options['seed']))
+            connection.close()
+            stand_in_templates(os.path.join(workdir, 'templates'))
+
+            self.stdout.write(f'{"replicas":<10}{"req/s":>10}{"p50":>10}{"p99":>10}{"errors":>8}')
+            for count in options['replicas']:
+                result = self.run_replicas(workdir, template, count, urls, options)
+                self.stdout.write(
+                    f'{count:<10}{result["rps"]:>10.0f}{result["p50"]:>8.1f}ms'
+                    f'{result["p99"]:>8.1f}ms{result["errors"]:>8}'
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            search._fts_available = author_search._fts_available = None
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_replicas(self, workdir, template, count, urls, options):
+        rundir = os.path.join(workdir, f'run-{count}')
+        os.makedirs(rundir)
+        primary = os.path.join(rundir, 'primary.sqlite3')
+        shutil.copyfile(template, primary)
+        replicas = [os.path.join(rundir, f'replica{number}.sqlite3') for number in range(1, count + 1)]
+        for name in replicas:
+            shutil.copyfile(template, name)
+        with open(os.path.join(rundir, 'replica_settings.py'), 'w') as handle:
+            handle.write(SETTINGS_TEMPLATE.format(
+                primary=primary, replicas=replicas, profile=options['profile'],
+                templates=os.path.join(workdir, 'templates'),
+            ))
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='replica_settings',
+            PYTHONPATH=os.pathsep.join([rundir, str(settings.BASE_DIR), os.environ.get('PYTHONPATH', '')]),
+        )
+        port = benchmark_asgi._free_port()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'blog_site.wsgi:application', '--interface', 'wsgi',
+             '--port', str(port), '--workers', str(options['workers']), '--no-access-log', '--log-level', 'warning'],
+            env=env, cwd=str(settings.BASE_DIR),
+        )
+        helpers = []
+        try:
+            benchmark_asgi._wait_for_port(port, server)
+            asyncio.run(benchmark_asgi.load(port, urls, 1, len(urls) * 2, random.Random(0), limit=len(urls)))
+            run_seconds = str(options['duration'] + 1)
+            helpers += [
+                subprocess.Popen([sys.executable, '-c', WRITER, run_seconds, str(number)], env=env)
+                for number in range(options['writers'])
+            ]
+            if count:
+                helpers.append(subprocess.Popen(
+                    [sys.executable, 'manage.py', 'sync_replica', '--loop', '--verbosity', '0'],
+                    env=env, cwd=str(settings.BASE_DIR),
+                ))
+            time.sleep(0.5)
+            return asyncio.run(benchmark_asgi.load(
+                port, urls, options['concurrency'], options['duration'], random.Random(options['seed'])
+            ))
+        finally:
+            for process in [server, *helpers]:
+                process.terminate()
+            for process in [server, *helpers]:
+                process.wait(timeout=30)
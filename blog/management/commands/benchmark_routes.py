@@ -0,0 +1,357 @@
+import http.client
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from blog import benchmarks, datasets, search
+from blog.models import Blog, Category
+from profiles import search as author_search
+
+User = get_user_model()
+
+# Every route of the blog, profiles and accounts URLconfs, as
+# (label, url name, sample kwargs, query string, method, form data, logged in)
+ROUTES = [
+    ('home', 'blog:home', None, '', 'get', None, False),
+    ('home (popular)', 'blog:home', None, 'sort=popular', 'get', None, False),
+    ('home (search)', 'blog:home', None, 'query=django+cache', 'get', None, False),
+    ('home (logged in)', 'blog:home', None, '', 'get', None, True),
+    ('blog_create', 'blog:blog_create', None, '', 'get', None, True),
+    ('my_blogs', 'blog:my_blogs', None, '', 'get', None, True),
+    ('my_favorites', 'blog:my_favorites', None, '', 'get', None, True),
+    ('blog_detail', 'blog:blog_detail', 'blog', '', 'get', None, False),
+    ('blog_detail (logged in)', 'blog:blog_detail', 'blog', '', 'get', None, True),
+    ('blog_edit', 'blog:blog_edit', 'own_blog', '', 'get', None, True),
+    ('blog_delete (confirm)', 'blog:blog_delete', 'own_blog', '', 'get', None, True),
+    ('toggle_favorite', 'blog:toggle_favorite', 'blog', '', 'get', None, True),
+    ('submit_rating', 'blog:submit_rating', 'blog', '', 'post', {'score': '4', 'review': 'Useful.'}, True),
+    ('category_detail', 'blog:category_detail', 'category', '', 'get', None, False),
+    ('author_blogs', 'blog:author_blogs', 'author', '', 'get', None, False),
+    ('authors_list', 'profiles:authors_list', None, '', 'get', None, False),
+    ('authors_list (search)', 'profiles:authors_list', None, 'search=ada', 'get', None, False),
+    ('timeline', 'profiles:timeline', None, '', 'get', None, True),
+    ('edit_profile', 'profiles:edit_profile', None, '', 'get', None, True),
+    ('author_detail', 'profiles:author_detail', 'author', '', 'get', None, False),
+    ('toggle_follow', 'profiles:toggle_follow', 'other_author', '', 'get', None, True),
+    ('followers', 'profiles:followers', 'author', '', 'get', None, True),
+    ('following', 'profiles:following', 'user', '', 'get', None, True),
+    ('register', 'accounts:register', None, '', 'get', None, False),
+    ('login', 'accounts:login', None, '', 'get', None, False),
+    ('login (submit)', 'accounts:login', None, '', 'post', 'credentials', False),
+    ('logout', 'accounts:logout', None, '', 'get', None, True),
+    ('verify_email', 'accounts:verify_email', 'token', '', 'get', None, False),
+    ('profile', 'accounts:profile', None, '', 'get', None, True),
+    ('change_role', 'accounts:change_role', None, '', 'post', {'role': 'author'}, True),
+]
+URLCONFS = ('blog.urls', 'profiles.urls', 'accounts.urls')
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every route of the blog, profiles and accounts apps through the test client '
+        '(or a live server) against a deterministic synthetic dataset, and report latency '
+        'percentiles, queries and peak memory per route. --output writes a JSON report; '
+        '--compare diffs against an earlier one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(datasets.SCALES), default='small',
+                            help='Dataset built in a throwaway database')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--use-current-db', action='store_true',
+                            help='Run against the configured database (which must hold a generated dataset)')
+        parser.add_argument('--live-url', help='Send the requests over HTTP to a running server sharing the configured database')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per route')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--memory-samples', type=int, default=5, help='Requests per route traced for peak memory')
+        parser.add_argument('--no-page-cache', action='store_true', help='Disable the anonymous page cache')
+        parser.add_argument('--routes', nargs='+', help='Only run routes whose label starts with one of these')
+        parser.add_argument('--output', help='Write the JSON report here')
+        parser.add_argument('--compare', help='Earlier JSON report to compare against')
+
+    def handle(self, *args, **options):
+        self.check_coverage()
+        if options['live_url']:
+            options['use_current_db'] = True
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if options['no_page_cache']:
+            overrides['PAGE_CACHE'] = {**getattr(settings, 'PAGE_CACHE', {}), 'ENABLED': False}
+
+        with override_settings(**overrides):
+            if options['use_current_db']:
+                report = self.run(options)
+            else:
+                search._fts_available = author_search._fts_available = None
+                try:
+                    with benchmarks.isolated_database():
+                        started = time.perf_counter()
+                        counts = datasets.get_counts(options['scale'])
+                        datasets.generate(counts, seed=options['seed'])
+                        self.stdout.write(f'Built the {options["scale"]} dataset in {time.perf_counter() - started:.1f}s')
+                        report = self.run(options)
+                finally:
+                    search._fts_available = author_search._fts_available = None
+
+        self.print_report(report)
+        if options['compare']:
+            with open(options['compare']) as handle:
+                self.print_comparison(json.load(handle), report)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+
+    def check_coverage(self):
+        """Warn about URL names that have no entry in ROUTES"""
+        from importlib import import_module
+
+        covered = {name for _, name, *_ in ROUTES}
+        for urlconf in URLCONFS:
+            module = import_module(urlconf)
+            for pattern in module.urlpatterns:
+                name = f'{module.app_name}:{pattern.name}'
+                if isinstance(pattern, URLPattern) and name not in covered:
+                    self.stderr.write(f'No benchmark for route {name}')
+
+    def samples(self):
+        """Representative objects for the routes' URL arguments"""
+        user = User.objects.filter(role='author', is_active=True).annotate(
+            posts=Count('blogs')
+        ).filter(posts__gt=0).order_by('pk').first()
+        if user is None:
+            raise CommandError('No author with posts; generate a dataset first (manage.py generate_dataset).')
+        published = Blog.objects.filter(status='published')
+        blog = published.exclude(author=user).order_by('-rating_count', 'pk').first()
+        return user, {
+            'blog': {'slug': blog.slug},
+            'own_blog': {'slug': published.filter(author=user).order_by('pk').first().slug},
+            'category': {'slug': Category.objects.annotate(posts=Count('blogs')).order_by('-posts', 'pk').first().slug},
+            'author': {'username': blog.author.username},
+            'other_author': {'username': blog.author.username},
+            'user': {'username': user.username},
+            'token': {'token': User.objects.exclude(pk=user.pk).order_by('pk').first().email_verification_token},
+        }
+
+    def run(self, options):
+        user, samples = self.samples()
+        selected = [
+            route for route in ROUTES
+            if not options['routes'] or any(route[0].startswith(prefix) for prefix in options['routes'])
+        ]
+        templates = None if options['live_url'] else benchmarks.missing_templates()
+        workdir = tempfile.mkdtemp(prefix='benchmark-routes-')
+        try:
+            template_settings = {}
+            if templates:
+                engines = [dict(engine) for engine in settings.TEMPLATES]
+                engines[0]['DIRS'] = [benchmarks.stand_in_templates(workdir, templates)] + list(engines[0]['DIRS'])
+                template_settings['TEMPLATES'] = engines
+            with override_settings(**template_settings):
+                results = {}
+                for route in selected:
+                    # A fresh copy: earlier routes may have changed the user row
+                    user.refresh_from_db()
+                    results[route[0]] = self.run_route(route, user, samples, options)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        return {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'mode': 'live' if options['live_url'] else 'client',
+                'dataset': {
+                    'scale': None if options['use_current_db'] else options['scale'],
+                    'seed': options['seed'],
+                    'users': User.objects.count(),
+                    'blogs': Blog.objects.count(),
+                },
+                'requests': options['requests'],
+                'page_cache': not options['no_page_cache'],
+                'stand_in_templates': templates or [],
+            },
+            'routes': results,
+        }
+
+    def run_route(self, route, user, samples, options):
+        label, name, sample, query, method, data, logged_in = route
+        path = reverse(name, kwargs=samples[sample] if sample else None)
+        if query:
+            path = f'{path}?{query}'
+        if data == 'credentials':
+            data = {'username': user.email, 'password': datasets.PASSWORD}
+
+        client = Client(raise_request_exception=False)
+        if logged_in:
+            client.force_login(user)
+        if options['live_url']:
+            send = LiveSender(options['live_url'], client, logged_in)
+        else:
+            send = lambda: client.generic(method.upper(), path, urlencode(data or {}),
+                                          'application/x-www-form-urlencoded')
+
+        def request():
+            if label == 'logout':
+                # Logging out ends the session; start a new one before each timed request
+                client.force_login(user)
+                if options['live_url']:
+                    send.refresh_session()
+            return send(method, path, data) if options['live_url'] else send()
+
+        for _ in range(options['warmup']):
+            request()
+
+        timings, queries, statuses = [], [], Counter()
+        for _ in range(options['requests']):
+            if options['live_url']:
+                started = time.perf_counter()
+                status = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            else:
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    status = request().status_code
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured.captured_queries))
+            statuses[str(status)] += 1
+
+        peak = None
+        if not options['live_url'] and options['memory_samples']:
+            peaks = []
+            tracemalloc.start()
+            try:
+                for _ in range(options['memory_samples']):
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    request()
+                    peaks.append(tracemalloc.get_traced_memory()[1] - before)
+            finally:
+                tracemalloc.stop()
+            peak = max(peaks) // 1024
+
+        timings.sort()
+        return {
+            'path': path,
+            'method': method.upper(),
+            'statuses': dict(statuses),
+            'p50_ms': round(benchmarks.percentile(timings, 0.50), 3),
+            'p95_ms': round(benchmarks.percentile(timings, 0.95), 3),
+            'p99_ms': round(benchmarks.percentile(timings, 0.99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': statistics.median(queries) if queries else None,
+            'max_queries': max(queries) if queries else None,
+            'peak_kib': peak,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"route":<26}{"p50":>9}{"p95":>9}{"p99":>9}{"queries":>9}{"peak KiB":>10}  statuses'
+        )
+        for label, result in report['routes'].items():
+            queries = '-' if result['queries'] is None else f'{result["queries"]:g}'
+            peak = '-' if result['peak_kib'] is None else result['peak_kib']
+            statuses = ' '.join(f'{status}x{count}' for status, count in sorted(result['statuses'].items()))
+            self.stdout.write(
+                f'{label:<26}{result["p50_ms"]:>7.1f}ms{result["p95_ms"]:>7.1f}ms{result["p99_ms"]:>7.1f}ms'
+                f'{queries:>9}{peak:>10}  {statuses}'
+            )
+        if report['meta']['stand_in_templates']:
+            self.stdout.write('Stand-in templates: ' + ', '.join(report['meta']['stand_in_templates']))
+
+    def print_comparison(self, before, after):
+        self.stdout.write(f'\nCompared with {before["meta"].get("commit") or before["meta"]["created"]}:')
+        if before['meta']['dataset'] != after['meta']['dataset'] or before['meta']['mode'] != after['meta']['mode']:
+            self.stdout.write(self.style.WARNING('The reports used different datasets or modes.'))
+        self.stdout.write(f'{"route":<26}{"p50":>16}{"p95":>16}{"queries":>12}')
+        for label, result in after['routes'].items():
+            old = before['routes'].get(label)
+            if old is None:
+                continue
+
+            def change(key):
+                if not old[key]:
+                    return '-'
+                return f'{(result[key] - old[key]) / old[key]:+.0%}'
+
+            queries = '-' if result['queries'] is None or old['queries'] is None else f'{result["queries"] - old["queries"]:+g}'
+            self.stdout.write(
+                f'{label:<26}{old["p50_ms"]:>7.1f}ms {change("p50_ms"):>6}'
+                f'{old["p95_ms"]:>7.1f}ms {change("p95_ms"):>6}{queries:>12}'
+            )
+
+
+class LiveSender:
+    """Send a route's requests over one keep-alive HTTP connection"""
+
+    def __init__(self, base_url, client, logged_in):
+        parts = urlsplit(base_url)
+        self.prefix = parts.path.rstrip('/')
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        self.client = client
+        self.logged_in = logged_in
+        self.csrf_token = None
+        self.session_cookies = {}
+        self.refresh_session()
+
+    def refresh_session(self):
+        if self.logged_in:
+            self.session_cookies = {name: morsel.value for name, morsel in self.client.cookies.items()}
+
+    def __call__(self, method, path, data):
+        headers = {}
+        body = None
+        if method == 'post':
+            if self.csrf_token is None:
+                self.csrf_token = self.fetch_csrf_token()
+            headers['X-CSRFToken'] = self.csrf_token
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            body = urlencode(data or {})
+        cookies = dict(self.session_cookies)
+        if self.csrf_token is not None:
+            cookies[settings.CSRF_COOKIE_NAME] = self.csrf_token
+        if cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in cookies.items())
+        self.connection.request(method.upper(), self.prefix + path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+    def fetch_csrf_token(self):
+        self.connection.request('GET', self.prefix + reverse('accounts:login'))
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, rest = header.partition('=')
+            if name.strip() == settings.CSRF_COOKIE_NAME:
+                return rest.split(';', 1)[0]
+        raise CommandError('The live server did not set a CSRF cookie.')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=10, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
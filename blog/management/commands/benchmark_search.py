@@ -0,0 +1,120 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from blog import search
+
+WORDS = (
+    'python django database index query cache server request response latency '
+    'template model view form search filter author reader category rating review '
+    'design pattern async thread process memory storage network deploy scale '
+    'performance benchmark profile optimize sqlite postgres replica primary write '
+    'read stream batch queue worker email feed sitemap image static compress'
+).split()
+SYLLABLES = 'ba ce di fo gu ka le mi no pu ra se ti vo zu'.split()
+
+
+def build_vocabulary(rng, size=5000):
+    """A Zipf-weighted vocabulary so common terms match many posts and rare ones few"""
+    words = list(WORDS)
+    while len(words) < size:
+        words.append(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    weights = [1.0 / rank for rank in range(1, len(words) + 1)]
+    return words, weights
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare home_view search latency of the icontains scan against the FTS5 '
+        'index on synthetic corpora. Runs against a scratch SQLite file, not the site database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--queries', type=int, default=20, help='Queries timed per engine and size')
+        parser.add_argument('--body-words', type=int, default=120)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"posts":>10} {"icontains p50":>14} {"fts5 p50":>10} {"speedup":>8}')
+        for size in options['sizes']:
+            with tempfile.TemporaryDirectory() as directory:
+                db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+                rng = random.Random(options['seed'])
+                words, weights = build_vocabulary(rng)
+                self.build_corpus(db, rng, words, weights, size, options['body_words'])
+                terms = rng.sample(words[:500], options['queries'])
+                scan = self.time_queries(db, terms, self.icontains_page)
+                fts = self.time_queries(db, terms, self.fts_page)
+                db.close()
+            self.stdout.write(f'{size:>10} {scan:>12.1f}ms {fts:>8.1f}ms {scan / fts:>7.1f}x')
+
+    def build_corpus(self, db, rng, words, weights, size, body_words):
+        db.execute(
+            'CREATE TABLE blog_blog (id INTEGER PRIMARY KEY, title TEXT, excerpt TEXT, '
+            'body TEXT, status TEXT, published_at TEXT)'
+        )
+        db.execute(
+            "CREATE VIRTUAL TABLE {} USING fts5(title, excerpt, body, tokenize='porter unicode61')".format(
+                search.FTS_TABLE
+            )
+        )
+
+        def rows():
+            for blog_id in range(1, size + 1):
+                body = ' '.join(rng.choices(words, weights, k=body_words))
+                yield (
+                    blog_id,
+                    ' '.join(rng.choices(words, weights, k=6)).title(),
+                    body[:297],
+                    body,
+                    'published',
+                    '2025-01-01T00:00:{:06d}'.format(blog_id),
+                )
+
+        db.executemany('INSERT INTO blog_blog VALUES (?, ?, ?, ?, ?, ?)', rows())
+        db.execute(
+            'INSERT INTO {} (rowid, title, excerpt, body) SELECT id, title, excerpt, body FROM blog_blog'.format(
+                search.FTS_TABLE
+            )
+        )
+        db.execute("INSERT INTO {fts} ({fts}) VALUES ('optimize')".format(fts=search.FTS_TABLE))
+        db.commit()
+
+    def icontains_page(self, db, query):
+        # Same shape as the ORM's icontains filter plus the paginator's COUNT
+        like = '%{}%'.format(query)
+        where = (
+            "status = 'published' AND (title LIKE ? ESCAPE '\\' OR body LIKE ? ESCAPE '\\' "
+            "OR excerpt LIKE ? ESCAPE '\\')"
+        )
+        db.execute('SELECT COUNT(*) FROM blog_blog WHERE ' + where, [like] * 3).fetchone()
+        db.execute(
+            'SELECT id, title FROM blog_blog WHERE ' + where + ' ORDER BY published_at DESC LIMIT 6',
+            [like] * 3,
+        ).fetchall()
+
+    def fts_page(self, db, query):
+        join = (
+            "FROM blog_blog, {fts} WHERE {fts}.rowid = blog_blog.id AND {fts} MATCH ? "
+            "AND status = 'published'"
+        ).format(fts=search.FTS_TABLE)
+        match = search.build_match_query(query)
+        db.execute('SELECT COUNT(*) ' + join, [match]).fetchone()
+        db.execute(
+            'SELECT blog_blog.id, blog_blog.title, {rank} AS rank, {snippet} '.format(rank=search.RANK_SQL, snippet=search.SNIPPET_SQL)
+            + join + ' ORDER BY rank LIMIT 6',
+            [match],
+        ).fetchall()
+
+    def time_queries(self, db, terms, run):
+        timings = []
+        for query in terms:
+            started = time.perf_counter()
+            run(db, query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
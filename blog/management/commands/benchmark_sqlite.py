@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from blog.models import Blog, Category, Favorite
+from blog.viewcounts import write_counts
+from blog_site import sqlite
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a mixed read/write request workload from N worker processes against '
+        'a synthetic SQLite database under each connection profile, and report '
+        'throughput, latency and "database is locked" error rates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--profiles', nargs='+', choices=list(sqlite.PROFILES), default=list(sqlite.PROFILES))
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Share of requests that write (view counts and favorite toggles)')
+        parser.add_argument('--blogs', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='benchmark-sqlite-')
+        template = os.path.join(workdir, 'template.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = template
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            user_ids, blog_ids = self.populate(options['blogs'])
+            connection.close()
+
+            self.stdout.write(
+                f'{"profile":<13}{"workers":>8}{"req/s":>9}{"read p50":>10}{"read p99":>10}'
+                f'{"write p99":>11}{"lock errors":>13}'
+            )
+            context = multiprocessing.get_context('fork')
+            for profile in options['profiles']:
+                for workers in options['workers']:
+                    # Every run starts from the same file, in the journal mode the profile sets
+                    database = os.path.join(workdir, f'{profile}-{workers}.sqlite3')
+                    shutil.copyfile(template, database)
+                    entry = sqlite.database(database, profile)
+                    jobs = [
+                        (entry, options['duration'], options['write_ratio'], user_ids, blog_ids, seed)
+                        for seed in range(workers)
+                    ]
+                    with context.Pool(workers) as pool:
+                        results = pool.map(run_worker, jobs)
+                    self.report(profile, workers, options['duration'], results)
+                    for suffix in ('', '-wal', '-shm'):
+                        if os.path.exists(database + suffix):
+                            os.remove(database + suffix)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def populate(self, count):
+        rng = random.Random(15)
+        categories = Category.objects.bulk_create([
+            Category(name=f'Category {number}', slug=f'category-{number}') for number in range(10)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'user{number}', email=f'user{number}@example.com', role='author', password='!')
+            for number in range(100)
+        ])
+        Blog.objects.bulk_create([
+            Blog(
+                title=f'Post {number}', slug=f'post-{number}', author=rng.choice(users),
+                category=rng.choice(categories), body='Lorem ipsum dolor sit amet. ' * 40,
+                excerpt='Lorem ipsum', status='published',
+            )
+            for number in range(count)
+        ], batch_size=1000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return [user.pk for user in users], list(Blog.objects.values_list('pk', flat=True))
+
+    def report(self, profile, workers, duration, results):
+        reads = sorted(timing for result in results for timing in result['reads'])
+        writes = sorted(timing for result in results for timing in result['writes'])
+        errors = sum(result['errors'] for result in results)
+        total = len(reads) + len(writes) + errors
+        self.stdout.write(
+            f'{profile:<13}{workers:>8}{(len(reads) + len(writes)) / duration:>9.0f}'
+            f'{percentile(reads, 0.5):>8.1f}ms{percentile(reads, 0.99):>8.1f}ms'
+            f'{percentile(writes, 0.99):>9.1f}ms{errors:>7} ({errors / max(total, 1):.1%})'
+        )
+
+
+def percentile(timings, fraction):
+    if not timings:
+        return 0.0
+    return timings[max(int(len(timings) * fraction) - (1 if fraction < 1 else 0), 0)]
+
+
+def run_worker(job):
+    """One worker process: simulated requests until ``duration`` runs out"""
+    entry, duration, write_ratio, user_ids, blog_ids, seed = job
+    # The fork inherited the parent's (closed) connection; point it at this run's profile
+    connection.settings_dict.update(entry)
+    connection.settings_dict['OPTIONS'] = entry.get('OPTIONS', {})
+    connection.settings_dict['CONN_MAX_AGE'] = entry.get('CONN_MAX_AGE', 0)
+    connection.settings_dict['CONN_HEALTH_CHECKS'] = entry.get('CONN_HEALTH_CHECKS', False)
+    rng = random.Random(seed)
+    result = {'reads': [], 'writes': [], 'errors': 0}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        # Each iteration is one request: connections are closed or kept per CONN_MAX_AGE
+        close_old_connections()
+        write = rng.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            if write:
+                write_request(rng, user_ids, blog_ids)
+            else:
+                read_request(rng, blog_ids)
+        except OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            result['errors'] += 1
+            continue
+        result['writes' if write else 'reads'].append((time.perf_counter() - started) * 1000)
+    connection.close()
+    return result
+
+
+def read_request(rng, blog_ids):
+    """The home page's queries plus one post"""
+    blogs = Blog.objects.filter(status='published').select_related('author', 'category')
+    list(blogs.order_by('-published_at')[:6])
+    blogs.count()
+    Blog.objects.select_related('author', 'category').get(pk=rng.choice(blog_ids))
+
+
+def write_request(rng, user_ids, blog_ids):
+    """A view count flush or a favorite toggle, both read-then-write transactions"""
+    blog_id = rng.choice(blog_ids)
+    if rng.random() < 0.5:
+        write_counts({blog_id: rng.randint(1, 5)})
+        return
+    with transaction.atomic():
+        favorite, created = Favorite.objects.get_or_create(user_id=rng.choice(user_ids), blog_id=blog_id)
+        if not created:
+            favorite.delete()
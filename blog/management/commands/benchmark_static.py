@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from blog_site.staticfiles import StaticFilesMiddleware
+
+CLIENTS = {
+    'br': 'gzip, deflate, br',
+    'gzip': 'gzip, deflate',
+    'none': '',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare bytes transferred and time-to-serve for the site\'s static files: '
+        'django.views.static.serve from STATICFILES_DIRS (the DEBUG setup) versus the '
+        'hashed, precompressed files served by StaticFilesMiddleware.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario')
+
+    def handle(self, *args, **options):
+        source_root = str(settings.STATICFILES_DIRS[0])
+        names = sorted(
+            os.path.relpath(os.path.join(directory, filename), source_root).replace(os.sep, '/')
+            for directory, _, files in os.walk(source_root) for filename in files
+        )
+        static_root = tempfile.mkdtemp(prefix='benchmark-static-')
+        try:
+            with override_settings(STATIC_ROOT=static_root, STATIC_ASSETS={'SERVE': True}, DEBUG=False):
+                started = time.perf_counter()
+                call_command('collectstatic', interactive=False, verbosity=0)
+                collected = sum(len(files) for _, _, files in os.walk(static_root))
+                self.stdout.write(f'collectstatic: {time.perf_counter() - started:.2f}s, {collected} files written')
+                hashed = {name: staticfiles_storage.stored_name(name) for name in names}
+                middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+                self.run_scenarios(names, hashed, source_root, middleware, options['requests'])
+        finally:
+            shutil.rmtree(static_root, ignore_errors=True)
+
+    def run_scenarios(self, names, hashed, source_root, middleware, count):
+        factory = RequestFactory()
+        prefix = '/' + settings.STATIC_URL.lstrip('/')
+
+        def before(name, **headers):
+            return serve(factory.get(prefix + name, **headers), name, document_root=source_root)
+
+        def after(name, **headers):
+            return middleware(factory.get(prefix + hashed[name], **headers))
+
+        self.stdout.write(f'{"scenario":<38}{"bytes/page":>12}{"p50":>10}{"p99":>10}')
+        for client, accept in CLIENTS.items():
+            for label, fetch in (('before', before), ('after', after)):
+                self.report(f'{label} first visit, {client} client', names, count, lambda name: fetch(
+                    name, HTTP_ACCEPT_ENCODING=accept
+                ))
+
+        # Repeat visits: the old files only carry Last-Modified, so browsers revalidate
+        # each one; hashed names are immutable and are not requested again at all
+        modified = {name: self.header(before(name), 'Last-Modified') for name in names}
+        self.report('before repeat visit (revalidate)', names, count, lambda name: before(
+            name, HTTP_IF_MODIFIED_SINCE=modified[name]
+        ))
+        self.stdout.write(f'{"after repeat visit (immutable)":<38}{0:>12}{"no requests":>20}')
+        etags = {name: self.header(after(name, HTTP_ACCEPT_ENCODING=CLIENTS['br']), 'ETag') for name in names}
+        self.report('after forced reload (If-None-Match)', names, count, lambda name: after(
+            name, HTTP_ACCEPT_ENCODING=CLIENTS['br'], HTTP_IF_NONE_MATCH=etags[name]
+        ))
+
+    @staticmethod
+    def header(response, name):
+        response.close()
+        return response[name]
+
+    def report(self, label, names, count, fetch):
+        page_bytes = 0
+        timings = []
+        for number in range(count):
+            name = names[number % len(names)]
+            started = time.perf_counter()
+            response = fetch(name)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            timings.append((time.perf_counter() - started) * 1_000_000)
+            response.close()
+            if number < len(names):
+                page_bytes += len(body)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+        self.stdout.write(f'{label:<38}{page_bytes:>12}{p50:>8.0f}us{p99:>8.0f}us')
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import Client, override_settings
+from blog import viewcounts
+from blog.models import Blog
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure sustained blog detail page throughput with the view count '
+        'buffer enabled and disabled. Views are written to the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', help='Blog to request (defaults to the latest published blog)')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent client threads')
+
+    def handle(self, *args, **options):
+        blogs = Blog.objects.filter(status='published')
+        if options['slug']:
+            blogs = blogs.filter(slug=options['slug'])
+        blog = blogs.order_by('-published_at').first()
+        if blog is None:
+            raise CommandError('No published blog to benchmark against.')
+
+        url = blog.get_absolute_url()
+        for label, backend in (('buffer off', None), ('buffer on', 'memory')):
+            config = {'BACKEND': backend, 'FLUSH_INTERVAL': 1, 'DEDUP_WINDOW': 0}
+            # Measure rendering plus counting, not page cache hits
+            with override_settings(VIEW_COUNT_BUFFER=config, PAGE_CACHE={'ENABLED': False}, ALLOWED_HOSTS=['*']):
+                viewcounts.reset_view_counter()
+                before = Blog.objects.get(pk=blog.pk).views_count
+                elapsed, errors = self.run_load(url, options['requests'], options['threads'])
+                viewcounts.reset_view_counter()
+                counted = Blog.objects.get(pk=blog.pk).views_count - before
+            self.stdout.write(
+                f'{label:>10}: {options["requests"] / elapsed:8.1f} req/s  '
+                f'errors={errors}  views recorded={counted}/{options["requests"]}'
+            )
+
+    def run_load(self, url, total, thread_count):
+        per_thread = total // thread_count
+        errors = []
+
+        def worker():
+            client = Client()
+            try:
+                for _ in range(per_thread):
+                    try:
+                        if client.get(url).status_code != 200:
+                            errors.append(1)
+                    except Exception:
+                        errors.append(1)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, len(errors)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_site.caches import is_shared
+from blog_site.routers import get_cache, get_config, get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Show how many queries went to the primary and to each replica, and how many '
+        'requests were pinned to the primary. The counters live in the DATABASE_ROUTING '
+        'cache, so this only works when it is shared between processes (e.g. '
+        'DJANGO_SHARED_CACHE=1), not the default per-process locmem cache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        config = get_config()
+        if not is_shared(get_cache()):
+            raise CommandError(
+                f"The {config['CACHE_ALIAS']!r} cache is local to each process, so the web workers' "
+                "counters are not visible here. Run the site and this command with a shared cache "
+                "(e.g. DJANGO_SHARED_CACHE=1)."
+            )
+        stats = get_stats()
+        if not stats:
+            self.stdout.write('No routed requests recorded.')
+        else:
+            requests = stats.get('requests', 0)
+            pinned = stats.get('pinned', 0)
+            self.stdout.write(
+                f'requests={requests} pinned to primary={pinned} '
+                f'({pinned / requests if requests else 0:.1%})'
+            )
+            reads = sum(stats.get(f'{alias}:read', 0) for alias in [config['PRIMARY'], *config['REPLICAS']])
+            for alias in [config['PRIMARY'], *config['REPLICAS']]:
+                alias_reads = stats.get(f'{alias}:read', 0)
+                self.stdout.write(
+                    f'{alias:<16} reads={alias_reads:<10} writes={stats.get(f"{alias}:write", 0):<10} '
+                    f'share of reads={alias_reads / reads if reads else 0:.1%}'
+                )
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from blog import exports
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream posts, ratings, favorites or follows to a JSONL or CSV file with constant memory. '
+        'A posts export can be loaded elsewhere with import_blogs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(exports.TABLES))
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='jsonl')
+        parser.add_argument('--since', help='Only rows created on or after this date (YYYY-MM-DD) or datetime')
+        parser.add_argument('--until', help='Only rows created up to and including this date, or before this datetime')
+        parser.add_argument('--output', '-o', help='File to write (default: standard output)')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE, help='Rows fetched per query')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            chunks = exports.stream(
+                options['table'], options['format'], options['since'], options['until'],
+                chunk_size=options['chunk_size'],
+            )
+            if options['output']:
+                with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+                    written = sum(handle.write(chunk) for chunk in chunks)
+            else:
+                written = sum(sys.stdout.write(chunk) for chunk in chunks)
+        except exports.ExportError as error:
+            raise CommandError(error)
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {written} characters to {options["output"]} in {time.perf_counter() - started:.1f}s.'
+            ))
@@ -0,0 +1,27 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from blog.viewcounts import get_backend, get_config, get_view_counter
+
+
+class Command(BaseCommand):
+    help = (
+        "Write buffered blog view counts to the database. Only for the 'cache' backend of "
+        "VIEW_COUNT_BUFFER on a cache shared between processes (e.g. DJANGO_SHARED_CACHE=1); "
+        "the 'memory' backend flushes inside each web worker."
+    )
+
+    def handle(self, *args, **options):
+        config = get_config()
+        backend = get_backend(config)
+        if backend != 'cache':
+            raise CommandError(
+                f"VIEW_COUNT_BUFFER uses the {backend!r} backend: buffered views live in each web "
+                "worker (which flushes them itself), not where this command can reach them. "
+                "It only works with the 'cache' backend on a shared cache (e.g. DJANGO_SHARED_CACHE=1)."
+            )
+        try:
+            counter = get_view_counter()
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc)) from exc
+        flushed = counter.flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} buffered views.'))
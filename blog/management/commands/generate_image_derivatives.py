@@ -0,0 +1,85 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from blog import images
+
+
+def render(label, field_name, source, variant_names, config):
+    """Worker process entry point: generate one image's derivatives, touching only storage"""
+    storage = apps.get_model(label)._meta.get_field(field_name).storage
+    return images.render_variants(storage, source, variant_names, config)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate missing or outdated resized/WebP derivatives of blog featured images '
+        'and profile pictures, in parallel across worker processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes (default: one per core)')
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that are already up to date')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows scanned per query')
+
+    def handle(self, *args, **options):
+        config = images.get_config()
+        jobs = []
+        for model, field_name, variant_names in images.image_fields():
+            jobs.extend(
+                (model, field_name, variant_names, pk, source, record)
+                for pk, source, record in self.stale(model, field_name, variant_names, config, options)
+            )
+        if not jobs:
+            self.stdout.write('All image derivatives are up to date.')
+            return
+
+        self.stdout.write(f'Generating derivatives for {len(jobs)} images with {options["workers"]} workers...')
+        started = time.perf_counter()
+        counts = {'stored': 0, 'cleared': 0, 'changed': 0, 'failed': 0}
+        # Workers never use the database; close connections before forking so none are shared
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            futures = {}
+            for job in jobs:
+                model, field_name, variant_names, pk, source, record = job
+                if not source:
+                    # The image was removed; only the old derivatives need to go
+                    images.store(model, field_name, pk, source, record, {})
+                    counts['cleared'] += 1
+                    continue
+                futures[pool.submit(render, model._meta.label, field_name, source, variant_names, config)] = job
+            for future in as_completed(futures):
+                model, field_name, variant_names, pk, source, record = futures[future]
+                try:
+                    new_record = future.result()
+                except OSError as error:
+                    counts['failed'] += 1
+                    self.stderr.write(f'{model._meta.label} {pk}: cannot read {source}: {error}')
+                    continue
+                stored = images.store(model, field_name, pk, source, record, new_record)
+                counts['stored' if stored else 'changed'] += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {counts["stored"]} and cleared {counts["cleared"]} in {elapsed:.1f}s '
+            f'({counts["stored"] / max(elapsed, 1e-9):.1f} images/s); '
+            f'{counts["changed"]} changed meanwhile, {counts["failed"]} failed.'
+        ))
+
+    def stale(self, model, field_name, variant_names, config, options):
+        """(pk, source, record) of every row whose derivatives do not match its image"""
+        rows = model._default_manager.order_by('pk').values_list('pk', field_name, images.variants_field(field_name))
+        last_pk = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last_pk)[:options['chunk_size']])
+            if not chunk:
+                return
+            for pk, source, record in chunk:
+                source, record = source or '', record or {}
+                if (options['force'] and source) or images.needs_refresh(source, record, variant_names, config):
+                    yield pk, source, record
+            last_pk = chunk[-1][0]
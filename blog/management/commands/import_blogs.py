@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from blog import importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-import posts from a JSONL or CSV file in batched transactions. '
+        'Progress is checkpointed per batch, so rerunning after a failure resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=importer.FORMATS, help='Default: from the file extension')
+        parser.add_argument('--name', help='Checkpoint name (default: the absolute path of the file)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an earlier checkpoint and start over')
+        parser.add_argument('--author', dest='default_author', help='Email or username for records without an author')
+        parser.add_argument('--status', dest='default_status', choices=sorted(importer.STATUSES), default='draft',
+                            help='Status of records without one')
+        parser.add_argument('--create-categories', action='store_true',
+                            help='Create unknown categories instead of rejecting their records')
+        parser.add_argument('--skip-existing', action='store_true',
+                            help='Skip records whose slug is taken instead of giving them a suffixed one')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--show-rejections', type=int, default=20, help='Rejected records to list')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            result = importer.import_blogs(
+                options['path'], format=options['format'], name=options['name'], restart=options['restart'],
+                default_author=options['default_author'], default_status=options['default_status'],
+                create_categories=options['create_categories'],
+                existing='skip' if options['skip_existing'] else 'rename',
+                batch_size=options['batch_size'],
+                log=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+        except (importer.BlogImportError, OSError) as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+
+        if result.resumed_from:
+            self.stdout.write(f'Resumed after record {result.resumed_from}.')
+        for line, reason in result.rejections[:options['show_rejections']]:
+            self.stderr.write(f'  line {line}: {reason}')
+        read = result.position - result.resumed_from
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {read} records in {elapsed:.1f}s ({read / elapsed * 60 if elapsed else 0:.0f}/min); '
+            f'{result.imported} posts imported, {result.rejected} records rejected in total.'
+        ))
+        if result.imported:
+            self.stdout.write(
+                'Run render_blog_bodies to store the rendered bodies of the new posts, and '
+                'rebuild_related_posts to include them in related-post suggestions.'
+            )
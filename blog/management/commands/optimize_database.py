@@ -0,0 +1,46 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from blog_site import sqlite
+
+
+class Command(BaseCommand):
+    help = 'Refresh SQLite planner statistics (PRAGMA optimize or ANALYZE) and checkpoint the WAL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--analyze', action='store_true', help='Run a full ANALYZE instead of PRAGMA optimize')
+        parser.add_argument('--checkpoint', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'],
+                            help='wal_checkpoint mode (default SQLITE_MAINTENANCE CHECKPOINT)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, once every SQLITE_MAINTENANCE OPTIMIZE_INTERVAL seconds')
+        parser.add_argument('--show-pragmas', action='store_true', help='Print the connection\'s tuned pragmas')
+
+    def handle(self, *args, **options):
+        if options['show_pragmas']:
+            for name, value in sqlite.pragmas(options['database']).items():
+                self.stdout.write(f'{name} = {value}')
+
+        if not options['loop']:
+            self.run(options)
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        interval = sqlite.get_config()['OPTIMIZE_INTERVAL']
+        while not stop.is_set():
+            try:
+                self.run(options)
+            finally:
+                close_old_connections()
+            stop.wait(interval)
+
+    def run(self, options):
+        timings = sqlite.maintain(options['database'], options['analyze'], options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{step} {seconds * 1000:.0f}ms' for step, seconds in timings.items())
+        ))
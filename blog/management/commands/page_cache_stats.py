@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from blog.pagecache import get_cache, get_config, get_stats, reset_stats
+from blog_site.caches import is_shared
+
+
+class Command(BaseCommand):
+    help = (
+        'Show anonymous page cache hit/miss counters per view. The counters live in the '
+        'PAGE_CACHE cache, so this only works when it is shared between processes '
+        '(e.g. DJANGO_SHARED_CACHE=1), not the default per-process locmem cache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        if not is_shared(get_cache()):
+            raise CommandError(
+                f"The {get_config()['CACHE_ALIAS']!r} cache is local to each process, so the web workers' "
+                "counters are not visible here. Run the site and this command with a shared cache "
+                "(e.g. DJANGO_SHARED_CACHE=1)."
+            )
+        stats = get_stats()
+        if not stats:
+            self.stdout.write('No page cache activity recorded.')
+        for view_name, counts in sorted(stats.items()):
+            lookups = counts['hit'] + counts['miss'] + counts['stale']
+            ratio = counts['hit'] / lookups if lookups else 0.0
+            self.stdout.write(
+                f'{view_name:<24} hit={counts["hit"]:<8} miss={counts["miss"]:<8} '
+                f'stale={counts["stale"]:<8} bypass={counts["bypass"]:<8} hit ratio={ratio:.1%}'
+            )
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.models import Blog
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating sum, count and average of every blog from scratch'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Blog.rebuild_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} blogs.'))
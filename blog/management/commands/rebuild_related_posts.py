@@ -0,0 +1,55 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from blog import related
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the TF-IDF related-posts index and every post\'s stored neighbours. '
+        'With --synthetic, only time the similarity engine on generated corpora.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--synthetic', type=int, nargs='+', metavar='POSTS',
+            help='Time vectorising and neighbour search on synthetic corpora of these sizes',
+        )
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            for size in options['synthetic']:
+                self.time_synthetic(size)
+            return
+        timings = related.rebuild(log=self.stdout.write if options['verbosity'] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {timings["posts"]} posts, stored {timings["neighbours"]} neighbours.'
+        ))
+        for stage in ('fit', 'vectorize', 'similarity', 'write', 'total'):
+            self.stdout.write(f'  {stage:>10}: {timings[stage]:8.2f}s')
+
+    def time_synthetic(self, size):
+        config = related.get_config()
+        rng = random.Random(config['SEED'])
+        vocabulary = [f'term{index}' for index in range(20000)]
+        weights = [1.0 / rank for rank in range(1, len(vocabulary) + 1)]
+        documents = [rng.choices(vocabulary, weights, k=150) for _ in range(size)]
+
+        started = time.perf_counter()
+        model = related.TfidfProjection.fit(documents, config)
+        vectors = np.vstack([
+            model.transform(documents[start:start + config['BATCH_SIZE']])
+            for start in range(0, size, config['BATCH_SIZE'])
+        ])
+        vectorised = time.perf_counter()
+        ids = np.arange(1, size + 1, dtype=np.int64)
+        for _ in related.similarity_batches(vectors, ids, config['TOP_K'], config['BATCH_SIZE']):
+            pass
+        finished = time.perf_counter()
+        self.stdout.write(
+            f'{size:>9} posts: vectorize {vectorised - started:7.2f}s  '
+            f'neighbours {finished - vectorised:8.2f}s  '
+            f'({size / max(finished - vectorised, 1e-9):,.0f} posts/s)'
+        )
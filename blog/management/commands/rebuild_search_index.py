@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from blog import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SQLite FTS5 full-text index of blog titles, excerpts and bodies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError('Full-text index is only available on SQLite after running migrate.')
+        with transaction.atomic():
+            indexed = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} blogs.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from blog import leaderboards
+from blog.models import Leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute the featured blog leaderboards (run from cron), or report their staleness'
+
+    def add_arguments(self, parser):
+        parser.add_argument('boards', nargs='*', help='Boards to refresh (default: all)')
+        parser.add_argument('--status', action='store_true', help='Only report last refresh times')
+
+    def handle(self, *args, **options):
+        unknown = set(options['boards']) - set(leaderboards.COMPUTERS)
+        if unknown:
+            raise CommandError(f'Unknown leaderboard(s): {", ".join(sorted(unknown))}')
+        if not options['status']:
+            for board in options['boards'] or leaderboards.COMPUTERS:
+                leaderboard = leaderboards.refresh(board)
+                self.stdout.write(f'Refreshed {board} ({len(leaderboard.entries)} entries).')
+        for leaderboard in Leaderboard.objects.all():
+            staleness = leaderboard.get_staleness()
+            age = f'{staleness.total_seconds():.0f}s ago' if staleness is not None else 'never'
+            self.stdout.write(f'{leaderboard.board:>10}: refreshed {age} at {leaderboard.refreshed_at}')
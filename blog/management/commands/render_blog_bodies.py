@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from blog import markup
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the Markdown bodies stored by an older renderer version (or never rendered, '
+        'e.g. after a bulk import) across worker processes, and store the HTML and reading metadata.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render every post, not only stale ones')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: BODY_RENDERING WORKERS, else one per CPU)')
+        parser.add_argument('--batch-size', type=int, help='Posts per worker task')
+
+    def handle(self, *args, **options):
+        blog_ids = markup.stale_ids(force=options['all'])
+        if not blog_ids:
+            self.stdout.write(f'Every post is rendered by renderer version {markup.RENDERER_VERSION}.')
+            return
+        self.stdout.write(f'Rendering {len(blog_ids)} posts with renderer version {markup.RENDERER_VERSION}')
+        started = time.perf_counter()
+        stored = markup.rerender(
+            blog_ids, workers=options['workers'], batch_size=options['batch_size'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stored} renderings in {elapsed:.1f}s ({stored / elapsed if elapsed else 0:.0f} posts/s); '
+            f'{len(blog_ids) - stored} posts changed meanwhile and kept their own.'
+        ))
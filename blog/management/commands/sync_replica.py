@@ -0,0 +1,50 @@
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from blog_site import routers, sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the local replica files that stand '
+        'in for read replicas (DATABASE_ROUTING REPLICAS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='aliases',
+                            help='Replica alias to refresh (default: every SQLite replica)')
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing the replicas')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds between copies with --loop; keep it below PIN_SECONDS')
+
+    def handle(self, *args, **options):
+        config = routers.get_config()
+        aliases = options['aliases'] or [
+            alias for alias in config['REPLICAS'] if connections[alias].vendor == 'sqlite'
+        ]
+        if not aliases:
+            raise CommandError('No SQLite replica is configured (set DJANGO_LOCAL_REPLICA=1).')
+
+        if not options['loop']:
+            self.sync(aliases, config['PRIMARY'])
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        while not stop.is_set():
+            self.sync(aliases, config['PRIMARY'], verbose=options['verbosity'] > 1)
+            stop.wait(options['interval'])
+
+    def sync(self, aliases, primary, verbose=True):
+        for alias in aliases:
+            started = time.perf_counter()
+            pages = sqlite.sync_replica(alias, primary)
+            if verbose:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{alias}: copied {pages} pages in {(time.perf_counter() - started) * 1000:.0f}ms'
+                ))
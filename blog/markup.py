@@ -0,0 +1,294 @@
+"""
+Markdown rendering of post bodies, sanitised, with derived reading metadata.
+
+``render(body)`` converts Markdown to HTML and passes the result through an
+allowlist sanitiser: unknown tags are dropped (keeping their text, except
+for ``script``/``style``-like elements whose content goes too), attributes
+are limited per tag and links may only use http(s), mailto or relative
+URLs.  It also returns the table of contents, the word count, the reading
+time and a hash of the source.
+
+``Blog.save`` stores all of this next to the body, so the detail page
+serves the stored HTML.  ``RENDERER_VERSION`` is saved with it; bump it
+whenever the extensions or the sanitiser change and run the
+``render_blog_bodies`` command to re-render the stored posts in parallel.
+Configured with the ``BODY_RENDERING`` setting:
+
+    BODY_RENDERING = {
+        'WORDS_PER_MINUTE': 200,  # reading speed for reading_time
+        'WORKERS': None,          # render_blog_bodies processes; None: one per CPU
+        'BATCH_SIZE': 500,        # posts per worker task
+    }
+"""
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+import threading
+from html import escape
+from html.parser import HTMLParser
+
+import markdown
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+
+RENDERER_VERSION = 1
+
+DEFAULTS = {
+    'WORDS_PER_MINUTE': 200,
+    'WORKERS': None,
+    'BATCH_SIZE': 500,
+}
+
+EXTENSIONS = ['fenced_code', 'tables', 'toc', 'sane_lists', 'nl2br', 'footnotes']
+EXTENSION_CONFIGS = {'toc': {'toc_depth': '1-4'}}
+
+GLOBAL_ATTRIBUTES = {'title'}
+ALLOWED_TAGS = {
+    'a': {'href', 'id', 'class'},
+    'abbr': set(),
+    'b': set(),
+    'blockquote': set(),
+    'br': set(),
+    'code': {'class'},
+    'dd': set(),
+    'del': set(),
+    'div': {'class'},
+    'dl': set(),
+    'dt': set(),
+    'em': set(),
+    'h1': {'id'}, 'h2': {'id'}, 'h3': {'id'}, 'h4': {'id'}, 'h5': {'id'}, 'h6': {'id'},
+    'hr': set(),
+    'i': set(),
+    'img': {'src', 'alt', 'width', 'height'},
+    'li': {'id'},
+    'ol': {'start'},
+    'p': set(),
+    'pre': set(),
+    's': set(),
+    'strong': set(),
+    'sub': set(),
+    'sup': {'id'},
+    'table': set(),
+    'tbody': set(),
+    'td': {'style'},
+    'th': {'style'},
+    'thead': set(),
+    'tr': set(),
+    'ul': set(),
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Dropped together with everything inside them
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'svg', 'math', 'textarea', 'select'}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'http', 'https', 'mailto'}
+
+_SCHEME = re.compile(r'^([a-z][a-z0-9+.-]*):', re.IGNORECASE)
+_CONTROL = re.compile(r'[\x00-\x20\x7f]+')
+_CLASS = re.compile(r'^(?:language-[\w+#-]+|footnote|footnote-ref|footnote-backref)$')
+_TEXT_ALIGN = re.compile(r'^text-align: (?:left|right|center);$')
+_NUMBER = re.compile(r'^\d{1,5}$')
+_EXTERNAL = re.compile(r' href="(?:https?:)?//', re.IGNORECASE)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'BODY_RENDERING', {}))
+    return config
+
+
+def content_hash(body):
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _safe_url(value):
+    cleaned = _CONTROL.sub('', value)
+    match = _SCHEME.match(cleaned)
+    return match is None or match.group(1).lower() in ALLOWED_SCHEMES
+
+
+def _allowed_value(tag, name, value):
+    if name in URL_ATTRIBUTES:
+        return _safe_url(value)
+    if name == 'class':
+        return all(_CLASS.match(part) for part in value.split())
+    if name == 'style':
+        return bool(_TEXT_ALIGN.match(value))
+    if name in ('width', 'height', 'start'):
+        return bool(_NUMBER.match(value))
+    return True
+
+
+class Sanitizer(HTMLParser):
+    """Re-serialises HTML keeping only allowlisted tags and attributes; collects the text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.output = []
+        self.text = []
+        self.open = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_TAGS[tag] | GLOBAL_ATTRIBUTES
+        kept = ''.join(
+            f' {name}="{escape(value, quote=True)}"'
+            for name, value in attrs
+            if name in allowed and value is not None and _allowed_value(tag, name, value)
+        )
+        if tag == 'a' and _EXTERNAL.search(kept):
+            kept += ' rel="nofollow"'
+        if tag in VOID_TAGS:
+            self.output.append(f'<{tag}{kept} />')
+        else:
+            self.output.append(f'<{tag}{kept}>')
+            self.open.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in ALLOWED_TAGS or tag in VOID_TAGS or tag not in self.open:
+            return
+        # Close anything left open inside this element first, keeping the output balanced
+        while self.open:
+            current = self.open.pop()
+            self.output.append(f'</{current}>')
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.output.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open:
+            self.output.append(f'</{self.open.pop()}>')
+
+
+def sanitize(html):
+    """(sanitised HTML, its text content)"""
+    parser = Sanitizer()
+    parser.feed(html)
+    parser.close()
+    return ''.join(parser.output), ''.join(parser.text)
+
+
+def _flatten_toc(tokens):
+    entries = []
+    for token in tokens:
+        # The token name is HTML-escaped text; store it plain, templates escape it again
+        parser = Sanitizer()
+        parser.feed(token['name'])
+        parser.close()
+        entries.append({'level': token['level'], 'id': token['id'], 'name': ''.join(parser.text)})
+        entries.extend(_flatten_toc(token['children']))
+    return entries
+
+
+class Renderer:
+    """A reusable Markdown converter (building one costs more than a short render)"""
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self.markdown = markdown.Markdown(extensions=EXTENSIONS, extension_configs=EXTENSION_CONFIGS)
+
+    def render(self, body):
+        """The derived fields of ``body``, as a dict keyed by Blog field name"""
+        self.markdown.reset()
+        html, text = sanitize(self.markdown.convert(body))
+        words = len(text.split())
+        return {
+            'body_html': html,
+            'body_toc': _flatten_toc(self.markdown.toc_tokens),
+            'word_count': words,
+            'reading_time': max(1, math.ceil(words / self.config['WORDS_PER_MINUTE'])) if words else 0,
+            'body_hash': content_hash(body),
+            'render_version': RENDERER_VERSION,
+        }
+
+
+_local = threading.local()
+
+
+def render(body):
+    """``Renderer.render`` with a per-thread renderer (Markdown instances are not thread-safe)"""
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None:
+        renderer = _local.renderer = Renderer()
+    return renderer.render(body)
+
+
+def render_batch(blog_ids):
+    """Render the posts ``blog_ids``: [(pk, updated_at, derived fields)], for a worker process"""
+    from .models import Blog
+
+    rows = Blog.objects.filter(pk__in=blog_ids).values_list('pk', 'updated_at', 'body')
+    return [(pk, updated_at, render(body)) for pk, updated_at, body in rows]
+
+
+def stale_ids(force=False):
+    """Ids of the posts rendered by an older renderer, or never rendered (all of them with ``force``)"""
+    from .models import Blog
+
+    blogs = Blog.objects.all()
+    if not force:
+        blogs = blogs.filter(Q(render_version__lt=RENDERER_VERSION) | Q(body_hash=''))
+    return list(blogs.order_by('pk').values_list('pk', flat=True))
+
+
+def store(results):
+    """Write rendered batches; posts edited since they were read keep their own newer rendering"""
+    from .models import Blog
+    from .pagecache import invalidate_tags
+
+    with transaction.atomic():
+        current = dict(Blog.objects.filter(pk__in=[pk for pk, _, _ in results]).values_list('pk', 'updated_at'))
+        blogs = []
+        for pk, updated_at, fields in results:
+            if current.get(pk) == updated_at:
+                blogs.append(Blog(pk=pk, **fields))
+        Blog.objects.bulk_update(blogs, Blog.RENDER_FIELDS, batch_size=200)
+        transaction.on_commit(lambda: invalidate_tags(*(f'blog:{blog.pk}' for blog in blogs)))
+    return len(blogs)
+
+
+def rerender(blog_ids, workers=None, batch_size=None, log=None):
+    """
+    Re-render ``blog_ids`` across ``workers`` processes (one per CPU by
+    default).  Workers only read and render; this process writes every
+    batch, so SQLite sees a single writer.  Returns the number of posts stored.
+    """
+    config = get_config()
+    workers = workers or config['WORKERS'] or os.cpu_count() or 1
+    batch_size = batch_size or config['BATCH_SIZE']
+    batches = [blog_ids[start:start + batch_size] for start in range(0, len(blog_ids), batch_size)]
+    stored = 0
+    if workers == 1 or len(batches) <= 1:
+        results = map(render_batch, batches)
+        pool = None
+    else:
+        # Forked workers must not share this process's connections
+        connections.close_all()
+        pool = multiprocessing.get_context('fork').Pool(workers)
+        results = pool.imap_unordered(render_batch, batches)
+    try:
+        for done, result in enumerate(results, 1):
+            stored += store(result)
+            if log:
+                log(f'  {done}/{len(batches)} batches, {stored} posts stored')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return stored
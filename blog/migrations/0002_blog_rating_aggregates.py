@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Blog = apps.get_model('blog', 'Blog')
+    Rating = apps.get_model('blog', 'Rating')
+    ratings = Rating.objects.filter(blog=OuterRef('pk')).order_by().values('blog')
+    rating_sum = Coalesce(Subquery(ratings.annotate(total=Sum('score')).values('total')), 0)
+    rating_count = Coalesce(Subquery(ratings.annotate(total=Count('pk')).values('total')), 0)
+    Blog.objects.update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        rating_average=Coalesce(
+            Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+            0.0,
+            output_field=FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='rating_average',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['status', '-rating_average', '-views_count'], name='blog_blog_status_a11a0b_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blog_blog_fts "
+        "USING fts5(title, excerpt, body, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        "INSERT INTO blog_blog_fts (rowid, title, excerpt, body) "
+        "SELECT id, title, excerpt, body FROM blog_blog"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS blog_blog_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_blog_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('rating', 'Top Rated'), ('views', 'Most Viewed'), ('trending', 'Trending')], max_length=20, unique=True)),
+                ('entries', models.JSONField(default=list, help_text='Ranked [blog id, score] pairs')),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['board'],
+            },
+        ),
+    ]
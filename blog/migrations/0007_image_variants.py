@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_related_blog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='featured_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('fingerprint', models.CharField(help_text='Hash of the start of the source', max_length=64)),
+                ('position', models.PositiveIntegerField(default=0, help_text='Records of the source consumed')),
+                ('imported', models.PositiveIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
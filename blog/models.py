@@ -1,9 +1,14 @@
 from django.db import models
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 
+from . import markup
+
 User = get_user_model()
 
 class Category(models.Model):
@@ -36,32 +41,107 @@ class Blog(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blogs')
-    body = models.TextField()
+    body = models.TextField(help_text="Markdown")
     excerpt = models.TextField(max_length=300, blank=True, help_text="Brief description of the blog post")
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='blogs')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     featured_image = models.ImageField(upload_to='blog_images/', blank=True, null=True)
+    # Resized/WebP copies of featured_image, written by blog.images
+    featured_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(null=True, blank=True)
     views_count = models.PositiveIntegerField(default=0)
     
+    # The body rendered by blog.markup when saved, with what is derived from it
+    body_html = models.TextField(blank=True, editable=False)
+    body_toc = models.JSONField(default=list, blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Minutes")
+    body_hash = models.CharField(max_length=64, blank=True, editable=False)
+    render_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    # Denormalized rating aggregates, maintained by blog.signals
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.FloatField(default=0, editable=False)
+    
+    RATING_AGGREGATE_FIELDS = ('rating_sum', 'rating_count', 'rating_average')
+    # Columns only ever changed through F() updates, never by a full save()
+    COUNTER_FIELDS = ('views_count',) + RATING_AGGREGATE_FIELDS
+    # Columns only ever written by background jobs
+    BACKGROUND_FIELDS = ('featured_image_variants',)
+    INDEXED_FIELDS = ('title', 'excerpt', 'body')
+    RENDER_FIELDS = ('body_html', 'body_toc', 'word_count', 'reading_time', 'body_hash', 'render_version')
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['status']),
             models.Index(fields=['author']),
+            models.Index(fields=['status', '-rating_average', '-views_count']),
+            # Keyset pagination orderings used by the listing views
+            models.Index(fields=['status', '-published_at', '-id']),
+            models.Index(fields=['status', '-views_count', '-published_at', '-id']),
+            models.Index(fields=['status', '-rating_average', '-published_at', '-id']),
+            models.Index(fields=['category', 'status', '-published_at', '-id']),
+            models.Index(fields=['author', 'status', '-published_at', '-id']),
+            models.Index(fields=['author', '-created_at', '-id']),
         ]
     
     def save(self, *args, **kwargs):
+        # Never write back stale counters from an in-memory instance; they are
+        # only changed through apply_rating_delta(), blog.viewcounts and blog.images
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS + self.BACKGROUND_FIELDS
+            ]
         if not self.slug:
             self.slug = slugify(self.title)
+        self.fill_derived_fields()
+        if self.render_body() and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | set(self.RENDER_FIELDS)
+        super().save(*args, **kwargs)
+    
+    def render_body(self, force=False):
+        """Re-render the body if it or the renderer changed since it was stored; returns whether it did"""
+        if not force and self.render_version == markup.RENDERER_VERSION and self.body_hash == markup.content_hash(self.body):
+            return False
+        for field, value in markup.render(self.body).items():
+            setattr(self, field, value)
+        return True
+    
+    @property
+    def rendered_body(self):
+        """The stored HTML; rendered on the fly for posts bulk-loaded and not rendered yet"""
+        if not self.body_hash:
+            return mark_safe(markup.render(self.body)['body_html'])
+        return mark_safe(self.body_html)
+    
+    def fill_derived_fields(self):
+        """Set the publication date and excerpt when missing (also used by blog.importer)"""
         if self.status == 'published' and not self.published_at:
             self.published_at = timezone.now()
         if not self.excerpt:
             self.excerpt = self.body[:297] + "..." if len(self.body) > 300 else self.body
-        super().save(*args, **kwargs)
+    
+    def indexed_content(self):
+        """The text the search and related-posts indexes are built from (None where deferred)"""
+        return tuple(self.__dict__.get(name) for name in self.INDEXED_FIELDS)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category so a move can invalidate both listings,
+        # status/author so author statistics can follow transitions, and the
+        # indexed text so saves that leave it alone skip re-indexing
+        instance._stored_category_id = instance.__dict__.get('category_id')
+        instance._stored_status = instance.__dict__.get('status')
+        instance._stored_author_id = instance.__dict__.get('author_id')
+        instance._stored_content = instance.indexed_content()
+        return instance
     
     def __str__(self):
         return self.title
@@ -70,13 +150,44 @@ class Blog(models.Model):
         return reverse('blog:blog_detail', kwargs={'slug': self.slug})
     
     def get_average_rating(self):
-        ratings = self.ratings.all()
-        if ratings:
-            return sum(rating.score for rating in ratings) / len(ratings)
-        return 0
+        return self.rating_average
     
     def get_rating_count(self):
-        return self.ratings.count()
+        return self.rating_count
+    
+    @classmethod
+    def apply_rating_delta(cls, blog_id, score_delta, count_delta):
+        """Atomically shift the stored rating aggregates of one blog in a single UPDATE"""
+        new_sum = F('rating_sum') + score_delta
+        new_count = F('rating_count') + count_delta
+        return cls.objects.filter(pk=blog_id).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_average=Coalesce(
+                Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+                0.0,
+                output_field=FloatField(),
+            ),
+        )
+    
+    @classmethod
+    def rebuild_rating_aggregates(cls, blog_ids=None):
+        """Recompute the stored rating aggregates from the Rating table"""
+        ratings = Rating.objects.filter(blog=OuterRef('pk')).order_by().values('blog')
+        rating_sum = Coalesce(Subquery(ratings.annotate(total=Sum('score')).values('total')), 0)
+        rating_count = Coalesce(Subquery(ratings.annotate(total=Count('pk')).values('total')), 0)
+        blogs = cls.objects.all()
+        if blog_ids is not None:
+            blogs = blogs.filter(pk__in=blog_ids)
+        return blogs.update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating_average=Coalesce(
+                Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+                0.0,
+                output_field=FloatField(),
+            ),
+        )
 
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
@@ -86,6 +197,9 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ('user', 'blog')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.blog.title}"
@@ -104,5 +218,70 @@ class Rating(models.Model):
         unique_together = ('user', 'blog')
         ordering = ['-created_at']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored score so aggregate updates can apply the difference
+        instance._stored_score = instance.__dict__.get('score')
+        return instance
+    
     def __str__(self):
         return f"{self.user.username} - {self.blog.title} ({self.score}/6)"
+
+class RelatedBlog(models.Model):
+    """Precomputed content-similarity neighbour of a blog (see blog.related)"""
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    
+    class Meta:
+        unique_together = ('blog', 'related')
+        ordering = ['blog', '-score']
+        indexes = [
+            models.Index(fields=['blog', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.blog_id} -> {self.related_id} ({self.score:.3f})"
+
+class Leaderboard(models.Model):
+    BOARD_CHOICES = (
+        ('rating', 'Top Rated'),
+        ('views', 'Most Viewed'),
+        ('trending', 'Trending'),
+    )
+    
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES, unique=True)
+    entries = models.JSONField(default=list, help_text="Ranked [blog id, score] pairs")
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['board']
+    
+    def __str__(self):
+        return self.get_board_display()
+    
+    def get_blog_ids(self):
+        return [blog_id for blog_id, score in self.entries]
+    
+    def get_staleness(self):
+        if self.refreshed_at is None:
+            return None
+        return timezone.now() - self.refreshed_at
+
+class BlogImport(models.Model):
+    """Progress of a named bulk import, committed with every batch (see blog.importer)"""
+    name = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64, help_text="Hash of the start of the source")
+    position = models.PositiveIntegerField(default=0, help_text="Records of the source consumed")
+    imported = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"{self.name} ({self.position} records)"
@@ -0,0 +1,362 @@
+"""
+Full-page response cache for anonymous readers.
+
+Views wrapped in ``cache_anonymous_page`` are cached per path and
+normalised query string.  While rendering, a view declares what the page
+depends on with ``add_cache_tags(request, 'blog:12', ...)``; the entry stores
+the current version of each tag, and ``invalidate_tags()`` (called from model
+signals) bumps versions so exactly the pages depending on a changed object
+miss on their next request.  Concurrent misses on one key are coalesced: one
+request renders while the others briefly wait for its result.
+
+Hit, miss, stale and bypass counters are kept per view in the cache and
+reported by the ``page_cache_stats`` command, which can only see the web
+workers' counters through a cache shared between processes
+(``DJANGO_SHARED_CACHE=1``), not the default locmem one.  Configured with
+``PAGE_CACHE``.
+
+Tag versions only expire pages in caches that see the bump, so with
+``ENABLED`` left at ``None`` pages are served from the cache only when it is
+shared between processes; on a per-process cache each worker would keep
+serving pages another worker's save had invalidated.  Forcing ``ENABLED``
+on for such a cache is reported by a system check (``blog.W001``).
+"""
+import asyncio
+import functools
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from blog_site.caches import is_shared
+
+DEFAULTS = {
+    'ENABLED': None,
+    'TIMEOUT': 300,
+    'CACHE_ALIAS': 'default',
+    'LOCK_TIMEOUT': 10,
+    'WAIT': 2.0,
+    'IGNORED_PARAMS': ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'fbclid', 'gclid'),
+}
+
+PREFIX = 'pagecache'
+STAT_KINDS = ('hit', 'miss', 'stale', 'bypass')
+VIEWS_KEY = f'{PREFIX}:views'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PAGE_CACHE', {}))
+    return config
+
+
+def get_cache():
+    return caches[get_config()['CACHE_ALIAS']]
+
+
+def is_enabled(config=None):
+    """``ENABLED``, or with ``None`` whether the cache is shared between processes"""
+    config = config or get_config()
+    if config['ENABLED'] is None:
+        return is_shared(caches[config['CACHE_ALIAS']])
+    return config['ENABLED']
+
+
+def check_cache_is_shared(app_configs, **kwargs):
+    config = get_config()
+    if config['ENABLED'] and not is_shared(caches[config['CACHE_ALIAS']]):
+        return [checks.Warning(
+            f"PAGE_CACHE is enabled on the {config['CACHE_ALIAS']!r} cache, which is local to each process.",
+            hint=(
+                'A save only expires the pages cached by the worker that handled it; the others keep '
+                'serving stale pages until TIMEOUT. Use a shared cache (DJANGO_SHARED_CACHE=1) or leave '
+                'ENABLED as None to cache only when the cache is shared.'
+            ),
+            id='blog.W001',
+        )]
+    return []
+
+
+def _incr(cache, key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def _tag_key(tag):
+    return f'{PREFIX}:tag:{tag}'
+
+
+def get_tag_versions(tags, cache=None):
+    """Current version of each tag, creating unseen ones"""
+    cache = cache or get_cache()
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many(list(keys))
+    versions = {keys[key]: value for key, value in found.items()}
+    for key, tag in keys.items():
+        if tag not in versions:
+            # A time-based start value so an evicted tag never reuses an old version
+            cache.add(key, time.time_ns(), None)
+            versions[tag] = cache.get(key)
+    return versions
+
+
+def invalidate_tags(*tags):
+    cache = get_cache()
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def add_cache_tags(request, *tags):
+    """
+    Record that the page being rendered for ``request`` depends on ``tags``.
+
+    Tag versions are captured here, so views should declare tags as soon as
+    they have loaded the objects they name; a change after this point leaves
+    the stored page stale rather than wrongly fresh.
+    """
+    collected = getattr(request, '_page_cache_tags', None)
+    if collected is None:
+        return
+    new = {str(tag) for tag in tags if tag is not None} - set(collected)
+    if new:
+        collected.update(get_tag_versions(new))
+
+
+def set_cache_meta(request, **meta):
+    """Attach data a cache hit needs to replay side effects (see ``on_hit``)"""
+    if hasattr(request, '_page_cache_meta'):
+        request._page_cache_meta.update(meta)
+
+
+def normalise_query(query_dict, ignored):
+    pairs = sorted(
+        (key, value)
+        for key, values in query_dict.lists()
+        if key not in ignored
+        for value in values
+        if value != ''
+    )
+    return urlencode(pairs)
+
+
+def page_key(request, config):
+    normalised = '{}?{}'.format(request.path, normalise_query(request.GET, config['IGNORED_PARAMS']))
+    return f'{PREFIX}:page:{hashlib.md5(normalised.encode()).hexdigest()}'
+
+
+def record_stat(cache, view_name, kind):
+    if cache.add(f'{VIEWS_KEY}:{view_name}', 1, None):
+        registered = cache.get(VIEWS_KEY) or []
+        if view_name not in registered:
+            cache.set(VIEWS_KEY, registered + [view_name], None)
+    _incr(cache, f'{PREFIX}:stats:{view_name}:{kind}')
+
+
+def get_stats():
+    cache = get_cache()
+    stats = {}
+    for view_name in cache.get(VIEWS_KEY) or []:
+        keys = {f'{PREFIX}:stats:{view_name}:{kind}': kind for kind in STAT_KINDS}
+        values = cache.get_many(list(keys))
+        stats[view_name] = {kind: values.get(key, 0) for key, kind in keys.items()}
+    return stats
+
+
+def reset_stats():
+    cache = get_cache()
+    for view_name in cache.get(VIEWS_KEY) or []:
+        cache.delete_many([f'{PREFIX}:stats:{view_name}:{kind}' for kind in STAT_KINDS])
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Pending flash messages are rendered (and consumed) by the page
+    if 'messages' in request.COOKIES:
+        return False
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key and session.get('_messages'):
+        return False
+    return True
+
+
+def _is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+def _build_response(entry, state):
+    response = HttpResponse(entry['content'], status=entry['status'], content_type=entry['content_type'])
+    response['X-Page-Cache'] = state
+    return response
+
+
+def _fresh(entry, cache):
+    if entry is None:
+        return False
+    return tags_fresh(entry['tags'], cache)
+
+
+def _replay_hit(request, entry, on_hit):
+    if on_hit is not None:
+        on_hit(request, entry['meta'])
+    return _build_response(entry, 'HIT')
+
+
+def track_cache_tags(request):
+    """
+    Start collecting the tags ``add_cache_tags`` declares for ``request``, for
+    caches other than the page cache; returns the tag -> version dict it fills
+    """
+    request._page_cache_tags = {}
+    return request._page_cache_tags
+
+
+def tags_fresh(tags, cache=None):
+    """Whether every tag in a tag -> version dict is still at that version"""
+    return get_tag_versions(tags, cache) == tags
+
+
+def _begin_render(request):
+    track_cache_tags(request)
+    request._page_cache_meta = {}
+
+
+def _store(request, response, cache, key, timeout, config):
+    if hasattr(response, 'render') and callable(response.render):
+        response = response.render()
+    if _is_cacheable_response(request, response):
+        cache.set(key, {
+            'content': response.content,
+            'status': response.status_code,
+            'content_type': response['Content-Type'],
+            'tags': request._page_cache_tags,
+            'meta': request._page_cache_meta,
+        }, timeout if timeout is not None else config['TIMEOUT'])
+        response['X-Page-Cache'] = 'MISS'
+    return response
+
+
+def cache_anonymous_page(view_func=None, *, timeout=None, on_hit=None):
+    """
+    Cache a view's responses for logged-out users.
+
+    ``on_hit(request, meta)`` runs on every cache hit with the ``meta`` the
+    view stored through ``set_cache_meta``, for side effects such as
+    counting views that must not be skipped.  Async views get an async
+    wrapper (whose ``on_hit`` may be a coroutine function) that resolves
+    ``request.user`` through ``auser()`` before checking it.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _async_decorator(view, timeout, on_hit)
+        view_name = view.__name__
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            config = get_config()
+            enabled = is_enabled(config)
+            if not enabled or not _is_cacheable_request(request):
+                if enabled:
+                    record_stat(get_cache(), view_name, 'bypass')
+                return view(request, *args, **kwargs)
+
+            cache = get_cache()
+            key = page_key(request, config)
+            entry = cache.get(key)
+            if _fresh(entry, cache):
+                record_stat(cache, view_name, 'hit')
+                return _replay_hit(request, entry, on_hit)
+            record_stat(cache, view_name, 'stale' if entry is not None else 'miss')
+
+            # Coalesce concurrent misses: only the lock holder renders
+            lock_key = f'{key}:lock'
+            if not cache.add(lock_key, 1, config['LOCK_TIMEOUT']):
+                deadline = time.monotonic() + config['WAIT']
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    entry = cache.get(key)
+                    if _fresh(entry, cache):
+                        return _replay_hit(request, entry, on_hit)
+                return view(request, *args, **kwargs)
+
+            try:
+                _begin_render(request)
+                return _store(request, view(request, *args, **kwargs), cache, key, timeout, config)
+            finally:
+                cache.delete(lock_key)
+
+        return wrapper
+
+    if view_func is not None:
+        return decorator(view_func)
+    return decorator
+
+
+def _async_decorator(view, timeout, on_hit):
+    # Cache calls stay synchronous here: they are in-memory or single
+    # round trips, far cheaper than handing the request to a thread
+    view_name = view.__name__
+
+    async def replay_hit(request, entry):
+        if on_hit is not None and iscoroutinefunction(on_hit):
+            await on_hit(request, entry['meta'])
+            return _build_response(entry, 'HIT')
+        return _replay_hit(request, entry, on_hit)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if hasattr(request, 'auser'):
+            request.user = await request.auser()
+        config = get_config()
+        enabled = is_enabled(config)
+        if not enabled or not _is_cacheable_request(request):
+            if enabled:
+                record_stat(get_cache(), view_name, 'bypass')
+            return await view(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = page_key(request, config)
+        entry = cache.get(key)
+        if _fresh(entry, cache):
+            record_stat(cache, view_name, 'hit')
+            return await replay_hit(request, entry)
+        record_stat(cache, view_name, 'stale' if entry is not None else 'miss')
+
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, 1, config['LOCK_TIMEOUT']):
+            deadline = time.monotonic() + config['WAIT']
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                entry = cache.get(key)
+                if _fresh(entry, cache):
+                    return await replay_hit(request, entry)
+            return await view(request, *args, **kwargs)
+
+        try:
+            _begin_render(request)
+            return _store(request, await view(request, *args, **kwargs), cache, key, timeout, config)
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
@@ -0,0 +1,199 @@
+"""
+Keyset (cursor) pagination for listing views.
+
+Instead of ``COUNT(*)`` plus ``OFFSET``, each page is fetched with a
+``WHERE (sort key) < (last row's key)`` condition on an indexed ordering,
+so a deep page costs the same as the first one.  Cursors are opaque,
+URL-safe tokens; templates only get "newer"/"older" links, never a total.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(str(exc)) from exc
+    if not isinstance(payload, dict):
+        raise InvalidCursor('Cursor payload must be an object')
+    return payload
+
+
+class CursorPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class CursorPaginator:
+    """
+    Paginate ``queryset`` by ``ordering`` (e.g. ``('-published_at',)``).
+
+    The primary key is appended as a tie-breaker so the ordering is total.
+    Every ordering field must be non-null for the rows being paginated.
+    Rows may be model instances or ``values()`` dicts holding every
+    ordering field (``'pk'`` included).  Pass ``ordering=None`` for querysets that can only be ordered by an
+    expression (such as a search rank); those fall back to offsets hidden
+    inside the same opaque cursor.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        if ordering is not None:
+            ordering = list(ordering)
+            pk_name = queryset.model._meta.pk.name
+            if not any(field.lstrip('-') in ('pk', pk_name) for field in ordering):
+                # 'pk' rather than the field name, which for a one-to-one
+                # primary key would read the related object
+                direction = '-' if ordering and ordering[-1].startswith('-') else ''
+                ordering.append(direction + 'pk')
+        self.ordering = ordering
+
+    def get_page(self, token, strict=False):
+        """
+        Return the page for ``token``.  A malformed cursor gives the first
+        page, or raises ``InvalidCursor`` if ``strict``.
+        """
+        queryset, finish = self._plan(token, strict)
+        return finish(list(queryset))
+
+    async def aget_page(self, token, strict=False):
+        """``get_page()`` for async views, fetching the rows through the async ORM"""
+        queryset, finish = self._plan(token, strict)
+        return finish([row async for row in queryset])
+
+    def _plan(self, token, strict=False):
+        """The sliced queryset for ``token`` and a function turning its rows into a page"""
+        try:
+            payload = decode_cursor(token) if token else {}
+            if self.ordering is None:
+                return self._offset_page(payload)
+            return self._keyset_page(payload)
+        except (InvalidCursor, KeyError, TypeError, ValueError, ValidationError) as exc:
+            if strict:
+                raise InvalidCursor(str(exc)) from exc
+            return self._offset_page({}) if self.ordering is None else self._keyset_page({})
+
+    def _fields(self):
+        return [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in self.ordering
+        ]
+
+    def _key_of(self, obj):
+        values = []
+        for name, _ in self._fields():
+            if isinstance(obj, dict):
+                value = obj[name]
+            else:
+                value = getattr(obj, 'pk' if name == 'pk' else name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _parse_values(self, values):
+        fields = self._fields()
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise InvalidCursor('Cursor does not match the ordering')
+        opts = self.queryset.model._meta
+        parsed = []
+        for (name, _), value in zip(fields, values):
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            parsed.append(field.to_python(value))
+        return parsed
+
+    def _after(self, values, reverse):
+        """Q for rows strictly after ``values`` in the ordering (before, if ``reverse``)"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self._fields(), values):
+            forwards_is_less = descending != reverse
+            step = Q(**{f'{name}__lt' if forwards_is_less else f'{name}__gt': value})
+            condition |= equal & step
+            equal &= Q(**{name: value})
+        return condition
+
+    def _keyset_page(self, payload):
+        direction = payload.get('d', 'n')
+        if direction not in ('n', 'p'):
+            raise InvalidCursor('Unknown cursor direction')
+        values = payload.get('v')
+        queryset = self.queryset
+        reverse = direction == 'p'
+        if values is not None:
+            queryset = queryset.filter(self._after(self._parse_values(values), reverse))
+        ordering = self.ordering
+        if reverse:
+            ordering = [name[1:] if name.startswith('-') else '-' + name for name in ordering]
+
+        def finish(rows):
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            if reverse:
+                rows.reverse()
+                has_next, has_previous = True, has_more
+            else:
+                has_next, has_previous = has_more, values is not None
+            next_cursor = previous_cursor = None
+            if rows and has_next:
+                next_cursor = encode_cursor({'d': 'n', 'v': self._key_of(rows[-1])})
+            if rows and has_previous:
+                previous_cursor = encode_cursor({'d': 'p', 'v': self._key_of(rows[0])})
+            return CursorPage(rows, has_next, has_previous, next_cursor, previous_cursor)
+
+        return queryset.order_by(*ordering)[:self.per_page + 1], finish
+
+    def _offset_page(self, payload):
+        offset = payload.get('o', 0)
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise InvalidCursor('Cursor offset must be a non-negative integer')
+
+        def finish(rows):
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            next_cursor = encode_cursor({'o': offset + self.per_page}) if has_next else None
+            previous_cursor = None
+            if offset > 0:
+                previous_cursor = encode_cursor({'o': max(offset - self.per_page, 0)})
+            return CursorPage(rows, has_next, offset > 0, next_cursor, previous_cursor)
+
+        return self.queryset[offset:offset + self.per_page + 1], finish
+
+
+def paginate(request, queryset, per_page, ordering=None):
+    return CursorPaginator(queryset, per_page, ordering).get_page(request.GET.get(CURSOR_PARAM))
+
+
+async def apaginate(request, queryset, per_page, ordering=None):
+    return await CursorPaginator(queryset, per_page, ordering).aget_page(request.GET.get(CURSOR_PARAM))
@@ -0,0 +1,477 @@
+"""
+Content-similarity "related posts" index.
+
+Published posts are turned into TF-IDF vectors over title (weighted),
+excerpt and body, randomly projected to a fixed number of dimensions and
+L2-normalised, so the dot product of two vectors approximates their cosine
+similarity.  ``rebuild()`` computes the top-k neighbours of every post in
+vectorised NumPy batches and stores them as ``RelatedBlog`` rows, which the
+detail page reads with one indexed query.  ``update_blog()`` keeps the index
+current when a single post is published or edited; saves schedule it with
+``blog_changed()``, on a background thread unless ``RELATED_POSTS['BACKEND']``
+is ``'sync'``, since it reads every stored vector.  ``blog_deleted()`` takes
+a deleted post out of the vectors the same way, so it is never a neighbour.
+
+The model and vectors live in ``RELATED_POSTS['INDEX_DIR']``:
+
+    model.npz         vocabulary, idf weights and projection seed
+    vectors.npy       float32 matrix, one row per post from the last rebuild
+    ids.npy           blog id of each row of vectors.npy
+    delta_*.npy       posts published since the last rebuild
+"""
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .pagecache import invalidate_tags
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'thread',      # 'thread' (background worker) or 'sync'
+    'INDEX_DIR': os.path.join(settings.BASE_DIR, 'var', 'related'),
+    'TOP_K': 6,
+    'MAX_FEATURES': 4096,
+    'MIN_DF': 2,
+    'MAX_DF_RATIO': 0.5,
+    'DIMENSIONS': 256,
+    'BATCH_SIZE': 512,
+    'SEED': 1729,
+    # Projection noise gives unrelated posts small positive scores; ignore them
+    'MIN_SCORE': 0.15,
+    # How many most-similar posts to re-check when one post changes
+    'REVERSE_CANDIDATES': 50,
+}
+
+TITLE_WEIGHT = 3
+WORD_RE = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+STOPWORDS = frozenset(
+    'the and for are but not you all any can had her was one our out day get has him his how '
+    'man new now old see two way who boy did its let put say she too use that with have this '
+    'will your from they know want been good much some time very when come here just like '
+    'long make many more only over such take than them well were what into also about after '
+    'again which their there these would other could should where while being those because'.split()
+)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'RELATED_POSTS', {}))
+    return config
+
+
+def tokenize(title, excerpt, body):
+    text = ' '.join([title] * TITLE_WEIGHT + [excerpt or '', body or ''])
+    return [word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+class TfidfProjection:
+    """TF-IDF over a capped vocabulary followed by a seeded random projection"""
+
+    def __init__(self, terms, idf, dimensions, seed):
+        self.terms = list(terms)
+        self.vocabulary = {term: column for column, term in enumerate(self.terms)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.dimensions = dimensions
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((len(self.terms), dimensions)).astype(np.float32)
+
+    @classmethod
+    def fit(cls, token_lists, config):
+        document_frequency = Counter()
+        documents = 0
+        for tokens in token_lists:
+            document_frequency.update(set(tokens))
+            documents += 1
+        max_df = max(config['MAX_DF_RATIO'] * documents, config['MIN_DF'])
+        candidates = [
+            (df, term) for term, df in document_frequency.items()
+            if config['MIN_DF'] <= df <= max_df
+        ]
+        candidates.sort(key=lambda item: (-item[0], item[1]))
+        chosen = candidates[:config['MAX_FEATURES']]
+        terms = [term for _, term in chosen]
+        idf = [math.log((1 + documents) / (1 + df)) + 1 for df, _ in chosen]
+        return cls(terms, idf, config['DIMENSIONS'], config['SEED'])
+
+    def transform(self, token_lists):
+        """Return an ``(len(token_lists), dimensions)`` float32 matrix of unit rows"""
+        matrix = np.zeros((len(token_lists), len(self.terms)), dtype=np.float32)
+        for row, tokens in enumerate(token_lists):
+            counts = Counter(token for token in tokens if token in self.vocabulary)
+            if counts:
+                columns = np.fromiter((self.vocabulary[t] for t in counts), dtype=np.int64, count=len(counts))
+                frequencies = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+                matrix[row, columns] = 1 + np.log(frequencies)
+        matrix *= self.idf
+        _normalise(matrix)
+        projected = matrix @ self.projection if len(self.terms) else np.zeros(
+            (len(token_lists), self.dimensions), dtype=np.float32
+        )
+        _normalise(projected)
+        return projected
+
+    def save(self, path):
+        np.savez(path, terms=np.array(self.terms, dtype=str), idf=self.idf,
+                 dimensions=self.dimensions, seed=self.seed)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['terms'].tolist(), data['idf'], int(data['dimensions']), int(data['seed']))
+
+
+def _normalise(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+
+
+def top_k_neighbours(vectors, ids, queries, query_ids, k, min_score=0.0):
+    """
+    Top-``k`` most similar rows of ``vectors`` for every row of ``queries``.
+
+    Returns ``(neighbour_ids, scores)`` arrays of shape ``(len(queries), k)``;
+    a post is never its own neighbour and slots scoring ``min_score`` or
+    less get id -1.
+    """
+    similarities = queries @ vectors.T
+    similarities[query_ids[:, None] == ids[None, :]] = -np.inf
+    k = min(k, similarities.shape[1])
+    if k == 0:
+        empty = np.empty((len(queries), 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    neighbour_ids = ids[top]
+    neighbour_ids[~(top_scores > min_score)] = -1
+    return neighbour_ids, top_scores
+
+
+def similarity_batches(vectors, ids, k, batch_size, min_score=0.0):
+    """Yield ``(query_ids, neighbour_ids, scores)`` for all rows, ``batch_size`` rows at a time"""
+    # Keep the batch x corpus similarity block around 256 MB
+    batch_size = max(1, min(batch_size, (64 * 1024 * 1024) // max(len(ids), 1)))
+    for start in range(0, len(ids), batch_size):
+        query_ids = ids[start:start + batch_size]
+        neighbour_ids, scores = top_k_neighbours(
+            vectors, ids, vectors[start:start + batch_size], query_ids, k, min_score
+        )
+        yield query_ids, neighbour_ids, scores
+
+
+class RelatedIndex:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self):
+        return os.path.exists(self.path('model.npz')) and os.path.exists(self.path('vectors.npy'))
+
+    @contextmanager
+    def lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path('lock'), 'w') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def load_model(self):
+        return TfidfProjection.load(self.path('model.npz'))
+
+    def load_vectors(self, mode='r'):
+        vectors = np.load(self.path('vectors.npy'), mmap_mode=mode)
+        ids = np.load(self.path('ids.npy'))
+        return ids, vectors
+
+    def load_delta(self, dimensions):
+        if not os.path.exists(self.path('delta_ids.npy')):
+            return np.empty(0, dtype=np.int64), np.empty((0, dimensions), dtype=np.float32)
+        return np.load(self.path('delta_ids.npy')), np.load(self.path('delta_vectors.npy'))
+
+    def save_delta(self, ids, vectors):
+        _atomic_save(self.path('delta_ids.npy'), ids)
+        _atomic_save(self.path('delta_vectors.npy'), vectors)
+
+    def set_vector(self, blog_id, vector):
+        """Store one post's vector: in place if it is in the main matrix, else in the delta"""
+        ids, vectors = self.load_vectors(mode='r+')
+        rows = np.flatnonzero(ids == blog_id)
+        if len(rows):
+            vectors[rows[0]] = vector
+            vectors.flush()
+            return
+        delta_ids, delta_vectors = self.load_delta(vectors.shape[1])
+        rows = np.flatnonzero(delta_ids == blog_id)
+        if len(rows):
+            delta_vectors[rows[0]] = vector
+        else:
+            delta_ids = np.append(delta_ids, blog_id)
+            delta_vectors = np.vstack([delta_vectors, vector[None, :]])
+        self.save_delta(delta_ids, delta_vectors)
+
+    def discard(self, blog_id):
+        """Forget one post: zero its row in the main matrix, drop it from the delta"""
+        ids, vectors = self.load_vectors(mode='r+')
+        rows = np.flatnonzero(ids == blog_id)
+        if len(rows):
+            vectors[rows] = 0
+            vectors.flush()
+        delta_ids, delta_vectors = self.load_delta(vectors.shape[1])
+        keep = delta_ids != blog_id
+        if not keep.all():
+            self.save_delta(delta_ids[keep], delta_vectors[keep])
+
+    def all_vectors(self):
+        ids, vectors = self.load_vectors()
+        delta_ids, delta_vectors = self.load_delta(vectors.shape[1])
+        if len(delta_ids):
+            return np.concatenate([ids, delta_ids]), np.vstack([vectors, delta_vectors])
+        return ids, np.asarray(vectors)
+
+
+def _atomic_save(path, array):
+    temporary = path + '.tmp.npy'
+    np.save(temporary, array)
+    os.replace(temporary, path)
+
+
+def get_index():
+    return RelatedIndex(str(get_config()['INDEX_DIR']))
+
+
+def _published_documents(chunk_size=2000):
+    from .models import Blog
+
+    rows = Blog.objects.filter(status='published').order_by('pk').values_list(
+        'pk', 'title', 'excerpt', 'body'
+    )
+    for blog_id, title, excerpt, body in rows.iterator(chunk_size=chunk_size):
+        yield blog_id, tokenize(title, excerpt, body)
+
+
+def rebuild(log=None):
+    """Recompute the model, every vector and every post's neighbours; returns stage timings"""
+    from .models import RelatedBlog
+
+    config = get_config()
+    index = get_index()
+    timings = {}
+    started = time.perf_counter()
+
+    with index.lock():
+        model = TfidfProjection.fit((tokens for _, tokens in _published_documents()), config)
+        timings['fit'] = time.perf_counter() - started
+
+        stage = time.perf_counter()
+        id_list, vector_blocks, batch_ids, batch_tokens = [], [], [], []
+        for blog_id, tokens in _published_documents():
+            batch_ids.append(blog_id)
+            batch_tokens.append(tokens)
+            if len(batch_ids) == config['BATCH_SIZE']:
+                id_list.extend(batch_ids)
+                vector_blocks.append(model.transform(batch_tokens))
+                batch_ids, batch_tokens = [], []
+        if batch_ids:
+            id_list.extend(batch_ids)
+            vector_blocks.append(model.transform(batch_tokens))
+        ids = np.array(id_list, dtype=np.int64)
+        vectors = (
+            np.vstack(vector_blocks) if vector_blocks
+            else np.empty((0, config['DIMENSIONS']), dtype=np.float32)
+        )
+        timings['vectorize'] = time.perf_counter() - stage
+
+        similarity_time = write_time = 0.0
+        neighbours = 0
+        with transaction.atomic():
+            stage = time.perf_counter()
+            RelatedBlog.objects.all().delete()
+            write_time += time.perf_counter() - stage
+            batches = similarity_batches(
+                vectors, ids, config['TOP_K'], config['BATCH_SIZE'], config['MIN_SCORE']
+            )
+            while True:
+                stage = time.perf_counter()
+                batch = next(batches, None)
+                similarity_time += time.perf_counter() - stage
+                if batch is None:
+                    break
+                stage = time.perf_counter()
+                query_ids, neighbour_ids, scores = batch
+                rows = [
+                    RelatedBlog(blog_id=int(blog_id), related_id=int(related_id), score=float(score))
+                    for blog_id, row_ids, row_scores in zip(query_ids, neighbour_ids, scores)
+                    for related_id, score in zip(row_ids, row_scores)
+                    if related_id != -1
+                ]
+                RelatedBlog.objects.bulk_create(rows, batch_size=2000)
+                neighbours += len(rows)
+                write_time += time.perf_counter() - stage
+                if log:
+                    log(f'  {neighbours} neighbours written')
+        timings['similarity'] = similarity_time
+
+        stage = time.perf_counter()
+        model.save(index.path('model.npz'))
+        _atomic_save(index.path('ids.npy'), ids)
+        _atomic_save(index.path('vectors.npy'), vectors)
+        for name in ('delta_ids.npy', 'delta_vectors.npy'):
+            if os.path.exists(index.path(name)):
+                os.remove(index.path(name))
+        timings['write'] = write_time + time.perf_counter() - stage
+
+    timings['posts'] = len(ids)
+    timings['neighbours'] = neighbours
+    timings['total'] = time.perf_counter() - started
+    return timings
+
+
+def update_blog(blog):
+    """Re-vectorise one post and refresh its neighbours and the posts it now belongs to"""
+    from django.db.models import Count, Min
+    from .models import Blog, RelatedBlog
+
+    index = get_index()
+    if not index.exists():
+        return
+    config = get_config()
+    k = config['TOP_K']
+
+    with index.lock():
+        model = index.load_model()
+        if blog.status == 'published':
+            vector = model.transform([tokenize(blog.title, blog.excerpt, blog.body)])[0]
+        else:
+            vector = np.zeros(model.dimensions, dtype=np.float32)
+        index.set_vector(blog.pk, vector)
+        ids, vectors = index.all_vectors()
+
+    with transaction.atomic():
+        RelatedBlog.objects.filter(blog=blog).delete()
+        if blog.status != 'published':
+            RelatedBlog.objects.filter(related=blog).delete()
+            return
+
+        neighbour_ids, scores = top_k_neighbours(
+            vectors, ids, vector[None, :], np.array([blog.pk]), k, config['MIN_SCORE']
+        )
+        RelatedBlog.objects.bulk_create(
+            RelatedBlog(blog_id=blog.pk, related_id=int(related_id), score=float(score))
+            for related_id, score in zip(neighbour_ids[0], scores[0])
+            if related_id != -1
+        )
+
+        # Posts for which this one is now among the most similar
+        similarities = vectors @ vector
+        similarities[ids == blog.pk] = -np.inf
+        candidates = min(config['REVERSE_CANDIDATES'], len(ids))
+        if not candidates:
+            return
+        top = np.argpartition(-similarities, candidates - 1)[:candidates]
+        candidate_scores = {
+            int(ids[row]): float(similarities[row])
+            for row in top if similarities[row] > config['MIN_SCORE']
+        }
+        # The index can lag behind the table: a post deleted or unpublished
+        # since its vector was stored must not get neighbour rows
+        live = set(
+            Blog.objects.filter(pk__in=candidate_scores, status='published').values_list('pk', flat=True)
+        )
+        candidate_scores = {other_id: score for other_id, score in candidate_scores.items() if other_id in live}
+        RelatedBlog.objects.filter(related=blog, blog_id__in=candidate_scores).delete()
+        changed = []
+        current = {
+            row['blog']: row for row in RelatedBlog.objects.filter(blog_id__in=candidate_scores)
+            .values('blog').annotate(lowest=Min('score'), total=Count('pk'))
+        }
+        for other_id, score in candidate_scores.items():
+            stats = current.get(other_id)
+            if stats is not None and stats['total'] >= k and score <= stats['lowest']:
+                continue
+            RelatedBlog.objects.create(blog_id=other_id, related_id=blog.pk, score=score)
+            changed.append(other_id)
+            if stats is not None and stats['total'] >= k:
+                excess = RelatedBlog.objects.filter(blog_id=other_id).order_by('-score', 'pk')[k:]
+                RelatedBlog.objects.filter(pk__in=list(excess.values_list('pk', flat=True))).delete()
+        # Detail pages whose related-posts block changed
+        invalidate_tags(*(f'blog:{other_id}' for other_id in changed))
+
+
+def update_blog_id(blog_id):
+    from .models import Blog
+
+    blog = Blog.objects.filter(pk=blog_id).first()
+    if blog is None:
+        remove_blog(blog_id)
+    else:
+        update_blog(blog)
+
+
+def remove_blog(blog_id):
+    """Take a deleted post out of the index; its RelatedBlog rows went with it"""
+    index = get_index()
+    if not index.exists():
+        return
+    with index.lock():
+        index.discard(blog_id)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception('Related posts job %s%r failed', job.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def _submit(job, *args):
+    global _executor
+    if get_config()['BACKEND'] != 'thread':
+        job(*args)
+        return
+    with _executor_lock:
+        if _executor is None:
+            # One worker: updates serialise on the index lock anyway
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related-posts')
+    _executor.submit(_run, job, *args)
+
+
+def blog_changed(blog_id):
+    """Schedule ``update_blog()`` for a post once the transaction commits"""
+    transaction.on_commit(lambda: _submit(update_blog_id, blog_id))
+
+
+def blog_deleted(blog_id):
+    """Schedule ``remove_blog()`` for a deleted post once the transaction commits"""
+    transaction.on_commit(lambda: _submit(remove_blog, blog_id))
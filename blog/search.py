@@ -0,0 +1,174 @@
+"""
+Full-text search over Blog title, excerpt and body.
+
+On SQLite the posts are mirrored into an FTS5 virtual table (``blog_blog_fts``,
+rowid = blog id) that is kept in sync from blog.signals and can be rebuilt
+with the ``rebuild_search_index`` command.  Matches are ranked with BM25 and
+carry a highlighted snippet of the body.  On other databases, or if the
+table is missing, search falls back to the old ``icontains`` filters.
+"""
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+FTS_TABLE = 'blog_blog_fts'
+
+# Column weights for bm25(): title, excerpt, body
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+# Control characters cannot appear in escaped HTML, so they make safe
+# placeholders for the highlight markers until the snippet is escaped
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+SNIPPET_TOKENS = 24
+
+RANK_SQL = 'bm25({table}, {weights})'.format(
+    table=FTS_TABLE, weights=', '.join(str(weight) for weight in BM25_WEIGHTS)
+)
+SNIPPET_SQL = "snippet({table}, 2, '{start}', '{end}', '...', {tokens})".format(
+    table=FTS_TABLE, start=HIGHLIGHT_START, end=HIGHLIGHT_END, tokens=SNIPPET_TOKENS
+)
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+_fts_available = None
+
+
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def build_match_query(query):
+    """
+    Turn free text into an FTS5 expression that cannot raise a syntax error.
+
+    Every word becomes a quoted term, all terms must match, and the last one
+    is a prefix so partially typed words still find results.
+    """
+    terms = _TERM_RE.findall(query or '')
+    if not terms:
+        return ''
+    quoted = ['"{}"'.format(term) for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+async def afts_available():
+    """``fts_available()`` for async views; only the first call inspects the database"""
+    if _fts_available is None:
+        return await sync_to_async(fts_available)()
+    return _fts_available
+
+
+def search_blogs(queryset, query):
+    """Restrict ``queryset`` to posts matching ``query``, annotated with
+    ``search_rank`` (lower is better) and ``search_snippet``"""
+    if not fts_available():
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(body__icontains=query) |
+            Q(excerpt__icontains=query)
+        )
+    match = build_match_query(query)
+    if not match:
+        return queryset.none()
+    blog_table = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[
+            '{fts}.rowid = {blog}.id'.format(fts=FTS_TABLE, blog=blog_table),
+            '{fts} MATCH %s'.format(fts=FTS_TABLE),
+        ],
+        params=[match],
+        select={'search_rank': RANK_SQL, 'search_snippet': SNIPPET_SQL},
+    )
+
+
+def order_by_relevance(queryset):
+    if 'search_rank' not in queryset.query.extra_select:
+        return queryset.order_by('-published_at')
+    return queryset.extra(order_by=['search_rank', '-published_at'])
+
+
+def render_snippet(snippet):
+    """Escape a search snippet and turn its placeholders into <mark> tags"""
+    html = escape(snippet or '')
+    html = html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    return mark_safe(html)
+
+
+def index_blog(blog):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [blog.pk])
+        cursor.execute(
+            'INSERT INTO {} (rowid, title, excerpt, body) VALUES (%s, %s, %s, %s)'.format(FTS_TABLE),
+            [blog.pk, blog.title, blog.excerpt, blog.body],
+        )
+
+
+def index_blogs(blog_ids, batch_size=500):
+    """Index many newly inserted posts (bulk loads bypass the post_save signal)"""
+    from .models import Blog
+
+    if not fts_available():
+        return
+    blog_ids = list(blog_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(blog_ids), batch_size):
+            chunk = blog_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                'DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, placeholders), chunk
+            )
+            cursor.execute(
+                'INSERT INTO {fts} (rowid, title, excerpt, body) '
+                'SELECT id, title, excerpt, body FROM {blog} WHERE id IN ({ids})'.format(
+                    fts=FTS_TABLE, blog=Blog._meta.db_table, ids=placeholders,
+                ),
+                chunk,
+            )
+
+
+def unindex_blog(blog_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [blog_id])
+
+
+def rebuild_index(batch_size=2000):
+    """Repopulate the FTS table from blog_blog in id-ordered batches"""
+    from .models import Blog
+
+    if not fts_available():
+        return 0
+    blog_table = Blog._meta.db_table
+    indexed = 0
+    last_id = 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+        while True:
+            cursor.execute(
+                'INSERT INTO {fts} (rowid, title, excerpt, body) '
+                'SELECT id, title, excerpt, body FROM {blog} '
+                'WHERE id > %s ORDER BY id LIMIT %s'.format(fts=FTS_TABLE, blog=blog_table),
+                [last_id, batch_size],
+            )
+            if cursor.rowcount <= 0:
+                break
+            indexed += cursor.rowcount
+            cursor.execute('SELECT MAX(rowid) FROM {}'.format(FTS_TABLE))
+            last_id = cursor.fetchone()[0]
+        cursor.execute("INSERT INTO {fts} ({fts}) VALUES ('optimize')".format(fts=FTS_TABLE))
+    return indexed
@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from . import images, leaderboards, related, search
+from .models import Blog, Category, Rating
+from .pagecache import invalidate_tags
+from profiles import feed
+from profiles.models import AuthorStats
+
+
+def invalidate_on_commit(*tags):
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+def blog_tags(blog):
+    """Page cache tags of every page that shows or lists ``blog``"""
+    tags = {'blogs', f'blog:{blog.pk}', f'author-blogs:{blog.author_id}', f'category-blogs:{blog.category_id}'}
+    previous_category = getattr(blog, '_stored_category_id', None)
+    if previous_category is not None:
+        tags.add(f'category-blogs:{previous_category}')
+    return tags
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stored_score', None)
+    if created:
+        Blog.apply_rating_delta(instance.blog_id, instance.score, 1)
+        AuthorStats.apply_blog_rating_delta(instance.blog_id, instance.score, 1)
+    elif previous is None:
+        # Saved without being loaded first, so the old score is unknown
+        Blog.rebuild_rating_aggregates(blog_ids=[instance.blog_id])
+        AuthorStats.rebuild(user_ids=Blog.objects.filter(pk=instance.blog_id).values('author_id'))
+    elif instance.score != previous:
+        Blog.apply_rating_delta(instance.blog_id, instance.score - previous, 0)
+        AuthorStats.apply_blog_rating_delta(instance.blog_id, instance.score - previous, 0)
+    instance._stored_score = instance.score
+    leaderboards.rating_changed(instance.blog_id)
+    invalidate_on_commit(f'blog:{instance.blog_id}', 'ratings')
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    score = getattr(instance, '_stored_score', None)
+    if score is None:
+        score = instance.score
+    Blog.apply_rating_delta(instance.blog_id, -score, -1)
+    AuthorStats.apply_blog_rating_delta(instance.blog_id, -score, -1)
+    instance._stored_score = None
+    leaderboards.rating_changed(instance.blog_id)
+    invalidate_on_commit(f'blog:{instance.blog_id}', 'ratings')
+
+
+@receiver(post_save, sender=Blog)
+def blog_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    update_author_stats(instance, created)
+    update_feeds(instance, created)
+    content = instance.indexed_content()
+    stored_content = getattr(instance, '_stored_content', None)
+    content_changed = created or stored_content is None or None in stored_content or content != stored_content
+    if content_changed:
+        search.index_blog(instance)
+    if content_changed or instance.status != getattr(instance, '_stored_status', None):
+        related.blog_changed(instance.pk)
+    images.image_saved(instance, 'featured_image')
+    invalidate_on_commit(*blog_tags(instance))
+    instance._stored_category_id = instance.category_id
+    instance._stored_status = instance.status
+    instance._stored_author_id = instance.author_id
+    instance._stored_content = content
+
+
+def update_author_stats(blog, created):
+    is_published = blog.status == 'published'
+    if created:
+        if is_published:
+            AuthorStats.apply_publish_delta(blog.pk, 1)
+        return
+    previous_author = getattr(blog, '_stored_author_id', None)
+    previous_status = getattr(blog, '_stored_status', None)
+    if previous_author is None or previous_status is None or previous_author != blog.author_id:
+        # Unknown previous state, or the post (and its ratings) moved to another author
+        AuthorStats.rebuild(user_ids={blog.author_id, previous_author} - {None})
+    elif is_published != (previous_status == 'published'):
+        AuthorStats.apply_publish_delta(blog.pk, 1 if is_published else -1)
+
+
+def update_feeds(blog, created):
+    was_published = not created and getattr(blog, '_stored_status', None) == 'published'
+    is_published = blog.status == 'published'
+    if is_published and not was_published:
+        feed.blog_published(blog.pk)
+    elif was_published and not is_published:
+        feed.blog_unpublished(blog.pk)
+
+
+@receiver(pre_delete, sender=Blog)
+def blog_deleting(sender, instance, **kwargs):
+    # Before the row goes, so the stored status and view count are read
+    # from the database rather than a possibly stale instance
+    if Blog.objects.filter(pk=instance.pk, status='published').exists():
+        AuthorStats.apply_publish_delta(instance.pk, -1)
+
+
+@receiver(post_delete, sender=Blog)
+def blog_deleted(sender, instance, **kwargs):
+    search.unindex_blog(instance.pk)
+    related.blog_deleted(instance.pk)
+    images.image_deleted(instance, 'featured_image')
+    invalidate_on_commit(*blog_tags(instance))
+
+
+@receiver(images.variants_updated, sender=Blog)
+def blog_variants_updated(sender, pk, **kwargs):
+    blog = Blog.objects.filter(pk=pk).only('author', 'category').first()
+    if blog is not None:
+        invalidate_tags(*blog_tags(blog))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_on_commit(f'category:{instance.pk}', 'categories')
@@ -0,0 +1,129 @@
+"""
+Sharded, streaming sitemap of every published post.
+
+Shard ``n`` lists the published posts with ids in ``(n * SHARD_SIZE,
+(n + 1) * SHARD_SIZE]``, so a shard never exceeds the protocol's 50,000
+URLs and its contents do not shift as posts are added or removed.  The
+sitemap index is built from one grouped query (post count and newest
+``updated_at`` per shard), cached with the version of the ``blogs`` page
+cache tag; each shard is streamed row by row from
+``QuerySet.iterator()``, so a million posts never become one list in memory.
+
+Both carry a strong ``ETag`` and ``Last-Modified`` derived from the cached
+summary, so conditional requests are answered ``304`` without querying the
+database while the summary is fresh.
+"""
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, F, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+
+from .feeds import PREFIX, conditional_response, get_config, strong_etag
+from .models import Blog
+from .pagecache import get_cache, get_tag_versions, tags_fresh
+
+CONTENT_TYPE = 'application/xml; charset=utf-8'
+SLUG_PLACEHOLDER = 'sitemap-slug'
+CHUNK_SIZE = 2000
+
+INDEX_START = '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+INDEX_END = '</sitemapindex>\n'
+URLSET_START = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_END = '</urlset>\n'
+
+
+def _w3c(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def _w3c_stamp(stamp):
+    return _w3c(datetime.fromtimestamp(stamp, tz=timezone.utc))
+
+
+def compute_summary(shard_size):
+    """shard number -> (post count, newest updated_at timestamp)"""
+    rows = (
+        Blog.objects.filter(status='published')
+        .annotate(shard=(F('pk') - 1) / shard_size)
+        .order_by()
+        .values('shard')
+        .annotate(count=Count('pk'), lastmod=Max('updated_at'))
+        .values_list('shard', 'count', 'lastmod')
+    )
+    return {shard: (count, int(lastmod.timestamp())) for shard, count, lastmod in rows}
+
+
+def get_summary(config=None):
+    """The cached summary, recomputed when a post changed (the ``blogs`` tag moved)"""
+    config = config or get_config()
+    cache = get_cache()
+    key = f'{PREFIX}:sitemap:{config["SITEMAP_SHARD_SIZE"]}'
+    entry = cache.get(key)
+    if entry is None or not tags_fresh(entry['tags'], cache):
+        # Versions taken before the query: a change during it leaves the entry stale, not wrongly fresh
+        tags = get_tag_versions(['blogs'], cache)
+        entry = {'tags': tags, 'shards': compute_summary(config['SITEMAP_SHARD_SIZE'])}
+        cache.set(key, entry, config['TIMEOUT'])
+    return entry['shards']
+
+
+def sitemap_index(request):
+    config = get_config()
+    shards = get_summary(config)
+    lastmod = max((stamp for count, stamp in shards.values()), default=None)
+    host = request.get_host()
+
+    def render():
+        lines = [INDEX_START]
+        for shard, (count, stamp) in sorted(shards.items()):
+            location = request.build_absolute_uri(reverse('blog:sitemap_shard', kwargs={'shard': shard}))
+            lines.append(
+                f'<sitemap><loc>{escape(location)}</loc>'
+                f'<lastmod>{_w3c_stamp(stamp)}</lastmod></sitemap>\n'
+            )
+        lines.append(INDEX_END)
+        return HttpResponse(''.join(lines), content_type=CONTENT_TYPE)
+
+    etag = strong_etag('index', host, request.is_secure(), sorted(shards.items()))
+    return conditional_response(request, etag, lastmod, render, config)
+
+
+def stream_shard(shard, shard_size, url_prefix, url_suffix):
+    """The urlset of one shard as text chunks, a database chunk at a time"""
+    rows = (
+        Blog.objects.filter(status='published', pk__gt=shard * shard_size, pk__lte=(shard + 1) * shard_size)
+        .order_by('pk')
+        .values_list('slug', 'updated_at')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    yield URLSET_START
+    lines = []
+    for slug, updated_at in rows:
+        lines.append(
+            f'<url><loc>{url_prefix}{escape(slug)}{url_suffix}</loc><lastmod>{_w3c(updated_at)}</lastmod></url>\n'
+        )
+        if len(lines) >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    lines.append(URLSET_END)
+    yield ''.join(lines)
+
+
+def sitemap_shard(request, shard):
+    config = get_config()
+    summary = get_summary(config).get(shard)
+    if summary is None:
+        raise Http404('No such sitemap')
+    count, stamp = summary
+    url = request.build_absolute_uri(reverse('blog:blog_detail', kwargs={'slug': SLUG_PLACEHOLDER}))
+    url_prefix, url_suffix = (escape(part) for part in url.split(SLUG_PLACEHOLDER))
+    etag = strong_etag('shard', shard, config['SITEMAP_SHARD_SIZE'], count, stamp, url)
+    return conditional_response(
+        request, etag, stamp,
+        lambda: StreamingHttpResponse(
+            stream_shard(shard, config['SITEMAP_SHARD_SIZE'], url_prefix, url_suffix), content_type=CONTENT_TYPE
+        ),
+        config,
+    )
@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from blog import images
+from blog.search import render_snippet
+
+register = template.Library()
+
+
+@register.filter
+def search_snippet(value):
+    return render_snippet(value)
+
+
+@register.simple_tag
+def responsive_image(image, variant, sizes='100vw', **attrs):
+    """
+    ``<picture>`` markup for an image field with derivatives (see blog.images).
+
+    ``variant`` is the file used as ``src``; every variant of the field is
+    offered in ``srcset``, with WebP copies in a ``<source>``.  Until the
+    derivatives exist this is a plain ``<img>`` of the original.  Extra
+    keyword arguments become attributes of the ``<img>``:
+
+        {% responsive_image blog.featured_image 'card' sizes='33vw' alt=blog.title class='card-img-top' %}
+    """
+    record = getattr(image.instance, images.variants_field(image.field.name), None) or {}
+    variants = record.get('variants', {})
+    if record.get('source') != image.name or variant not in variants:
+        return format_html(
+            '<img src="{}"{}>', image.url,
+            format_html_join('', ' {}="{}"', attrs.items()),
+        )
+    url = image.storage.url
+    # One candidate per width: a small original yields equal-sized variants
+    ordered = sorted({info['width']: info for info in variants.values()}.values(), key=lambda info: info['width'])
+    chosen = variants[variant]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}></picture>',
+        ', '.join(f'{url(info["webp"])} {info["width"]}w' for info in ordered),
+        sizes,
+        url(chosen['file']),
+        ', '.join(f'{url(info["file"])} {info["width"]}w' for info in ordered),
+        sizes,
+        chosen['width'],
+        chosen['height'],
+        format_html_join('', ' {}="{}"', attrs.items()),
+    )
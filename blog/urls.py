@@ -1,19 +1,31 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, feeds, sitemaps, views
+
+# Natively async read views under ASGI (see blog.async_views)
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
 
 app_name = 'blog'
 
 urlpatterns = [
-    path('', views.home_view, name='home'),
+    path('', read_views.home_view, name='home'),
     path('create/', views.blog_create_view, name='blog_create'),
     path('my-blogs/', views.my_blogs_view, name='my_blogs'),
     path('my-favorites/', views.my_favorites_view, name='my_favorites'),
-    path('blog/<slug:slug>/', views.blog_detail_view, name='blog_detail'),
+    path('blog/<slug:slug>/', read_views.blog_detail_view, name='blog_detail'),
     path('blog/<slug:slug>/edit/', views.blog_edit_view, name='blog_edit'),
     path('blog/<slug:slug>/delete/', views.blog_delete_view, name='blog_delete'),
     path('blog/<slug:slug>/favorite/', views.toggle_favorite_view, name='toggle_favorite'),
     path('blog/<slug:slug>/rate/', views.submit_rating_view, name='submit_rating'),
-    path('category/<slug:slug>/', views.category_detail_view, name='category_detail'),
-    path('author/<str:username>/', views.author_blogs_view, name='author_blogs'),
+    path('category/<slug:slug>/', read_views.category_detail_view, name='category_detail'),
+    path('author/<str:username>/', read_views.author_blogs_view, name='author_blogs'),
+    path('feed/rss/', feeds.latest_rss, name='feed_rss'),
+    path('feed/atom/', feeds.latest_atom, name='feed_atom'),
+    path('category/<slug:slug>/feed/rss/', feeds.category_rss, name='category_feed_rss'),
+    path('category/<slug:slug>/feed/atom/', feeds.category_atom, name='category_feed_atom'),
+    path('author/<str:username>/feed/rss/', feeds.author_rss, name='author_feed_rss'),
+    path('author/<str:username>/feed/atom/', feeds.author_atom, name='author_feed_atom'),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap'),
+    path('sitemap-blogs-<int:shard>.xml', sitemaps.sitemap_shard, name='sitemap_shard'),
 ]
 
@@ -0,0 +1,300 @@
+"""
+Write-behind view counting for blog_detail_view.
+
+Page views are buffered and coalesced per blog, then written to the
+database in periodic batched ``F()`` updates instead of one
+read-modify-write per hit.  The behaviour is configured with the
+``VIEW_COUNT_BUFFER`` setting:
+
+    VIEW_COUNT_BUFFER = {
+        'BACKEND': 'auto',        # 'auto', 'memory', 'cache' or None (write through)
+        'FLUSH_INTERVAL': 10,     # seconds between background flushes
+        'DEDUP_WINDOW': 0,        # seconds a session's repeat views are ignored
+        'CACHE_ALIAS': 'default', # cache used by the 'cache' backend and dedup
+    }
+
+The ``memory`` backend keeps counts in the worker process and flushes them
+from a background thread (and at interpreter exit), so a worker that is
+killed (SIGKILL, an OOM kill, a recycle that skips ``atexit``) loses the
+views of its last ``FLUSH_INTERVAL`` seconds.  The ``cache`` backend keeps
+them in the configured cache, so they survive the worker and any process
+sharing that cache, including the ``flush_view_counts`` management command,
+can flush them.  It refuses a per-process cache (locmem, which also culls
+keys once it is full, or dummy), where that would not hold.  ``auto`` picks
+``cache`` when the cache is shared between processes and ``memory``
+otherwise.
+"""
+import atexit
+import hashlib
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+
+from blog_site.caches import is_shared
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'auto',
+    'FLUSH_INTERVAL': 10,
+    'DEDUP_WINDOW': 0,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'VIEW_COUNT_BUFFER', {}))
+    return config
+
+
+def get_backend(config=None):
+    """The configured backend, with ``'auto'`` resolved against the cache"""
+    config = config or get_config()
+    backend = config['BACKEND']
+    if backend == 'auto':
+        return 'cache' if is_shared(caches[config['CACHE_ALIAS']]) else 'memory'
+    return backend
+
+
+def write_counts(counts):
+    """
+    Apply ``{blog_id: increment}`` with one UPDATE per distinct increment,
+    and add the views of published posts to their authors' ``AuthorStats``
+    """
+    from profiles.models import AuthorStats
+    from .models import Blog
+
+    def grouped(increments):
+        by_increment = defaultdict(list)
+        for key, increment in increments.items():
+            if increment > 0:
+                by_increment[increment].append(key)
+        return by_increment.items()
+
+    with transaction.atomic():
+        for increment, blog_ids in grouped(counts):
+            Blog.objects.filter(pk__in=blog_ids).update(views_count=F('views_count') + increment)
+        author_views = Counter()
+        published = Blog.objects.filter(pk__in=list(counts), status='published')
+        for blog_id, author_id in published.values_list('pk', 'author_id'):
+            author_views[author_id] += counts[blog_id]
+        for increment, author_ids in grouped(author_views):
+            AuthorStats.objects.filter(user_id__in=author_ids).update(total_views=F('total_views') + increment)
+    return sum(counts.values())
+
+
+class DirectViewCounter:
+    """Unbuffered counter: one atomic ``F()`` update per view"""
+
+    def record(self, blog_id):
+        write_counts({blog_id: 1})
+
+    def pending(self, blog_id):
+        return 0
+
+    def flush(self):
+        return 0
+
+
+class MemoryViewCounter:
+    """Per-process buffer flushed by a background daemon thread"""
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, blog_id):
+        with self._lock:
+            self._counts[blog_id] += 1
+        self.start()
+
+    def pending(self, blog_id):
+        return self._counts.get(blog_id, 0)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+            if not counts:
+                return 0
+            try:
+                return write_counts(counts)
+            except Exception:
+                # Put the views back so the next flush retries them
+                with self._lock:
+                    self._counts.update(counts)
+                raise
+
+    def start(self):
+        if self._thread is not None or not self.flush_interval:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='view-count-flusher', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush buffered view counts at exit')
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered view counts')
+            finally:
+                close_old_connections()
+
+
+class CacheViewCounter(MemoryViewCounter):
+    """
+    Buffer kept in a Django cache so it is shared by every process using it.
+
+    Each blog has an atomic counter key.  The first view after a flush also
+    appends the blog id to a dirty log, so a flush only visits blogs that
+    were actually viewed.
+    """
+
+    PREFIX = 'viewcount'
+    TIMEOUT = None
+
+    def __init__(self, flush_interval, cache_alias):
+        super().__init__(flush_interval)
+        self.cache = caches[cache_alias]
+        if not is_shared(self.cache):
+            raise ImproperlyConfigured(
+                f"VIEW_COUNT_BUFFER uses the 'cache' backend on the {cache_alias!r} cache, which is local "
+                "to each process: other workers and flush_view_counts cannot see its counts, and it may "
+                "cull them. Use a shared cache (e.g. DJANGO_SHARED_CACHE=1) or the 'memory' backend."
+            )
+
+    def _key(self, *parts):
+        return ':'.join([self.PREFIX] + [str(part) for part in parts])
+
+    def _incr(self, key, delta=1):
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            if self.cache.add(key, delta, self.TIMEOUT):
+                return delta
+            return self.cache.incr(key, delta)
+
+    def record(self, blog_id):
+        self._incr(self._key('count', blog_id))
+        if self.cache.add(self._key('dirty', blog_id), 1, self.TIMEOUT):
+            position = self._incr(self._key('log'))
+            self.cache.set(self._key('log', position), blog_id, self.TIMEOUT)
+        self.start()
+
+    def pending(self, blog_id):
+        return self.cache.get(self._key('count', blog_id)) or 0
+
+    def flush(self):
+        lock_key = self._key('flush-lock')
+        if not self.cache.add(lock_key, 1, 60):
+            return 0
+        try:
+            head = self.cache.get(self._key('log')) or 0
+            tail = self.cache.get(self._key('log', 'flushed')) or 0
+            if head <= tail:
+                return 0
+            log_keys = [self._key('log', position) for position in range(tail + 1, head + 1)]
+            blog_ids = set(self.cache.get_many(log_keys).values())
+            self.cache.delete_many([self._key('dirty', blog_id) for blog_id in blog_ids])
+            count_keys = {self._key('count', blog_id): blog_id for blog_id in blog_ids}
+            counts = {
+                count_keys[key]: value
+                for key, value in self.cache.get_many(list(count_keys)).items()
+                if value
+            }
+            flushed = write_counts(counts)
+            for blog_id, value in counts.items():
+                if value:
+                    self._incr(self._key('count', blog_id), -value)
+            self.cache.set(self._key('log', 'flushed'), head, self.TIMEOUT)
+            self.cache.delete_many(log_keys)
+            return flushed
+        finally:
+            self.cache.delete(lock_key)
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_view_counter():
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                config = get_config()
+                backend = get_backend(config)
+                if backend == 'memory':
+                    _counter = MemoryViewCounter(config['FLUSH_INTERVAL'])
+                elif backend == 'cache':
+                    _counter = CacheViewCounter(config['FLUSH_INTERVAL'], config['CACHE_ALIAS'])
+                else:
+                    _counter = DirectViewCounter()
+    return _counter
+
+
+def reset_view_counter():
+    """Flush and discard the process-wide counter (used when settings change)"""
+    global _counter
+    with _counter_lock:
+        if _counter is not None:
+            _counter.flush()
+            if isinstance(_counter, MemoryViewCounter):
+                _counter._stop.set()
+        _counter = None
+
+
+def _viewer_key(request):
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        return session_key
+    if getattr(request, 'user', None) is not None and request.user.is_authenticated:
+        return f'user-{request.user.pk}'
+    fingerprint = '{}|{}'.format(
+        request.META.get('REMOTE_ADDR', ''), request.META.get('HTTP_USER_AGENT', '')
+    )
+    return hashlib.sha1(fingerprint.encode()).hexdigest()
+
+
+def record_view(request, blog_id):
+    """Count one view of a blog; returns False if it was a de-duplicated repeat"""
+    config = get_config()
+    window = config['DEDUP_WINDOW']
+    if window:
+        seen_key = f'viewcount:seen:{_viewer_key(request)}:{blog_id}'
+        if not caches[config['CACHE_ALIAS']].add(seen_key, 1, window):
+            return False
+    get_view_counter().record(blog_id)
+    return True
+
+
+async def arecord_view(request, blog_id):
+    """``record_view()`` for async views; only the unbuffered backend touches the database"""
+    if get_backend() in ('memory', 'cache'):
+        return record_view(request, blog_id)
+    return await sync_to_async(record_view)(request, blog_id)
@@ -1,22 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q, Avg
+from django.db import transaction
 from django.http import JsonResponse
-from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from outbox.queue import queue_mail
+from . import leaderboards, search, viewerstate
 from .models import Blog, Category, Favorite, Rating
+from .pagecache import add_cache_tags, cache_anonymous_page, set_cache_meta
+from .pagination import paginate
 from .forms import BlogForm, CategoryForm, RatingForm, SearchForm
+from .viewcounts import get_view_counter, record_view
 
 User = get_user_model()
 
-def home_view(request):
-    blogs = Blog.objects.filter(status='published').select_related('author', 'category')
-    
-    # Search functionality
-    search_form = SearchForm(request.GET)
+def search_home_blogs(blogs, search_form):
+    """Apply the home page search form to ``blogs``; returns (blogs, query)"""
+    query = None
     if search_form.is_valid():
         query = search_form.cleaned_data.get('query')
         category = search_form.cleaned_data.get('category')
@@ -25,11 +26,7 @@ def home_view(request):
         date_to = search_form.cleaned_data.get('date_to')
         
         if query:
-            blogs = blogs.filter(
-                Q(title__icontains=query) | 
-                Q(body__icontains=query) | 
-                Q(excerpt__icontains=query)
-            )
+            blogs = search.search_blogs(blogs, query)
         if category:
             blogs = blogs.filter(category=category)
         if author:
@@ -38,50 +35,67 @@ def home_view(request):
             blogs = blogs.filter(published_at__gte=date_from)
         if date_to:
             blogs = blogs.filter(published_at__lte=date_to)
-    
-    # Sorting
-    sort_by = request.GET.get('sort', 'latest')
-    if sort_by == 'rating':
-        blogs = blogs.annotate(avg_rating=Avg('ratings__score')).order_by('-avg_rating', '-published_at')
+    return blogs, query
+
+def sort_home_blogs(request, blogs, query):
+    """Sorting (searches default to relevance); returns (blogs, ordering, sort_by)"""
+    sort_by = request.GET.get('sort', 'relevance' if query else 'latest')
+    if sort_by == 'relevance' and query:
+        blogs = search.order_by_relevance(blogs)
+        ordering = None
+    elif sort_by == 'rating':
+        ordering = ('-rating_average', '-published_at')
     elif sort_by == 'popular':
-        blogs = blogs.order_by('-views_count', '-published_at')
+        ordering = ('-views_count', '-published_at')
     else:  # latest
-        blogs = blogs.order_by('-published_at')
+        ordering = ('-published_at',)
+    return blogs, ordering, sort_by
+
+@cache_anonymous_page
+def home_view(request):
+    add_cache_tags(request, 'blogs', 'ratings', 'categories')
+    blogs = Blog.objects.filter(status='published').select_related('author', 'category')
     
-    # Pagination
-    paginator = Paginator(blogs, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Search functionality
+    search_form = SearchForm(request.GET)
+    blogs, query = search_home_blogs(blogs, search_form)
+    blogs, ordering, sort_by = sort_home_blogs(request, blogs, query)
     
-    # Featured blogs (top 3 by rating)
-    featured_blogs = Blog.objects.filter(status='published').annotate(
-        avg_rating=Avg('ratings__score')
-    ).order_by('-avg_rating', '-views_count')[:3]
+    # Keyset pagination on the sort key
+    page_obj = paginate(request, blogs, 6, ordering)
+    viewerstate.annotate(request.user, page_obj)
+    
+    # Featured blogs (top 3 by rating) from the precomputed leaderboard
+    featured_blogs = leaderboards.get_featured('rating', 3)
+    # Tagged after get_featured(), which may have just refreshed the board
+    add_cache_tags(request, 'leaderboard')
     
     context = {
         'page_obj': page_obj,
         'search_form': search_form,
         'featured_blogs': featured_blogs,
         'sort_by': sort_by,
+        'query': query,
     }
     return render(request, 'blog/home.html', context)
 
+def _record_cached_view(request, meta):
+    record_view(request, meta['blog_id'])
+
+@cache_anonymous_page(on_hit=_record_cached_view)
 def blog_detail_view(request, slug):
     blog = get_object_or_404(Blog, slug=slug, status='published')
+    add_cache_tags(request, f'blog:{blog.pk}', f'author:{blog.author_id}', f'category:{blog.category_id}')
+    set_cache_meta(request, blog_id=blog.pk)
     
-    # Increment view count
-    blog.views_count += 1
-    blog.save(update_fields=['views_count'])
+    # Buffered view count; show the stored count plus views not yet flushed
+    record_view(request, blog.pk)
+    blog.views_count += get_view_counter().pending(blog.pk)
     
-    # Check if user has favorited this blog
-    is_favorited = False
-    user_rating = None
-    if request.user.is_authenticated:
-        is_favorited = Favorite.objects.filter(user=request.user, blog=blog).exists()
-        try:
-            user_rating = Rating.objects.get(user=request.user, blog=blog)
-        except Rating.DoesNotExist:
-            pass
+    # Whether the reader favorited and rated this blog, in one query
+    viewerstate.annotate(request.user, [blog])
+    is_favorited = blog.viewer_favorited
+    user_rating = blog.viewer_rating
     
     # Get ratings and reviews
     ratings = blog.ratings.all().select_related('user')
@@ -91,11 +105,18 @@ def blog_detail_view(request, slug):
     # Rating form
     rating_form = RatingForm()
     
-    # Related blogs
-    related_blogs = Blog.objects.filter(
-        category=blog.category, 
-        status='published'
-    ).exclude(id=blog.id)[:3]
+    # Related blogs from the precomputed similarity index, else same category
+    related_blogs = [
+        entry.related for entry in blog.related_entries.filter(
+            related__status='published'
+        ).select_related('related__author')[:3]
+    ]
+    if not related_blogs and blog.category_id:
+        related_blogs = Blog.objects.filter(
+            category=blog.category, 
+            status='published'
+        ).exclude(id=blog.id).select_related('author')[:3]
+    add_cache_tags(request, *(f'blog:{related.pk}' for related in related_blogs))
     
     context = {
         'blog': blog,
@@ -168,13 +189,12 @@ def toggle_favorite_view(request, slug):
     favorite, created = Favorite.objects.get_or_create(user=request.user, blog=blog)
     
     if created:
-        # Send email notification
-        send_mail(
+        # Queue email notification
+        queue_mail(
             'Blog Added to Favorites',
             f'You have added "{blog.title}" to your favorites.',
             settings.DEFAULT_FROM_EMAIL,
             [request.user.email],
-            fail_silently=True,
         )
         message = 'Blog added to favorites!'
         is_favorited = True
@@ -196,18 +216,21 @@ def submit_rating_view(request, slug):
     if request.method == 'POST':
         form = RatingForm(request.POST)
         if form.is_valid():
-            rating, created = Rating.objects.get_or_create(
-                user=request.user,
-                blog=blog,
-                defaults={
-                    'score': form.cleaned_data['score'],
-                    'review': form.cleaned_data['review']
-                }
-            )
+            # The rating row and the blog's stored aggregates change together
+            with transaction.atomic():
+                rating, created = Rating.objects.select_for_update().get_or_create(
+                    user=request.user,
+                    blog=blog,
+                    defaults={
+                        'score': form.cleaned_data['score'],
+                        'review': form.cleaned_data['review']
+                    }
+                )
+                if not created:
+                    rating.score = form.cleaned_data['score']
+                    rating.review = form.cleaned_data['review']
+                    rating.save()
             if not created:
-                rating.score = form.cleaned_data['score']
-                rating.review = form.cleaned_data['review']
-                rating.save()
                 messages.success(request, 'Rating updated successfully!')
             else:
                 messages.success(request, 'Rating submitted successfully!')
@@ -218,44 +241,40 @@ def submit_rating_view(request, slug):
 
 @login_required
 def my_blogs_view(request):
-    blogs = Blog.objects.filter(author=request.user).order_by('-created_at')
-    
-    paginator = Paginator(blogs, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    blogs = Blog.objects.filter(author=request.user)
+    page_obj = paginate(request, blogs, 10, ('-created_at',))
     
     return render(request, 'blog/my_blogs.html', {'page_obj': page_obj})
 
 @login_required
 def my_favorites_view(request):
     favorites = Favorite.objects.filter(user=request.user).select_related('blog')
-    
-    paginator = Paginator(favorites, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, favorites, 10, ('-created_at',))
     
     return render(request, 'blog/my_favorites.html', {'page_obj': page_obj})
 
+@cache_anonymous_page
 def category_detail_view(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    blogs = Blog.objects.filter(category=category, status='published').order_by('-published_at')
-    
-    paginator = Paginator(blogs, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    add_cache_tags(request, f'category:{category.pk}', f'category-blogs:{category.pk}')
+    blogs = Blog.objects.filter(category=category, status='published').select_related('author')
+    page_obj = paginate(request, blogs, 6, ('-published_at',))
+    viewerstate.annotate(request.user, page_obj)
+    add_cache_tags(request, *(f'blog:{blog.pk}' for blog in page_obj))
     
     return render(request, 'blog/category_detail.html', {
         'category': category,
         'page_obj': page_obj
     })
 
+@cache_anonymous_page
 def author_blogs_view(request, username):
     author = get_object_or_404(User, username=username)
-    blogs = Blog.objects.filter(author=author, status='published').order_by('-published_at')
-    
-    paginator = Paginator(blogs, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    add_cache_tags(request, f'author:{author.pk}', f'author-blogs:{author.pk}')
+    blogs = Blog.objects.filter(author=author, status='published').select_related('category')
+    page_obj = paginate(request, blogs, 6, ('-published_at',))
+    viewerstate.annotate(request.user, page_obj)
+    add_cache_tags(request, *(f'blog:{blog.pk}' for blog in page_obj))
     
     return render(request, 'blog/author_blogs.html', {
         'author': author,
@@ -0,0 +1,17 @@
+"""
+Helpers for features whose state must be visible to every worker process.
+
+The default cache is Django's per-process locmem, so anything one worker
+stores there (buffered view counts, page cache tag versions, counters) is
+invisible to the others and to management commands.  ``is_shared()`` tells
+those features whether the cache they were given can be used across
+processes; ``DJANGO_SHARED_CACHE=1`` switches the default alias to one that
+is (see blog_site/settings.py).
+"""
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(cache):
+    """Whether other processes see what is stored in ``cache`` (not locmem or dummy)"""
+    return not isinstance(cache, (LocMemCache, DummyCache))
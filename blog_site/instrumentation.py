@@ -0,0 +1,318 @@
+"""
+Per-request SQL and template instrumentation with query budgets.
+
+``RequestProfilingMiddleware`` records, for every request, the number of
+SQL queries and the time spent in them, repeated statements (the same SQL
+with literals and ``IN`` lists normalised away, the signature of an N+1
+loop), the queries issued while a template was rendering, template render
+time and wall time.  Queries made while rendering come from lazy relations
+or model methods called in templates (the auth context processor's user
+lookup among them).  Each request is checked against the query budget of
+its URL name and the results are aggregated per view in the process;
+``request_profile_view`` returns the aggregate as JSON to staff users.
+Template time comes from ``ProfilingDjangoTemplates``, a drop-in for the
+Django template backend.  The middleware runs natively under both WSGI and
+ASGI: queries are counted by a wrapper installed on every connection that
+reports to the current request's profile through a context variable, so
+the ORM calls async views make from worker threads are counted too.
+
+Configured with the ``REQUEST_PROFILING`` setting:
+
+    REQUEST_PROFILING = {
+        'ENABLED': DEBUG,
+        'BUDGETS': {'blog:home': 8},  # max queries per URL name
+        'DEFAULT_BUDGET': None,       # for views without a budget; None: unlimited
+        'MAX_REPEATS': 5,             # one normalised statement run more often is an N+1
+        'ACTION': 'log',              # 'log' or 'raise' (QueryBudgetExceeded) on a violation
+        'SERVER_TIMING': True,        # add a Server-Timing response header
+        'HISTORY': 200,               # recent wall times kept per view for percentiles
+    }
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BUDGETS': {},
+    'DEFAULT_BUDGET': None,
+    'MAX_REPEATS': 5,
+    'ACTION': 'log',
+    'SERVER_TIMING': True,
+    'HISTORY': 200,
+}
+
+_profile = contextvars.ContextVar('request_profile', default=None)
+
+_IN_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'REQUEST_PROFILING', {}))
+    return config
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def normalise_sql(sql):
+    """``sql`` with literals and placeholder lists collapsed, so repeats compare equal"""
+    sql = _NUMBER.sub('?', _STRING.sub('?', sql))
+    return _IN_LIST.sub('(?, ...)', sql)
+
+
+class RequestProfile:
+    """Measurements of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_queries = 0
+        self.statements = Counter()
+        self.rendering = 0
+        self.wall_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[normalise_sql(sql)] += 1
+            if self.rendering:
+                self.template_queries += 1
+
+    def repeated(self, threshold):
+        """Normalised statements run more than ``threshold`` times"""
+        return {sql: count for sql, count in self.statements.most_common() if count > threshold}
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'template_queries': self.template_queries,
+            'wall_ms': round(self.wall_time * 1000, 3),
+        }
+
+
+class ViewStats:
+    """Running aggregate of the profiles of one view"""
+
+    def __init__(self, history):
+        self.requests = 0
+        self.totals = Counter()
+        self.maxima = Counter()
+        self.violations = 0
+        self.wall_times = deque(maxlen=history)
+        self.worst_repeats = {}
+
+    def add(self, profile, violation, repeated):
+        self.requests += 1
+        for key, value in profile.as_dict().items():
+            self.totals[key] += value
+            self.maxima[key] = max(self.maxima[key], value)
+        self.wall_times.append(profile.wall_time * 1000)
+        if violation:
+            self.violations += 1
+        if repeated and sum(repeated.values()) > sum(self.worst_repeats.values()):
+            self.worst_repeats = repeated
+
+    def as_dict(self):
+        ordered = sorted(self.wall_times)
+
+        def percentile(fraction):
+            return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)], 3) if ordered else None
+
+        return {
+            'requests': self.requests,
+            'mean': {key: round(value / self.requests, 3) for key, value in self.totals.items()},
+            'max': dict(self.maxima),
+            'wall_ms_p50': percentile(0.50),
+            'wall_ms_p95': percentile(0.95),
+            'wall_ms_p99': percentile(0.99),
+            'budget_violations': self.violations,
+            'worst_repeats': self.worst_repeats,
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record(view_name, profile, violation, repeated):
+    with _stats_lock:
+        stats = _stats.get(view_name)
+        if stats is None:
+            stats = _stats[view_name] = ViewStats(get_config()['HISTORY'])
+        stats.add(profile, violation, repeated)
+
+
+def get_stats():
+    with _stats_lock:
+        return {view_name: stats.as_dict() for view_name, stats in sorted(_stats.items())}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def budget_for(view_name, config=None):
+    config = config or get_config()
+    return config['BUDGETS'].get(view_name, config['DEFAULT_BUDGET'])
+
+
+def check_budget(view_name, profile, config=None):
+    """Problems with ``profile`` against the budgets: (message or None, repeated statements)"""
+    config = config or get_config()
+    problems = []
+    budget = budget_for(view_name, config)
+    if budget is not None and profile.queries > budget:
+        problems.append(f'{profile.queries} queries (budget {budget})')
+    repeated = profile.repeated(config['MAX_REPEATS'])
+    if repeated:
+        problems.append(f'{len(repeated)} statement(s) repeated more than {config["MAX_REPEATS"]} times')
+    message = f'{view_name}: ' + '; '.join(problems) if problems else None
+    return message, repeated
+
+
+def profile_query(execute, sql, params, many, context):
+    """Connection execute wrapper feeding the profile of the request being served, if any"""
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install_query_profiler(connection, **kwargs):
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if self.config['ENABLED']:
+            # Connections opened later (by any thread) get the wrapper when
+            # they connect; the ones already open here get it now
+            connection_created.connect(install_query_profiler, dispatch_uid='request-profiling')
+            for connection in connections.all(initialized_only=True):
+                install_query_profiler(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.config['ENABLED']:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.config['ENABLED']:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        profile.finish()
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path_info
+        message, repeated = check_budget(view_name, profile, self.config)
+        over_budget = message is not None
+        record(view_name, profile, over_budget, repeated)
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = (
+                f'db;desc="{profile.queries} queries";dur={profile.db_time * 1000:.1f}, '
+                f'tpl;dur={profile.template_time * 1000:.1f}, total;dur={profile.wall_time * 1000:.1f}'
+            )
+        if over_budget:
+            if self.config['ACTION'] == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning('%s; repeated: %s', message, list(repeated.items())[:3])
+        return response
+
+
+class ProfiledTemplate:
+    """A backend template that adds its render time to the current request's profile"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _profile.get()
+        if profile is None:
+            return self.template.render(context, request)
+        profile.rendering += 1
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.rendering -= 1
+            if not profile.rendering:
+                profile.template_time += time.perf_counter() - started
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timed for ``RequestProfilingMiddleware``"""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name))
+
+
+def request_profile_view(request):
+    """Per-view aggregates of this process as JSON; ``?reset=1`` clears them afterwards"""
+    if not request.user.is_staff:
+        raise PermissionDenied
+    stats = get_stats()
+    if request.GET.get('reset'):
+        reset_stats()
+    return JsonResponse({'enabled': get_config()['ENABLED'], 'views': stats})
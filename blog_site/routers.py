@@ -0,0 +1,245 @@
+"""
+Primary/replica database routing with read-your-writes pinning.
+
+``PrimaryReplicaRouter`` spreads the reads of the blog, accounts and
+profiles models over the replica aliases and sends everything else
+(writes, reads inside a transaction, sessions, the mail outbox) to the
+primary.  A request that writes to one of the replicated apps (rating,
+favoriting, following, editing) is pinned to the primary for the rest of
+the request, and the ``ReplicaPinningMiddleware`` sets a short-lived
+cookie that keeps the browser's next requests on the primary too, so
+users see their own changes while the replicas catch up.  Writes to the
+other apps do not pin: a session save on a signed-in reader's page view,
+or a queued email, changes nothing the replicas serve.  View counts are
+written by the buffer's background flush, outside any request, so reading
+a post does not pin its reader.
+
+Outside a request (management commands, the after-commit background jobs
+that fan out feeds or render images) every read goes to the primary, as
+those jobs usually read what was just written.
+
+Configured with the ``DATABASE_ROUTING`` setting:
+
+    DATABASE_ROUTING = {
+        'PRIMARY': 'default',
+        'REPLICAS': ['replica'],  # DATABASES aliases; empty routes everything to PRIMARY
+        'REPLICATED_APPS': ['blog', 'accounts', 'profiles'],
+        'PIN_SECONDS': 5,         # how long a write keeps the user on the primary
+        'PIN_COOKIE': 'pin_primary',
+        'STATS': True,            # count queries per alias for database_routing_report
+        'CACHE_ALIAS': 'default',
+    }
+
+The counters are only visible to ``database_routing_report`` when the
+cache is shared between processes (``DJANGO_SHARED_CACHE=1``).
+
+Locally a SQLite copy of the primary, refreshed by ``manage.py
+sync_replica``, stands in for a replica (``DJANGO_LOCAL_REPLICA=1``).
+"""
+import contextvars
+import random
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+PREFIX = 'dbroute'
+STATS_KEY = f'{PREFIX}:stats'
+
+DEFAULTS = {
+    'PRIMARY': 'default',
+    'REPLICAS': [],
+    'REPLICATED_APPS': ['blog', 'accounts', 'profiles'],
+    'PIN_SECONDS': 5,
+    'PIN_COOKIE': 'pin_primary',
+    'STATS': True,
+    'CACHE_ALIAS': 'default',
+}
+
+# Set by the middleware while the current request may read from the replicas
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+# Set once the current request has written
+_wrote = contextvars.ContextVar('wrote_to_primary', default=False)
+# Per-alias read/write query counts of the current request, when STATS is on
+_query_counts = contextvars.ContextVar('routed_query_counts', default=None)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'DATABASE_ROUTING', {}))
+    return config
+
+
+def pin_to_primary():
+    """Send the rest of the current request's reads to the primary"""
+    _replica_reads.set(False)
+
+
+def is_pinned():
+    return not _replica_reads.get()
+
+
+class PrimaryReplicaRouter:
+    def __init__(self):
+        config = get_config()
+        self.primary = config['PRIMARY']
+        self.replicas = list(config['REPLICAS'])
+        self.replicated_apps = set(config['REPLICATED_APPS'])
+        self.aliases = {self.primary, *self.replicas}
+
+    def db_for_read(self, model, **hints):
+        if (
+            not self.replicas
+            or model._meta.app_label not in self.replicated_apps
+            or not _replica_reads.get()
+            or connections[self.primary].in_atomic_block
+        ):
+            return self.primary
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        # Only writes to the replicated apps can make a replica read stale.
+        # Session saves (django_session, on nearly every signed-in request),
+        # the outbox and the like would otherwise pin every such user
+        if model._meta.app_label in self.replicated_apps:
+            _wrote.set(True)
+            _replica_reads.set(False)
+        return self.primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db in self.aliases and obj2._state.db in self.aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and are never migrated themselves
+        if db in self.replicas:
+            return False
+        return None
+
+
+def count_query(execute, sql, params, many, context):
+    """Connection execute wrapper counting reads and writes per alias for the current request"""
+    counts = _query_counts.get()
+    if counts is not None:
+        kind = 'read' if sql.lstrip()[:6].upper() in ('SELECT', 'PRAGMA') else 'write'
+        counts[f'{context["connection"].alias}:{kind}'] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def get_cache():
+    return caches[get_config()['CACHE_ALIAS']]
+
+
+def _incr(cache, key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def record_stats(counts):
+    cache = get_cache()
+    known = cache.get(STATS_KEY) or []
+    if set(counts) - set(known):
+        cache.set(STATS_KEY, sorted(set(known) | set(counts)), None)
+    for name, delta in counts.items():
+        _incr(cache, f'{STATS_KEY}:{name}', delta)
+
+
+def get_stats():
+    cache = get_cache()
+    names = cache.get(STATS_KEY) or []
+    values = cache.get_many([f'{STATS_KEY}:{name}' for name in names])
+    return {name: values.get(f'{STATS_KEY}:{name}', 0) for name in names}
+
+
+def reset_stats():
+    cache = get_cache()
+    names = cache.get(STATS_KEY) or []
+    cache.delete_many([STATS_KEY] + [f'{STATS_KEY}:{name}' for name in names])
+
+
+class ReplicaPinningMiddleware:
+    """Pin a user's reads to the primary for ``PIN_SECONDS`` after they write"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        config = get_config()
+        self.cookie = config['PIN_COOKIE']
+        self.pin_seconds = config['PIN_SECONDS']
+        self.stats = config['STATS']
+        self.enabled = bool(config['REPLICAS'])
+        if self.enabled and self.stats:
+            # Counted through a context variable rather than per-request
+            # wrappers, so the ORM calls async views make from worker
+            # threads are counted too
+            connection_created.connect(install_query_counter, dispatch_uid='replica-query-counter')
+            for connection in connections.all(initialized_only=True):
+                install_query_counter(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        pinned, counts, tokens = self.begin(request)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            self.end(tokens)
+        return self.finish(response, pinned, wrote, counts)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        pinned, counts, tokens = self.begin(request)
+        try:
+            response = await self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            self.end(tokens)
+        return self.finish(response, pinned, wrote, counts)
+
+    def begin(self, request):
+        pinned = request.COOKIES.get(self.cookie) == '1'
+        counts = Counter() if self.stats else None
+        tokens = (_replica_reads.set(not pinned), _wrote.set(False), _query_counts.set(counts))
+        return pinned, counts, tokens
+
+    @staticmethod
+    def end(tokens):
+        replica_token, wrote_token, counts_token = tokens
+        _replica_reads.reset(replica_token)
+        _wrote.reset(wrote_token)
+        _query_counts.reset(counts_token)
+
+    def finish(self, response, pinned, wrote, counts):
+        if wrote:
+            response.set_cookie(
+                self.cookie, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax',
+            )
+        if self.stats:
+            counts['requests'] += 1
+            if pinned:
+                counts['pinned'] += 1
+            record_stats(counts)
+        return response
@@ -12,6 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+import tempfile
+
+from blog_site import sqlite
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,10 +47,14 @@ INSTALLED_APPS = [
     'accounts',
     'blog',
     'profiles',
+    'outbox',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'blog_site.staticfiles.StaticFilesMiddleware',
+    'blog_site.routers.ReplicaPinningMiddleware',
+    'blog_site.instrumentation.RequestProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,7 +67,8 @@ ROOT_URLCONF = 'blog_site.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timed for the request profiling middleware
+        'BACKEND': 'blog_site.instrumentation.ProfilingDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,13 +87,53 @@ WSGI_APPLICATION = 'blog_site.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# 'development' keeps Django's SQLite defaults; 'production' turns on WAL, tuned
+# pragmas and persistent connections (see blog_site/sqlite.py)
+DATABASE_PROFILE = os.environ.get('DJANGO_DATABASE_PROFILE', 'development')
+
 DATABASES = {
+    'default': sqlite.database(BASE_DIR / 'db.sqlite3', DATABASE_PROFILE),
+}
+
+# Reads of the blog, accounts and profiles models go to the replicas, pinned to the
+# primary for a few seconds after a user writes (see blog_site/routers.py)
+DATABASE_ROUTERS = ['blog_site.routers.PrimaryReplicaRouter']
+DATABASE_ROUTING = {
+    'PRIMARY': 'default',
+    'REPLICAS': [],
+    'PIN_SECONDS': 5,
+}
+
+# A local SQLite copy refreshed by `manage.py sync_replica` stands in for a replica
+if os.environ.get('DJANGO_LOCAL_REPLICA') == '1':
+    DATABASES['replica'] = sqlite.replica(BASE_DIR / 'db.replica.sqlite3', DATABASE_PROFILE)
+    DATABASE_ROUTING['REPLICAS'] = ['replica']
+
+
+# Cache
+# Per-process locmem by default; DJANGO_SHARED_CACHE=1 shares one memory-mapped
+# file between every worker on the host (see blog_site/shmcache.py)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
 }
 
+if os.environ.get('DJANGO_SHARED_CACHE') == '1':
+    CACHES['default'] = {
+        'BACKEND': 'blog_site.shmcache.SharedMemoryCache',
+        'LOCATION': os.environ.get(
+            'DJANGO_SHARED_CACHE_PATH',
+            '/dev/shm/blog-site-cache' if os.path.isdir('/dev/shm') else str(BASE_DIR / 'var' / 'shared-cache'),
+        ),
+        'OPTIONS': {
+            'SLOTS': 16384,
+            'SLOT_SIZE': 16384,
+            'COMPRESS_MIN_LENGTH': 1024,
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,6 +185,141 @@ MEDIA_ROOT = BASE_DIR / 'media'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'blog_site.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Hashed, precompressed static files served by the middleware (see blog_site/staticfiles.py)
+STATIC_ASSETS = {
+    'SERVE': not DEBUG,
+    'MAX_AGE': 60,
+    'IMMUTABLE_MAX_AGE': 365 * 24 * 60 * 60,
+}
+
+# Scheduled PRAGMA optimize and WAL checkpoints (see blog_site/sqlite.py)
+SQLITE_MAINTENANCE = {
+    'OPTIMIZE_INTERVAL': 3600,
+    'ANALYSIS_LIMIT': 400,
+    'CHECKPOINT': 'TRUNCATE',
+}
+
+# Per-request query counts, N+1 detection and timings, checked against
+# per-view query budgets (see blog_site/instrumentation.py)
+REQUEST_PROFILING = {
+    'ENABLED': DEBUG,
+    'BUDGETS': {
+        'blog:home': 8,
+        'blog:blog_detail': 12,
+        'blog:category_detail': 6,
+        'blog:author_blogs': 6,
+        'blog:my_blogs': 5,
+        'blog:my_favorites': 5,
+        'profiles:authors_list': 5,
+        'profiles:author_detail': 6,
+        'profiles:timeline': 7,
+        'profiles:followers': 6,
+        'profiles:following': 6,
+    },
+    'MAX_REPEATS': 5,
+    'ACTION': 'log',
+}
+
+# Buffered blog view counting (see blog/viewcounts.py).  'auto' buffers in
+# the cache when it is shared (DJANGO_SHARED_CACHE=1) and otherwise in each
+# worker's memory, where a worker killed before its next flush loses up to
+# FLUSH_INTERVAL seconds of views; that loss is accepted for the default
+# single-host setup.
+VIEW_COUNT_BUFFER = {
+    'BACKEND': 'auto',
+    'FLUSH_INTERVAL': 10,
+    'DEDUP_WINDOW': 30 * 60,
+    'CACHE_ALIAS': 'default',
+}
+
+# Precomputed featured/top-N leaderboards (see blog/leaderboards.py)
+LEADERBOARDS = {
+    'BACKEND': 'thread',
+    'SIZE': 10,
+    'MAX_AGE': 300,
+    'TRENDING_WINDOW_DAYS': 14,
+}
+
+# Content-similarity related posts (see blog/related.py)
+RELATED_POSTS = {
+    'BACKEND': 'thread',
+    'INDEX_DIR': BASE_DIR / 'var' / 'related',
+    'TOP_K': 6,
+    'DIMENSIONS': 256,
+}
+
+# Following timeline fan-out (see profiles/feed.py)
+FEED = {
+    'BACKEND': 'thread',
+    'PULL_THRESHOLD': 10000,
+    'MAX_ENTRIES': 1000,
+    'MAX_AGE_DAYS': 90,
+}
+
+# RSS/Atom feeds and the sharded sitemap (see blog/feeds.py and blog/sitemaps.py)
+SYNDICATION = {
+    'ITEMS': 20,
+    'TIMEOUT': 3600,
+    'MAX_AGE': 300,
+    'SITEMAP_SHARD_SIZE': 50000,
+}
+
+# Read-only JSON API under /api/v1/ (see blog/api.py)
+API = {
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 1000,
+    'MAX_AGE': 0,
+}
+
+# Anonymous full-page cache (see blog/pagecache.py).  ENABLED None serves
+# pages from the cache only when it is shared between processes
+# (DJANGO_SHARED_CACHE=1): on per-process locmem a save would only expire the
+# pages cached by the worker that handled it.
+PAGE_CACHE = {
+    'ENABLED': None,
+    'TIMEOUT': 300,
+    'CACHE_ALIAS': 'default',
+}
+
+# Route the read-heavy views to their native async versions; turned on by
+# blog_site/asgi.py so WSGI workers keep the synchronous ones
+ASYNC_READ_VIEWS = os.environ.get('DJANGO_ASYNC_READ_VIEWS', '') == '1'
+
+# Resized/WebP image derivatives (see blog/images.py)
+IMAGE_DERIVATIVES = {
+    'BACKEND': 'thread',
+    'WORKERS': 2,
+    'QUALITY': 82,
+    'WEBP_QUALITY': 80,
+}
+
+# `manage.py test` runs the background jobs inline and buffers views without
+# the flusher thread: the test database cannot be written from another thread
+# in the middle of a test ("database table is locked"). The related-posts
+# index goes to a scratch directory so tests never touch the real one, static
+# URLs skip the manifest, which only `collectstatic` writes, and passwords
+# use a fast hasher.
+TESTING = sys.argv[1:2] == ['test']
+if TESTING:
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    STORAGES['staticfiles'] = {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}
+    FEED['BACKEND'] = 'sync'
+    IMAGE_DERIVATIVES['BACKEND'] = 'sync'
+    RELATED_POSTS['BACKEND'] = 'sync'
+    RELATED_POSTS['INDEX_DIR'] = Path(tempfile.gettempdir()) / f'blog-site-test-related-{os.getpid()}'
+    LEADERBOARDS['BACKEND'] = 'sync'
+    VIEW_COUNT_BUFFER['FLUSH_INTERVAL'] = 0
 
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap4"
@@ -161,3 +345,11 @@ AUTH_USER_MODEL = 'accounts.User'
 # Default from email
 DEFAULT_FROM_EMAIL = 'noreply@blogsite.com'
 
+# Email outbox: views queue mail, `manage.py send_queued_mail --loop` delivers it
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 10,
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 3600,
+}
+
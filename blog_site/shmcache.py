@@ -0,0 +1,325 @@
+"""
+A Django cache backend in a memory-mapped file shared by every worker
+process on the host, so prefork workers share one warm cache instead of
+keeping a cold locmem copy each.
+
+The file holds a fixed number of fixed-size slots grouped into buckets of
+``WAYS``.  A key hashes to one bucket and lives in one of its slots, next
+to its expiry time; a value whose pickle (zlib-compressed when large)
+does not fit in a slot is not cached.  A full bucket evicts by CLOCK: a
+hit sets the slot's reference bit, and the bucket's hand clears bits until
+it finds a slot without one.  Expired entries are dropped when found or
+when their slot is reused.
+
+Every operation holds a lock on its bucket: an ``fcntl`` record lock on
+one byte of the file per bucket (shared for reads, exclusive for writes)
+between processes, and a per-process mutex between threads, since record
+locks belong to the process.  ``incr()`` runs entirely under the exclusive
+lock, so concurrent increments from any number of processes are never
+lost.  Configured through ``CACHES``:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'blog_site.shmcache.SharedMemoryCache',
+            'LOCATION': '/dev/shm/blog-site-cache',  # the shared file, best on tmpfs
+            'OPTIONS': {
+                'SLOTS': 16384,       # rounded down to a multiple of WAYS
+                'SLOT_SIZE': 16384,   # bytes per entry, header and key included
+                'COMPRESS_MIN_LENGTH': 1024,
+            },
+        },
+    }
+
+Every process must use the same ``OPTIONS`` for a file; a process opening
+it with different ones rebuilds it empty, which breaks processes still
+mapping the old layout.  ``MAX_ENTRIES`` and ``CULL_FREQUENCY`` do not
+apply: the slot count bounds the entries and eviction is per bucket.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAGIC = b'BLOGSHM1'
+WAYS = 8
+# magic, slots, slot size, ways
+HEADER = struct.Struct('<8sIII')
+# flags, reference bit, key length, value length, key hash, expiry (0: never)
+SLOT = struct.Struct('<BBHIQd')
+USED = 1
+COMPRESSED = 2
+
+DEFAULTS = {
+    'SLOTS': 16384,
+    'SLOT_SIZE': 16384,
+    'COMPRESS_MIN_LENGTH': 1024,
+}
+
+_regions = {}
+_regions_lock = threading.Lock()
+
+
+def _key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+class Region:
+    """The mapped file: header, one CLOCK hand per bucket, then the slots"""
+
+    def __init__(self, path, slots, slot_size):
+        if slot_size <= SLOT.size + 16:
+            raise ValueError(f'SLOT_SIZE must be more than {SLOT.size + 16} bytes')
+        self.path = path
+        self.buckets = max(slots // WAYS, 1)
+        self.slot_size = slot_size
+        self.hands_offset = HEADER.size
+        self.data_offset = -(-(HEADER.size + self.buckets) // mmap.PAGESIZE) * mmap.PAGESIZE
+        self.size = self.data_offset + self.buckets * WAYS * slot_size
+        # Guards the process's record locks, which its threads would otherwise share
+        self.mutex = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._initialise()
+        self.map = mmap.mmap(self.fd, self.size)
+
+    def _initialise(self):
+        header = HEADER.pack(MAGIC, self.buckets * WAYS, self.slot_size, WAYS)
+        # The byte after the bucket locks serialises initialisation
+        with self.mutex:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.buckets)
+            try:
+                if os.pread(self.fd, HEADER.size, 0) != header or os.fstat(self.fd).st_size != self.size:
+                    # A new file, or one laid out for other options: start empty
+                    os.ftruncate(self.fd, 0)
+                    os.ftruncate(self.fd, self.size)
+                    os.pwrite(self.fd, header, 0)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.buckets)
+
+    @contextmanager
+    def locked(self, bucket, exclusive):
+        with self.mutex:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, 1, bucket)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, bucket)
+
+    @contextmanager
+    def locked_all(self):
+        with self.mutex:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, self.buckets, 0)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, self.buckets, 0)
+
+    def slot_offset(self, bucket, way):
+        return self.data_offset + (bucket * WAYS + way) * self.slot_size
+
+    def find(self, bucket, key_hash, key, now):
+        """Offset of the live slot holding ``key`` in ``bucket``, or None"""
+        for way in range(WAYS):
+            offset = self.slot_offset(bucket, way)
+            flags, ref, key_length, value_length, slot_hash, expires = SLOT.unpack_from(self.map, offset)
+            if not flags & USED or slot_hash != key_hash:
+                continue
+            start = offset + SLOT.size
+            if self.map[start:start + key_length] != key:
+                continue
+            if expires and expires <= now:
+                return None
+            return offset
+        return None
+
+    def read(self, offset):
+        """(flags, value bytes) of an occupied slot"""
+        flags, ref, key_length, value_length, _, _ = SLOT.unpack_from(self.map, offset)
+        start = offset + SLOT.size + key_length
+        return flags, self.map[start:start + value_length]
+
+    def reference(self, offset):
+        # A lone byte store; harmless under a shared lock
+        self.map[offset + 1] = 1
+
+    def victim(self, bucket, now):
+        """A free or expired slot of ``bucket``, else the one the CLOCK hand settles on"""
+        for way in range(WAYS):
+            offset = self.slot_offset(bucket, way)
+            flags, _, _, _, _, expires = SLOT.unpack_from(self.map, offset)
+            if not flags & USED or (expires and expires <= now):
+                return offset
+        hand = self.map[self.hands_offset + bucket]
+        while True:
+            offset = self.slot_offset(bucket, hand)
+            hand = (hand + 1) % WAYS
+            if self.map[offset + 1]:
+                self.map[offset + 1] = 0
+            else:
+                self.map[self.hands_offset + bucket] = hand
+                return offset
+
+    def write(self, offset, key_hash, key, flags, value, expires):
+        SLOT.pack_into(self.map, offset, USED | flags, 1, len(key), len(value), key_hash, expires or 0.0)
+        start = offset + SLOT.size
+        self.map[start:start + len(key)] = key
+        self.map[start + len(key):start + len(key) + len(value)] = value
+
+    def set_expiry(self, offset, expires):
+        struct.pack_into('<d', self.map, offset + SLOT.size - 8, expires or 0.0)
+
+    def free(self, offset):
+        self.map[offset] = 0
+
+    def clear(self):
+        for bucket in range(self.buckets):
+            self.map[self.hands_offset + bucket] = 0
+            for way in range(WAYS):
+                self.map[self.slot_offset(bucket, way)] = 0
+
+
+def get_region(path, slots, slot_size):
+    """The process's mapping of ``path``, shared by every cache instance (one per thread)"""
+    with _regions_lock:
+        region = _regions.get(path)
+        if region is None or (region.buckets, region.slot_size) != (max(slots // WAYS, 1), slot_size):
+            region = _regions[path] = Region(path, slots, slot_size)
+        return region
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = dict(DEFAULTS)
+        options.update({name: value for name, value in params.get('OPTIONS', {}).items() if name in DEFAULTS})
+        self._region = get_region(location, options['SLOTS'], options['SLOT_SIZE'])
+        self._compress_min_length = options['COMPRESS_MIN_LENGTH']
+
+    def _locate(self, key, version):
+        key = self.make_and_validate_key(key, version=version).encode()
+        key_hash = _key_hash(key)
+        return key, key_hash, key_hash % self._region.buckets
+
+    def _encode(self, value):
+        """(flags, bytes) of ``value``; compressed when that saves space"""
+        data = pickle.dumps(value, self.pickle_protocol)
+        if len(data) >= self._compress_min_length:
+            compressed = zlib.compress(data, 1)
+            if len(compressed) < len(data):
+                return COMPRESSED, compressed
+        return 0, data
+
+    def _decode(self, flags, data):
+        if flags & COMPRESSED:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def _fits(self, key, data):
+        return SLOT.size + len(key) + len(data) <= self._region.slot_size
+
+    def _store(self, key, key_hash, bucket, flags, data, expires, now):
+        """Write under the bucket's exclusive lock, reusing the key's slot if it has one"""
+        region = self._region
+        offset = region.find(bucket, key_hash, key, now)
+        if offset is None:
+            offset = region.victim(bucket, now)
+        region.write(offset, key_hash, key, flags, data, expires)
+
+    def _delete_locked(self, key, key_hash, bucket, now):
+        offset = self._region.find(bucket, key_hash, key, now)
+        if offset is None:
+            return False
+        self._region.free(offset)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key, key_hash, bucket = self._locate(key, version)
+        region = self._region
+        with region.locked(bucket, exclusive=False):
+            offset = region.find(bucket, key_hash, key, time.time())
+            if offset is None:
+                return default
+            region.reference(offset)
+            flags, data = region.read(offset)
+        return self._decode(flags, data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash, bucket = self._locate(key, version)
+        flags, data = self._encode(value)
+        expires = self.get_backend_timeout(timeout)
+        with self._region.locked(bucket, exclusive=True):
+            now = time.time()
+            if not self._fits(key, data) or (expires is not None and expires <= now):
+                # Too large, or already expired: never leave an older value behind
+                self._delete_locked(key, key_hash, bucket, now)
+                return
+            self._store(key, key_hash, bucket, flags, data, expires, now)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash, bucket = self._locate(key, version)
+        flags, data = self._encode(value)
+        expires = self.get_backend_timeout(timeout)
+        with self._region.locked(bucket, exclusive=True):
+            now = time.time()
+            if self._region.find(bucket, key_hash, key, now) is not None:
+                return False
+            if not self._fits(key, data) or (expires is not None and expires <= now):
+                return False
+            self._store(key, key_hash, bucket, flags, data, expires, now)
+            return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash, bucket = self._locate(key, version)
+        region = self._region
+        with region.locked(bucket, exclusive=True):
+            offset = region.find(bucket, key_hash, key, time.time())
+            if offset is None:
+                return False
+            region.set_expiry(offset, self.get_backend_timeout(timeout))
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key, key_hash, bucket = self._locate(key, version)
+        region = self._region
+        with region.locked(bucket, exclusive=True):
+            now = time.time()
+            offset = region.find(bucket, key_hash, key, now)
+            if offset is None:
+                raise ValueError("Key '%s' not found" % key.decode())
+            _, _, _, _, _, expires = SLOT.unpack_from(region.map, offset)
+            new_value = self._decode(*region.read(offset)) + delta
+            flags, data = self._encode(new_value)
+            if not self._fits(key, data):
+                region.free(offset)
+                raise ValueError("Key '%s' no longer fits in a slot" % key.decode())
+            region.write(offset, key_hash, key, flags, data, expires)
+        return new_value
+
+    def delete(self, key, version=None):
+        key, key_hash, bucket = self._locate(key, version)
+        with self._region.locked(bucket, exclusive=True):
+            return self._delete_locked(key, key_hash, bucket, time.time())
+
+    def has_key(self, key, version=None):
+        key, key_hash, bucket = self._locate(key, version)
+        with self._region.locked(bucket, exclusive=False):
+            return self._region.find(bucket, key_hash, key, time.time()) is not None
+
+    def clear(self):
+        with self._region.locked_all():
+            self._region.clear()
+
+    def close(self, **kwargs):
+        # The mapping is shared by the process's threads and outlives requests;
+        # closing its descriptor would also drop every record lock the process holds
+        pass
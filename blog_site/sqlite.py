@@ -0,0 +1,173 @@
+"""
+SQLite connection profiles and periodic maintenance.
+
+``database(name, profile)`` builds the ``DATABASES`` entry for a profile:
+
+    development   Django's defaults: rollback journal, a new connection per
+                  request.
+    production    WAL journaling so readers never block the writer (and the
+                  writer never blocks readers), ``synchronous=NORMAL``, a
+                  memory-mapped file and a larger page cache, temp tables in
+                  memory, a busy timeout instead of immediate "database is
+                  locked" errors, ``BEGIN IMMEDIATE`` transactions so a
+                  transaction that reads before it writes cannot deadlock on
+                  the lock upgrade, and connections kept across requests.
+
+The pragmas run on every new connection through the backend's
+``init_command`` option.  Long-lived connections and WAL files need upkeep,
+which ``maintain()`` (the ``optimize_database`` command, run on a schedule
+or with ``--loop``) provides: ``PRAGMA optimize`` with a bounded
+``analysis_limit``, an occasional full ``ANALYZE``, and a WAL checkpoint.
+Configured with the ``SQLITE_MAINTENANCE`` setting:
+
+    SQLITE_MAINTENANCE = {
+        'OPTIMIZE_INTERVAL': 3600,  # seconds between runs with --loop
+        'ANALYSIS_LIMIT': 400,      # rows sampled per index by PRAGMA optimize
+        'CHECKPOINT': 'TRUNCATE',   # wal_checkpoint mode, or None
+    }
+
+This module is imported by the settings, so it must not touch
+``django.conf.settings`` at import time.
+"""
+import sqlite3
+import time
+
+PROFILES = {
+    'development': {},
+    'production': {
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -32 * 1024,  # negative: KiB rather than pages
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        },
+        'TRANSACTION_MODE': 'IMMEDIATE',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+DEFAULTS = {
+    'OPTIMIZE_INTERVAL': 3600,
+    'ANALYSIS_LIMIT': 400,
+    'CHECKPOINT': 'TRUNCATE',
+}
+
+
+def get_config():
+    from django.conf import settings
+
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SQLITE_MAINTENANCE', {}))
+    return config
+
+
+def init_command(pragmas):
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items())
+
+
+def database(name, profile='development'):
+    """The ``DATABASES`` entry for the SQLite file ``name`` under ``profile``"""
+    try:
+        options = PROFILES[profile]
+    except KeyError:
+        raise ValueError(
+            f'Unknown database profile {profile!r}; choose one of {", ".join(PROFILES)}'
+        ) from None
+    entry = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+    }
+    backend_options = {}
+    if options.get('PRAGMAS'):
+        backend_options['init_command'] = init_command(options['PRAGMAS'])
+    if options.get('TRANSACTION_MODE'):
+        backend_options['transaction_mode'] = options['TRANSACTION_MODE']
+    if backend_options:
+        entry['OPTIONS'] = backend_options
+    for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS'):
+        if key in options:
+            entry[key] = options[key]
+    return entry
+
+
+def replica(name, profile='development'):
+    """
+    The ``DATABASES`` entry for a local read-only copy of the primary, kept
+    current by the ``sync_replica`` command (see blog_site/routers.py)
+    """
+    entry = database(name, profile)
+    options = entry.setdefault('OPTIONS', {})
+    options['init_command'] = ';'.join(filter(None, [options.get('init_command'), 'PRAGMA query_only=1']))
+    # Tests run against the primary's test database rather than a copy
+    entry['TEST'] = {'MIRROR': 'default'}
+    return entry
+
+
+def sync_replica(alias, source='default'):
+    """
+    Copy the ``source`` database into the SQLite replica ``alias`` with the
+    online backup API: a consistent snapshot, written under the replica's
+    own locks so its readers see either the old copy or the new one.
+    Returns the number of pages copied.
+    """
+    from django.db import connections
+
+    source_name = str(connections[source].settings_dict['NAME'])
+    target_name = str(connections[alias].settings_dict['NAME'])
+    primary = sqlite3.connect(source_name)
+    try:
+        target = sqlite3.connect(target_name, timeout=30)
+        try:
+            primary.backup(target)
+            return target.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        primary.close()
+
+
+def pragmas(using='default'):
+    """The connection's current values of the pragmas the profiles tune"""
+    from django.db import connections
+
+    values = {}
+    with connections[using].cursor() as cursor:
+        for name in PROFILES['production']['PRAGMAS']:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
+
+
+def maintain(using='default', analyze=False, checkpoint=None):
+    """
+    Refresh the query planner statistics and checkpoint the WAL.
+
+    ``PRAGMA optimize`` only re-analyzes tables whose statistics are stale
+    and samples at most ``ANALYSIS_LIMIT`` rows per index; ``analyze=True``
+    runs a full ``ANALYZE`` instead.  Returns the seconds each step took.
+    """
+    from django.db import connections
+
+    config = get_config()
+    if checkpoint is None:
+        checkpoint = config['CHECKPOINT']
+    timings = {}
+    with connections[using].cursor() as cursor:
+        started = time.perf_counter()
+        if analyze:
+            cursor.execute('ANALYZE')
+            timings['analyze'] = time.perf_counter() - started
+        else:
+            cursor.execute(f'PRAGMA analysis_limit={int(config["ANALYSIS_LIMIT"])}')
+            cursor.execute('PRAGMA optimize')
+            timings['optimize'] = time.perf_counter() - started
+        if checkpoint:
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0].lower() == 'wal':
+                started = time.perf_counter()
+                cursor.execute(f'PRAGMA wal_checkpoint({checkpoint})')
+                timings['checkpoint'] = time.perf_counter() - started
+    return timings
@@ -0,0 +1,359 @@
+"""
+Fingerprinted, precompressed static files and the middleware serving them.
+
+``CompressedManifestStaticFilesStorage`` is ``collectstatic``'s storage:
+on top of Django's content-hashed names (``css/style.3f2a9c1b7e4d.css``) it
+writes a Brotli (``.br``) and a Zopfli gzip (``.gz``) sibling of every
+compressible file, once, at deploy time.
+
+``StaticFilesMiddleware`` serves ``STATIC_URL`` straight from
+``STATIC_ROOT`` before the rest of the stack runs.  It indexes the directory
+once, picks the smallest encoding the client accepts (``Accept-Encoding``
+with q-values), answers ``If-None-Match``/``If-Modified-Since`` with 304 and
+single byte ranges with 206, and marks fingerprinted names as immutable for
+a year.  Configured with the ``STATIC_ASSETS`` setting:
+
+    STATIC_ASSETS = {
+        'SERVE': not DEBUG,        # serve STATIC_ROOT from the middleware
+        'MAX_AGE': 60,             # Cache-Control max-age of unhashed names
+        'IMMUTABLE_MAX_AGE': 31536000,
+        'BROTLI_QUALITY': 11,
+        'ZOPFLI_ITERATIONS': 15,
+    }
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - listed in requirements.txt
+    brotli = None
+
+try:
+    import zopfli.gzip as zopfli_gzip
+except ImportError:  # pragma: no cover - listed in requirements.txt
+    zopfli_gzip = None
+
+DEFAULTS = {
+    'SERVE': True,
+    'MAX_AGE': 60,
+    'IMMUTABLE_MAX_AGE': 365 * 24 * 60 * 60,
+    'BROTLI_QUALITY': 11,
+    'ZOPFLI_ITERATIONS': 15,
+    'COMPRESS_EXTENSIONS': ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.xml', '.txt', '.html', '.ico', '.ttf', '.otf'),
+    # Files smaller than this are not worth a compressed copy
+    'MIN_COMPRESS_SIZE': 256,
+}
+
+# Sibling suffix of each content coding, in order of preference on ties
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Django's fingerprint: a 12-character hex hash before the extension
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'STATIC_ASSETS', {}))
+    return config
+
+
+def compress(data, config):
+    """``{coding: bytes}`` for every coding that actually shrinks ``data``"""
+    compressed = {}
+    if brotli is not None:
+        compressed['br'] = brotli.compress(data, quality=config['BROTLI_QUALITY'])
+    if zopfli_gzip is not None:
+        compressed['gzip'] = zopfli_gzip.compress(data, numiterations=config['ZOPFLI_ITERATIONS'])
+    else:
+        compressed['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+    # Not worth a header and a second file unless it saves at least 5%
+    return {coding: body for coding, body in compressed.items() if len(body) < len(data) * 0.95}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus ``.br``/``.gz`` siblings for every compressible file"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if not dry_run:
+            self.compress_files(set(paths) | set(self.hashed_files.values()))
+
+    def compress_files(self, names):
+        """
+        Write the compressed siblings of ``names``.  Files whose siblings are
+        already newer are skipped, and identical contents (a file and its
+        hashed copy, usually) are compressed once, spread over one process
+        per core since Zopfli holds the GIL.
+        """
+        config = get_config()
+        pending = {}
+        for name in names:
+            if not name.lower().endswith(config['COMPRESS_EXTENSIONS']):
+                continue
+            path = self.path(name)
+            siblings = [path + suffix for _, suffix in ENCODINGS]
+            mtime = os.path.getmtime(path)
+            if all(os.path.exists(sibling) and os.path.getmtime(sibling) >= mtime for sibling in siblings):
+                continue
+            for sibling in siblings:
+                if os.path.exists(sibling):
+                    os.remove(sibling)
+            if os.path.getsize(path) < config['MIN_COMPRESS_SIZE']:
+                continue
+            with open(path, 'rb') as handle:
+                data = handle.read()
+            pending.setdefault(hashlib.sha256(data).digest(), (data, []))[1].append(path)
+        if not pending:
+            return
+        jobs = list(pending.values())
+        with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(jobs))) as pool:
+            results = pool.map(compress, [data for data, _ in jobs], [config] * len(jobs))
+            for (_, paths), compressed in zip(jobs, results):
+                for path in paths:
+                    for coding, suffix in ENCODINGS:
+                        if coding in compressed:
+                            with open(path + suffix, 'wb') as handle:
+                                handle.write(compressed[coding])
+
+
+class StaticFile:
+    """One servable file under STATIC_ROOT and its precompressed siblings"""
+
+    def __init__(self, path, immutable):
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'application/json'):
+            self.content_type += '; charset=utf-8'
+        stat = os.stat(path)
+        self.last_modified = int(stat.st_mtime)
+        self.immutable = immutable
+        self.variants = {'identity': self._variant(path, stat)}
+        for coding, suffix in ENCODINGS:
+            try:
+                self.variants[coding] = self._variant(path + suffix, os.stat(path + suffix))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _variant(path, stat):
+        return path, stat.st_size, '"%x-%x"' % (stat.st_size, stat.st_mtime_ns)
+
+
+def build_index(root, static_url):
+    """``{url path: StaticFile}`` for every file under ``root`` except compressed siblings"""
+    index = {}
+    suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            if filename.endswith(suffixes) and os.path.exists(path.rsplit('.', 1)[0]):
+                continue
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            index[static_url + relative] = StaticFile(path, bool(HASHED_NAME_RE.search(filename)))
+    return index
+
+
+def parse_accept_encoding(header):
+    """``{coding: q}`` from an Accept-Encoding header"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header, available):
+    """The acceptable coding with the highest q-value, preferring smaller files on ties"""
+    accepted = parse_accept_encoding(header or '')
+    wildcard = accepted.get('*')
+    candidates = [(accepted.get('identity', 1.0 if wildcard is None else wildcard), 0, 'identity')]
+    for preference, (coding, _) in enumerate(reversed(ENCODINGS), start=1):
+        quality = accepted.get(coding, wildcard or 0.0)
+        if coding in available and quality > 0:
+            candidates.append((quality, preference, coding))
+    return max(candidates)[2]
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single satisfiable byte range, ``None`` to
+    ignore the header, or ``False`` when it cannot be satisfied"""
+    match = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', header)
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+class StaticFilesMiddleware:
+    """Serve collected static files with negotiation, validators and ranges"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        config = get_config()
+        self.enabled = config['SERVE'] and bool(settings.STATIC_ROOT)
+        self.static_url = '/' + settings.STATIC_URL.lstrip('/')
+        self.cache_control = {
+            True: f'public, max-age={config["IMMUTABLE_MAX_AGE"]}, immutable',
+            False: f'public, max-age={config["MAX_AGE"]}',
+        }
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = build_index(settings.STATIC_ROOT, self.static_url)
+        return self._index
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.enabled and request.path_info.startswith(self.static_url):
+            static_file = self.index.get(posixpath.normpath(unquote(request.path_info)))
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.enabled and request.path_info.startswith(self.static_url):
+            if self._index is None:
+                # Walking STATIC_ROOT once must not block the event loop
+                await sync_to_async(lambda: self.index, thread_sensitive=False)()
+            static_file = self._index.get(posixpath.normpath(unquote(request.path_info)))
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return await self.get_response(request)
+
+    def serve(self, request, static_file):
+        if request.method not in ('GET', 'HEAD'):
+            response = HttpResponse(status=405)
+            response['Allow'] = 'GET, HEAD'
+            return response
+
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header:
+            # Byte ranges always address the uncompressed file
+            coding = 'identity'
+        else:
+            coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'), static_file.variants)
+        path, size, etag = static_file.variants[coding]
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(static_file.last_modified),
+            'Cache-Control': self.cache_control[static_file.immutable],
+            'Accept-Ranges': 'bytes',
+        }
+
+        if self.not_modified(request, etag, static_file.last_modified):
+            response = HttpResponseNotModified()
+            return self.finish(response, headers, static_file)
+
+        status, start, end = 200, 0, size - 1
+        if range_header and self.range_applies(request, etag, static_file.last_modified):
+            byte_range = parse_range(range_header, size)
+            if byte_range is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return self.finish(response, headers, static_file)
+            if byte_range is not None:
+                status, (start, end) = 206, byte_range
+
+        if request.method == 'HEAD':
+            response = HttpResponse(status=status, content_type=static_file.content_type)
+        elif status == 206:
+            response = StreamingHttpResponse(
+                _read_range(path, start, end), status=206, content_type=static_file.content_type
+            )
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+        response['Content-Length'] = str(end - start + 1)
+        if status == 206:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        if coding != 'identity':
+            response['Content-Encoding'] = coding
+        return self.finish(response, headers, static_file)
+
+    @staticmethod
+    def finish(response, headers, static_file):
+        for header, value in headers.items():
+            response[header] = value
+        if len(static_file.variants) > 1:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    @staticmethod
+    def not_modified(request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            # Weak comparison, as RFC 9110 requires for If-None-Match
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return '*' in tags or etag in tags
+        since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return since is not None and last_modified <= since
+
+    @staticmethod
+    def range_applies(request, etag, last_modified):
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+        if if_range.startswith(('"', 'W/')):
+            # If-Range needs a strong match
+            return if_range == etag
+        return parse_http_date_safe(if_range) == last_modified
@@ -0,0 +1,52 @@
+"""
+Test helpers for the query budgets in ``REQUEST_PROFILING`` (see
+blog_site/instrumentation.py).
+
+    class HomeTests(QueryBudgetMixin, TestCase):
+        def test_home_within_budget(self):
+            self.assertWithinQueryBudget('blog:home')
+            self.assertWithinQueryBudget('blog:blog_detail', kwargs={'slug': 'a-post'}, budget=10)
+"""
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .instrumentation import budget_for, get_config, normalise_sql
+
+
+def measure_queries(client, url_name, args=None, kwargs=None, method='get', data=None, **extra):
+    """Request ``url_name`` with ``client``; returns (response, captured queries)"""
+    url = reverse(url_name, args=args, kwargs=kwargs)
+    with CaptureQueriesContext(connection) as captured:
+        response = getattr(client, method)(url, data=data, **extra)
+    return response, captured.captured_queries
+
+
+class QueryBudgetMixin:
+    """``TestCase`` mixin asserting the per-URL-name query budgets"""
+
+    def assertWithinQueryBudget(self, url_name, args=None, kwargs=None, budget=None, max_repeats=None,
+                                client=None, method='get', data=None, status_code=200, **extra):
+        config = get_config()
+        if budget is None:
+            budget = budget_for(url_name, config)
+        if max_repeats is None:
+            max_repeats = config['MAX_REPEATS']
+        response, queries = measure_queries(
+            client or self.client, url_name, args, kwargs, method, data, **extra
+        )
+        self.assertEqual(response.status_code, status_code, f'{url_name} returned {response.status_code}')
+        listing = '\n'.join(f'{number}. {query["sql"]}' for number, query in enumerate(queries, 1))
+        if budget is not None:
+            self.assertLessEqual(
+                len(queries), budget,
+                f'{url_name} ran {len(queries)} queries, over its budget of {budget}:\n{listing}',
+            )
+        repeated = {
+            sql: count for sql, count in Counter(normalise_sql(query['sql']) for query in queries).items()
+            if count > max_repeats
+        }
+        self.assertFalse(repeated, f'{url_name} repeated statements (N+1?): {repeated}')
+        return response
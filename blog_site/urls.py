@@ -18,9 +18,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from blog.exports import export_view
+from blog_site.instrumentation import request_profile_view
 
 urlpatterns = [
+    path('admin/export/<str:table>.<str:format>', admin.site.admin_view(export_view), name='export'),
     path('admin/', admin.site.urls),
+    path('_profile/', request_profile_view, name='request_profile'),
+    path('api/v1/', include('blog.api_urls')),
     path('accounts/', include('accounts.urls')),
     path('profiles/', include('profiles.urls')),
     path('', include('blog.urls')),
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import OutboundEmail
+from .queue import requeue
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'from_email', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'to', 'last_error')
+    ordering = ('-created_at',)
+    readonly_fields = ('attempts', 'claim_token', 'claimed_at', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected messages now')
+    def retry_now(self, request, queryset):
+        count = requeue(queryset)
+        self.message_user(request, f'{count} messages requeued.')
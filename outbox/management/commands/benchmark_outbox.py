@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from outbox import queue
+from outbox.models import OutboundEmail
+
+BENCHMARK_SENDER = 'benchmark@outbox.invalid'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure outbox enqueue latency and how fast the worker drains a large '
+        'queue. Messages are written to the configured database and removed afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=100_000, help='Messages to queue and drain')
+        parser.add_argument('--batch-size', type=int, default=500, help='Worker batch size')
+        parser.add_argument('--enqueue-samples', type=int, default=1000, help='Single queue_mail() calls to time')
+        parser.add_argument(
+            '--backend', default='django.core.mail.backends.dummy.EmailBackend',
+            help='Email backend to deliver through (e.g. locmem, or smtp against a local debug server)',
+        )
+
+    def handle(self, *args, **options):
+        if OutboundEmail.objects.exclude(from_email=BENCHMARK_SENDER).filter(status__in=['queued', 'sending']).exists():
+            raise CommandError('The outbox has undelivered messages; drain it before benchmarking.')
+        OutboundEmail.objects.filter(from_email=BENCHMARK_SENDER).delete()
+
+        try:
+            timings = []
+            for number in range(options['enqueue_samples']):
+                started = time.perf_counter()
+                queue.queue_mail(f'Enqueue {number}', 'Latency sample', BENCHMARK_SENDER, ['reader@example.com'])
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'queue_mail(): p50={statistics.median(timings):.2f}ms '
+                f'p99={timings[int(len(timings) * 0.99) - 1]:.2f}ms'
+            )
+
+            total = options['messages']
+            started = time.perf_counter()
+            chunk = 5000
+            for offset in range(0, total, chunk):
+                OutboundEmail.objects.bulk_create([
+                    OutboundEmail(
+                        subject=f'Benchmark message {number}',
+                        body='Hello from the outbox benchmark.\n' * 10,
+                        from_email=BENCHMARK_SENDER,
+                        to=[f'reader{number}@example.com'],
+                    )
+                    for number in range(offset, min(offset + chunk, total))
+                ])
+            self.stdout.write(f'Queued {total} messages in {time.perf_counter() - started:.1f}s')
+
+            outbox_config = dict(queue.get_config(), BACKEND=options['backend'])
+            with override_settings(EMAIL_OUTBOX=outbox_config):
+                started = time.perf_counter()
+                totals = queue.drain(batch_size=options['batch_size'])
+                elapsed = time.perf_counter() - started
+            delivered = totals['sent']
+            self.stdout.write(
+                f'Drained {delivered} messages in {elapsed:.1f}s '
+                f'({delivered / elapsed:,.0f} msg/s, batch size {options["batch_size"]}); '
+                f'retried={totals["retried"]} dead={totals["dead"]}'
+            )
+        finally:
+            OutboundEmail.objects.filter(from_email=BENCHMARK_SENDER).delete()
@@ -0,0 +1,43 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from outbox import queue
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails over one reused mail connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new messages')
+        parser.add_argument('--batch-size', type=int, help='Messages claimed per batch (default EMAIL_OUTBOX BATCH_SIZE)')
+        parser.add_argument('--limit', type=int, help='Stop after processing this many messages')
+        parser.add_argument('--purge-sent', type=int, metavar='DAYS', help='Delete sent messages older than DAYS')
+
+    def handle(self, *args, **options):
+        if options['purge_sent'] is not None:
+            deleted = queue.purge_sent(options['purge_sent'])
+            self.stdout.write(f'Purged {deleted} sent messages.')
+
+        if not options['loop']:
+            self.report(queue.drain(options['batch_size'], options['limit']))
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        interval = queue.get_config()['POLL_INTERVAL']
+        while not stop.is_set():
+            try:
+                totals = queue.drain(options['batch_size'], options['limit'])
+                if any(totals.values()):
+                    self.report(totals)
+            finally:
+                close_old_connections()
+            stop.wait(interval)
+
+    def report(self, totals):
+        self.stdout.write(self.style.SUCCESS(
+            'Sent {sent}, scheduled {retried} for retry, {dead} dead.'.format(**totals)
+        ))
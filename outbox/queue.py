@@ -0,0 +1,238 @@
+"""
+Database-backed email outbox.
+
+Views call ``queue_mail()`` (same arguments as ``send_mail``), which only
+inserts an ``OutboundEmail`` row, so a slow or unreachable mail server never
+adds latency to, or breaks, a request.  The ``send_queued_mail`` worker
+claims due messages in batches and delivers them over one reused connection
+of the configured email backend.  Failed messages are retried with
+exponential backoff and are marked ``dead`` after ``MAX_ATTEMPTS``; one
+without recipients is never queued, or is ``dead`` at once if it was.
+Configured with the ``EMAIL_OUTBOX`` setting:
+
+    EMAIL_OUTBOX = {
+        'BACKEND': None,        # email backend used for delivery (None = EMAIL_BACKEND)
+        'BATCH_SIZE': 100,      # messages claimed per batch
+        'MAX_ATTEMPTS': 10,     # deliveries tried before a message is dead
+        'BACKOFF_BASE': 30,     # seconds before the first retry, doubled each time
+        'BACKOFF_MAX': 3600,    # upper bound on the retry delay
+        'CLAIM_TIMEOUT': 300,   # seconds before a crashed worker's claim is released
+        'POLL_INTERVAL': 5,     # seconds the worker sleeps when the queue is empty
+    }
+"""
+import logging
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': None,
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 10,
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 3600,
+    'CLAIM_TIMEOUT': 300,
+    'POLL_INTERVAL': 5,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'EMAIL_OUTBOX', {}))
+    return config
+
+
+def queue_mail(subject, message, from_email, recipient_list, html_message=None):
+    """
+    Add a message to the outbox; it is delivered later by the worker.
+
+    Blank addresses are dropped.  Like ``send_mail``, a message left with
+    no recipient is not sent: nothing is queued and ``None`` is returned.
+    """
+    recipients = [address for address in recipient_list if address and address.strip()]
+    if not recipients:
+        logger.warning('Not queueing %r: it has no recipients', subject)
+        return None
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=recipients,
+    )
+
+
+def backoff_delay(attempts, config):
+    """Seconds to wait after the ``attempts``-th failed delivery, with 10% jitter"""
+    delay = min(config['BACKOFF_BASE'] * 2 ** (attempts - 1), config['BACKOFF_MAX'])
+    return delay * (1 + random.random() / 10)
+
+
+def release_stale_claims(config=None):
+    """Requeue messages claimed by a worker that died before finishing them"""
+    config = config or get_config()
+    cutoff = timezone.now() - timedelta(seconds=config['CLAIM_TIMEOUT'])
+    return OutboundEmail.objects.filter(status='sending', claimed_at__lt=cutoff).update(
+        status='queued', claim_token='', claimed_at=None,
+    )
+
+
+def claim_batch(batch_size):
+    """
+    Mark up to ``batch_size`` due messages as being sent by this worker.
+
+    The claiming UPDATE re-checks ``status='queued'``, so when several
+    workers race for the same rows each row goes to exactly one of them.
+    """
+    now = timezone.now()
+    due = list(
+        OutboundEmail.objects.filter(status='queued', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not due:
+        return []
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(pk__in=due, status='queued').update(
+        status='sending', claim_token=token, claimed_at=now,
+    )
+    return list(OutboundEmail.objects.filter(claim_token=token, status='sending').order_by('id'))
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject, email.body, email.from_email, email.to, connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _open(connection):
+    try:
+        connection.open()
+        return None
+    except Exception as exc:
+        return exc
+
+
+def deliver_batch(emails, connection, config):
+    """Send ``emails`` over ``connection`` and record each outcome; returns (sent, retried, dead)"""
+    sent_ids = []
+    failed = []
+    rejected = []
+    connection_error = None
+    for email in emails:
+        if not email.to:
+            # Queued before queue_mail() checked, or edited since: a backend
+            # would report it sent without delivering it anywhere
+            rejected.append(email)
+            continue
+        if connection_error is not None:
+            failed.append((email, connection_error))
+            continue
+        try:
+            connection.send_messages([build_message(email, connection)])
+        except Exception as exc:
+            failed.append((email, exc))
+            # The connection may be broken now; reconnect once for the rest of the batch
+            try:
+                connection.close()
+            except Exception:
+                pass
+            connection_error = _open(connection)
+        else:
+            sent_ids.append(email.pk)
+
+    now = timezone.now()
+    if sent_ids:
+        OutboundEmail.objects.filter(pk__in=sent_ids).update(
+            status='sent', sent_at=now, claim_token='', claimed_at=None, last_error='',
+        )
+
+    if rejected:
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in rejected]).update(
+            status='dead', last_error='No recipients', claim_token='', claimed_at=None,
+        )
+        logger.error('Outbox emails %s have no recipients', [email.pk for email in rejected])
+
+    dead = len(rejected)
+    for email, exc in failed:
+        email.attempts += 1
+        email.last_error = f'{type(exc).__name__}: {exc}'
+        email.claim_token = ''
+        email.claimed_at = None
+        if email.attempts >= config['MAX_ATTEMPTS']:
+            email.status = 'dead'
+            dead += 1
+            logger.error('Giving up on outbox email %s after %s attempts: %s', email.pk, email.attempts, email.last_error)
+        else:
+            email.status = 'queued'
+            email.next_attempt_at = now + timedelta(seconds=backoff_delay(email.attempts, config))
+    if failed:
+        OutboundEmail.objects.bulk_update(
+            [email for email, _ in failed],
+            ['attempts', 'last_error', 'claim_token', 'claimed_at', 'status', 'next_attempt_at'],
+        )
+    return len(sent_ids), len(failed) + len(rejected) - dead, dead
+
+
+def drain(batch_size=None, limit=None, connection=None):
+    """
+    Deliver due messages until none are left (or ``limit`` were processed).
+
+    One backend connection is opened for the whole run.  Returns a dict of
+    ``sent``, ``retried`` and ``dead`` counts.
+    """
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    totals = {'sent': 0, 'retried': 0, 'dead': 0}
+    release_stale_claims(config)
+
+    if connection is None:
+        connection = get_connection(backend=config['BACKEND'], fail_silently=False)
+    error = _open(connection)
+    if error is not None:
+        logger.warning('Could not connect to the mail server: %s', error)
+    try:
+        processed = 0
+        while limit is None or processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            emails = claim_batch(size)
+            if not emails:
+                break
+            sent, retried, dead = deliver_batch(emails, connection, config)
+            totals['sent'] += sent
+            totals['retried'] += retried
+            totals['dead'] += dead
+            processed += len(emails)
+            if not sent:
+                # Nothing in the batch got through; leave the rest for the next run
+                break
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.exception('Failed to close the mail connection')
+    return totals
+
+
+def requeue(queryset):
+    """Put dead (or any) messages back in the queue for immediate delivery"""
+    return queryset.exclude(status='sent').update(
+        status='queued', attempts=0, next_attempt_at=timezone.now(), claim_token='', claimed_at=None,
+    )
+
+
+def purge_sent(older_than_days):
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = OutboundEmail.objects.filter(status='sent', sent_at__lt=cutoff).delete()
+    return deleted
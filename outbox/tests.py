@@ -0,0 +1,167 @@
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import OutboundEmail
+
+
+class RecordingBackend(locmem.EmailBackend):
+    """locmem delivery that counts connections and fails the subjects it is told to"""
+
+    instances = []
+    failing_subjects = set()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened = 0
+        self.closed = 0
+        RecordingBackend.instances.append(self)
+
+    def open(self):
+        self.opened += 1
+        return True
+
+    def close(self):
+        self.closed += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.subject in self.failing_subjects:
+                raise SMTPException(f'refused {message.subject}')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_OUTBOX={
+    'BACKEND': 'outbox.tests.RecordingBackend',
+    'BATCH_SIZE': 2,
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 100,
+    'CLAIM_TIMEOUT': 300,
+})
+class OutboxTests(TestCase):
+    def setUp(self):
+        RecordingBackend.instances = []
+        RecordingBackend.failing_subjects = set()
+
+    def queue(self, subject, **extra):
+        return queue.queue_mail(subject, f'{subject} body', None, ['reader@example.com'], **extra)
+
+    def make_due(self):
+        OutboundEmail.objects.filter(status='queued').update(next_attempt_at=timezone.now())
+
+    def test_queueing_sends_nothing(self):
+        email = self.queue('Hello', html_message='<p>Hello</p>')
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(email.status, 'queued')
+        self.assertEqual(email.from_email, 'noreply@blogsite.com')
+
+    def test_messages_without_recipients_are_not_queued(self):
+        with self.assertLogs('outbox.queue', 'WARNING'):
+            self.assertIsNone(queue.queue_mail('Nobody', 'body', None, []))
+        with self.assertLogs('outbox.queue', 'WARNING'):
+            self.assertIsNone(queue.queue_mail('Blank', 'body', None, ['', ' ']))
+        self.assertFalse(OutboundEmail.objects.exists())
+        email = queue.queue_mail('Some', 'body', None, ['', 'reader@example.com'])
+        self.assertEqual(email.to, ['reader@example.com'])
+
+    def test_queued_message_without_recipients_is_dead_lettered(self):
+        empty = OutboundEmail.objects.create(subject='Empty', body='body', from_email='a@example.com', to=[])
+        self.queue('Fine')
+        with self.assertLogs('outbox.queue', 'ERROR'):
+            self.assertEqual(queue.drain(), {'sent': 1, 'retried': 0, 'dead': 1})
+        empty.refresh_from_db()
+        self.assertEqual((empty.status, empty.last_error, empty.sent_at), ('dead', 'No recipients', None))
+        self.assertEqual([message.subject for message in mail.outbox], ['Fine'])
+
+    def test_drain_delivers_every_batch_over_one_connection(self):
+        for number in range(5):
+            self.queue(f'Message {number}', html_message='<p>Hi</p>' if number == 0 else None)
+        totals = queue.drain()
+
+        self.assertEqual(totals, {'sent': 5, 'retried': 0, 'dead': 0})
+        self.assertEqual(len(RecordingBackend.instances), 1)
+        connection = RecordingBackend.instances[0]
+        self.assertEqual((connection.opened, connection.closed), (1, 1))
+        self.assertEqual([message.subject for message in mail.outbox], [f'Message {number}' for number in range(5)])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+        self.assertFalse(OutboundEmail.objects.filter(sent_at=None).exists())
+
+    def test_failed_send_is_retried_with_backoff(self):
+        RecordingBackend.failing_subjects = {'Bounces'}
+        failing = self.queue('Bounces')
+        self.queue('Fine')
+        for attempts, delay in [(1, 30), (2, 60)]:
+            before = timezone.now()
+            queue.drain()
+            failing.refresh_from_db()
+            self.assertEqual(failing.status, 'queued')
+            self.assertEqual(failing.attempts, attempts)
+            self.assertEqual(failing.last_error, 'SMTPException: refused Bounces')
+            self.assertEqual(failing.claim_token, '')
+            # BACKOFF_BASE doubled per attempt, plus up to 10% jitter
+            wait = failing.next_attempt_at - before
+            self.assertGreaterEqual(wait, timedelta(seconds=delay))
+            self.assertLessEqual(wait, timedelta(seconds=delay * 1.1 + 1))
+            # Not due yet: a drain now leaves it alone
+            self.assertEqual(queue.drain()['retried'], 0)
+            self.make_due()
+
+        # The message after the failure still went out, after one reconnect
+        self.assertEqual([message.subject for message in mail.outbox], ['Fine'])
+        self.assertEqual(RecordingBackend.instances[0].opened, 2)
+
+    def test_backoff_is_capped(self):
+        config = queue.get_config()
+        for attempts, delay in [(1, 30), (2, 60), (3, 100), (9, 100)]:
+            self.assertGreaterEqual(queue.backoff_delay(attempts, config), delay)
+            self.assertLessEqual(queue.backoff_delay(attempts, config), delay * 1.1)
+
+    def test_dead_after_max_attempts_and_requeue(self):
+        RecordingBackend.failing_subjects = {'Bounces'}
+        failing = self.queue('Bounces')
+        for _ in range(2):
+            self.assertEqual(queue.drain()['retried'], 1)
+            self.make_due()
+        with self.assertLogs('outbox.queue', 'ERROR') as logs:
+            self.assertEqual(queue.drain()['dead'], 1)
+        self.assertIn('after 3 attempts', logs.output[0])
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), ('dead', 3))
+
+        # Dead messages are never picked up again ...
+        self.assertEqual(queue.drain(), {'sent': 0, 'retried': 0, 'dead': 0})
+        # ... until an operator puts them back
+        RecordingBackend.failing_subjects = set()
+        self.assertEqual(queue.requeue(OutboundEmail.objects.all()), 1)
+        self.assertEqual(queue.drain()['sent'], 1)
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'sent')
+
+    def test_stale_claims_are_released(self):
+        stale = self.queue('Stale')
+        fresh = self.queue('Fresh')
+        OutboundEmail.objects.filter(pk=stale.pk).update(
+            status='sending', claim_token='crashed', claimed_at=timezone.now() - timedelta(seconds=301),
+        )
+        OutboundEmail.objects.filter(pk=fresh.pk).update(
+            status='sending', claim_token='working', claimed_at=timezone.now(),
+        )
+        self.assertEqual(queue.drain()['sent'], 1)
+        self.assertEqual([message.subject for message in mail.outbox], ['Stale'])
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, 'sending')
+
+    def test_command_reports_totals(self):
+        self.queue('Via command')
+        output = StringIO()
+        call_command('send_queued_mail', stdout=output)
+        self.assertIn('Sent 1, scheduled 0 for retry, 0 dead.', output.getvalue())
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import AuthorProfile, Follow
+from blog.exports import export_csv, export_jsonl
+from .models import AuthorProfile, AuthorStats, Follow
 
 @admin.register(AuthorProfile)
 class AuthorProfileAdmin(admin.ModelAdmin):
@@ -30,6 +31,19 @@ class FollowAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('follower__username', 'follower__email', 'following__username', 'following__email')
     ordering = ('-created_at',)
+    actions = [export_jsonl, export_csv]
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('follower', 'following')
+
+@admin.register(AuthorStats)
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'published_count', 'total_views', 'rating_count', 'followers_count', 'following_count')
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = ('user', 'published_count', 'total_views', 'rating_sum', 'rating_count', 'followers_count', 'following_count')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
@@ -0,0 +1,79 @@
+"""
+Native async versions of the author pages, routed instead of the ones in
+profiles.views when ``ASYNC_READ_VIEWS`` is on (see blog.async_views).
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.shortcuts import aget_object_or_404, render
+
+from blog.models import Blog
+from blog.pagination import apaginate
+from . import search
+from .models import AuthorProfile, AuthorStats, Follow
+from .views import authors_list_ordering
+
+User = get_user_model()
+
+
+async def _is_following(user, author):
+    if not user.is_authenticated or user.pk == author.pk:
+        return False
+    return await Follow.objects.filter(follower=user, following=author).aexists()
+
+
+async def author_detail_view(request, username):
+    request.user = user = await request.auser()
+    # Profile and statistics come with the user in one joined query
+    author = await aget_object_or_404(
+        User.objects.select_related('author_profile', 'author_stats'), username=username
+    )
+    try:
+        profile = author.author_profile
+    except AuthorProfile.DoesNotExist:
+        # Blank until the author edits it; reading the page does not create it
+        profile = AuthorProfile(user=author)
+    try:
+        stats = author.author_stats
+    except AuthorStats.DoesNotExist:
+        stats = await sync_to_async(AuthorStats.for_user)(author.pk)
+
+    blogs = Blog.objects.filter(author=author, status='published').select_related('category')
+    page_obj, is_following = await asyncio.gather(
+        apaginate(request, blogs, 6, ('-published_at',)),
+        _is_following(user, author),
+    )
+
+    return render(request, 'profiles/author_detail.html', {
+        'author': author,
+        'profile': profile,
+        'stats': stats,
+        'page_obj': page_obj,
+        'is_following': is_following,
+        'total_blogs': stats.published_count,
+        'total_views': stats.total_views,
+        'average_rating': stats.average_rating,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
+    })
+
+
+async def authors_list_view(request):
+    request.user = await request.auser()
+    authors = AuthorStats.objects.filter(is_listed=True).select_related('user', 'user__author_profile')
+
+    search_query = request.GET.get('search', '')
+    if search_query:
+        # The full-text match runs as a raw query while filtering
+        authors = await sync_to_async(search.search_authors)(authors, search_query)
+    sort_by, ordering = authors_list_ordering(request)
+
+    page_obj = await apaginate(request, authors, 12, ordering)
+    page_obj.object_list = [stats.user for stats in page_obj.object_list]
+
+    return render(request, 'profiles/authors_list.html', {
+        'page_obj': page_obj,
+        'search_query': search_query,
+        'sort_by': sort_by,
+    })
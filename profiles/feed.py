@@ -0,0 +1,284 @@
+"""
+Following timeline, fanned out on write.
+
+When a post is published, a background job copies it into the
+``FeedEntry`` rows of every follower of its author with batched
+``INSERT ... SELECT`` statements, so reading a timeline is one indexed range
+scan.  Authors with at least ``PULL_THRESHOLD`` followers are not fanned out:
+their posts are pulled from ``Blog`` at read time and merged in.  Entries
+older than ``MAX_AGE_DAYS`` or beyond ``MAX_ENTRIES`` per reader are removed
+by the ``trim_feeds`` command.  Configured with the ``FEED`` setting:
+
+    FEED = {
+        'BACKEND': 'thread',      # 'thread' (background worker) or 'sync'
+        'PULL_THRESHOLD': 10000,  # followers at which an author switches to pull-on-read
+        'BATCH_SIZE': 5000,       # followers written per INSERT
+        'MAX_ENTRIES': 1000,      # entries kept per reader
+        'MAX_AGE_DAYS': 90,       # entries older than this are trimmed
+        'FOLLOW_BACKFILL': 20,    # recent posts copied in when following someone
+    }
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from blog.pagination import CURSOR_PARAM, CursorPage, InvalidCursor, decode_cursor, encode_cursor
+
+from .models import AuthorStats, FeedEntry, Follow
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'thread',
+    'PULL_THRESHOLD': 10000,
+    'BATCH_SIZE': 5000,
+    'MAX_ENTRIES': 1000,
+    'MAX_AGE_DAYS': 90,
+    'FOLLOW_BACKFILL': 20,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'FEED', {}))
+    return config
+
+
+def is_pull_author(author_id, config=None):
+    config = config or get_config()
+    return AuthorStats.objects.filter(
+        user_id=author_id, followers_count__gte=config['PULL_THRESHOLD']
+    ).exists()
+
+
+def fan_out(blog_id, config=None):
+    """Copy a published post into its author's followers' feeds; returns rows written"""
+    from blog.models import Blog
+
+    config = config or get_config()
+    blog = Blog.objects.filter(pk=blog_id, status='published').values('author_id', 'published_at').first()
+    if blog is None or is_pull_author(blog['author_id'], config):
+        return 0
+
+    follow_table = Follow._meta.db_table
+    insert_sql = (
+        'INSERT INTO {feed} (user_id, blog_id, author_id, published_at) '
+        'SELECT follower_id, %s, %s, %s FROM {follow} '
+        'WHERE following_id = %s AND follower_id > %s{upper} '
+        'ON CONFLICT DO NOTHING'
+    )
+    written = 0
+    last_follower = 0
+    with connection.cursor() as cursor:
+        while True:
+            # Upper follower id of this batch, found on the (following, follower) index
+            cursor.execute(
+                'SELECT follower_id FROM {follow} WHERE following_id = %s AND follower_id > %s '
+                'ORDER BY follower_id LIMIT 1 OFFSET %s'.format(follow=follow_table),
+                [blog['author_id'], last_follower, config['BATCH_SIZE'] - 1],
+            )
+            row = cursor.fetchone()
+            upper = row[0] if row else None
+            params = [blog_id, blog['author_id'], blog['published_at'], blog['author_id'], last_follower]
+            if upper is not None:
+                params.append(upper)
+            with transaction.atomic():
+                cursor.execute(insert_sql.format(
+                    feed=FeedEntry._meta.db_table,
+                    follow=follow_table,
+                    upper=' AND follower_id <= %s' if upper is not None else '',
+                ), params)
+                written += max(cursor.rowcount, 0)
+            if upper is None:
+                return written
+            last_follower = upper
+
+
+def fan_out_many(blog_ids, config=None):
+    """
+    ``fan_out`` for a bulk load of posts: one ``INSERT ... SELECT`` per chunk
+    of posts rather than per post and follower batch; returns rows written
+    """
+    from blog.models import Blog
+
+    config = config or get_config()
+    blog_ids = list(blog_ids)
+    pull_authors = AuthorStats.objects.filter(
+        followers_count__gte=config['PULL_THRESHOLD']
+    ).values('user_id')
+    written = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(blog_ids), 500):
+            chunk = Blog.objects.filter(
+                pk__in=blog_ids[start:start + 500], status='published'
+            ).exclude(author_id__in=pull_authors).values_list('pk', flat=True)
+            chunk = list(chunk)
+            if not chunk:
+                continue
+            cursor.execute(
+                'INSERT INTO {feed} (user_id, blog_id, author_id, published_at) '
+                'SELECT f.follower_id, b.id, b.author_id, b.published_at '
+                'FROM {blog} b JOIN {follow} f ON f.following_id = b.author_id '
+                'WHERE b.id IN ({ids}) ON CONFLICT DO NOTHING'.format(
+                    feed=FeedEntry._meta.db_table, blog=Blog._meta.db_table,
+                    follow=Follow._meta.db_table, ids=', '.join(['%s'] * len(chunk)),
+                ),
+                chunk,
+            )
+            written += max(cursor.rowcount, 0)
+    return written
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception('Feed job %s%r failed', job.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def _submit(job, *args):
+    global _executor
+    if get_config()['BACKEND'] != 'thread':
+        job(*args)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed-fanout')
+    _executor.submit(_run, job, *args)
+
+
+def blog_published(blog_id):
+    """Schedule the fan-out of a newly published post once the transaction commits"""
+    transaction.on_commit(lambda: _submit(fan_out, blog_id))
+
+
+def blog_unpublished(blog_id):
+    FeedEntry.objects.filter(blog_id=blog_id).delete()
+
+
+def follow_added(follower_id, author_id, config=None):
+    """Give a new follower the author's recent posts"""
+    from blog.models import Blog
+
+    config = config or get_config()
+    if is_pull_author(author_id, config):
+        return
+    recent = (
+        Blog.objects.filter(author_id=author_id, status='published')
+        .order_by('-published_at', '-id')
+        .values_list('pk', 'published_at')[:config['FOLLOW_BACKFILL']]
+    )
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=follower_id, blog_id=blog_id, author_id=author_id, published_at=published_at)
+            for blog_id, published_at in recent
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def follow_removed(follower_id, author_id):
+    FeedEntry.objects.filter(user_id=follower_id, author_id=author_id).delete()
+
+
+def _before(queryset, cursor_values, date_field, id_field):
+    if cursor_values is None:
+        return queryset
+    published_at, pk = cursor_values
+    return queryset.filter(
+        Q(**{f'{date_field}__lt': published_at}) |
+        Q(**{date_field: published_at, f'{id_field}__lt': pk})
+    )
+
+
+def _parse_cursor(token):
+    if not token:
+        return None
+    try:
+        published_at, pk = decode_cursor(token)['v']
+        published_at = parse_datetime(published_at)
+        if published_at is None:
+            raise InvalidCursor('Bad timestamp')
+        return published_at, int(pk)
+    except (InvalidCursor, KeyError, TypeError, ValueError):
+        return None
+
+
+def get_timeline(user, token=None, per_page=10, config=None):
+    """
+    One page of ``user``'s timeline, newest first, as a ``CursorPage``.
+
+    Pushed entries and posts pulled from high-follower authors are each
+    read with the same (published_at, id) keyset and merged.  Only older
+    pages are linked; "newer" returns to the top of the timeline.
+    """
+    from blog.models import Blog
+
+    config = config or get_config()
+    position = _parse_cursor(token)
+    candidates = {}
+
+    pushed = _before(
+        FeedEntry.objects.filter(user=user), position, 'published_at', 'blog_id'
+    ).order_by('-published_at', '-blog_id').values_list('blog_id', 'published_at')[:per_page + 1]
+    candidates.update(pushed)
+
+    pull_authors = list(
+        Follow.objects.filter(
+            follower=user, following__author_stats__followers_count__gte=config['PULL_THRESHOLD']
+        ).values_list('following_id', flat=True)
+    )
+    if pull_authors:
+        pulled = _before(
+            Blog.objects.filter(author_id__in=pull_authors, status='published'), position, 'published_at', 'id'
+        ).order_by('-published_at', '-id').values_list('id', 'published_at')[:per_page + 1]
+        candidates.update(pulled)
+
+    ordered = sorted(candidates.items(), key=lambda item: (item[1], item[0]), reverse=True)
+    has_next = len(ordered) > per_page
+    ordered = ordered[:per_page]
+    blogs = Blog.objects.filter(pk__in=[pk for pk, _ in ordered], status='published').select_related('author', 'category')
+    by_id = {blog.pk: blog for blog in blogs}
+    rows = [by_id[pk] for pk, _ in ordered if pk in by_id]
+
+    next_cursor = None
+    if has_next and ordered:
+        pk, published_at = ordered[-1]
+        next_cursor = encode_cursor({'v': [published_at.isoformat(), pk]})
+    return CursorPage(rows, has_next, position is not None, next_cursor, None)
+
+
+def paginate_timeline(request, per_page=10):
+    return get_timeline(request.user, request.GET.get(CURSOR_PARAM), per_page)
+
+
+def trim(config=None):
+    """Drop entries past the age limit and beyond the per-reader cap; returns rows deleted"""
+    config = config or get_config()
+    cutoff = timezone.now() - timedelta(days=config['MAX_AGE_DAYS'])
+    deleted, _ = FeedEntry.objects.filter(published_at__lt=cutoff).delete()
+
+    limit = config['MAX_ENTRIES']
+    over_limit = (
+        FeedEntry.objects.values('user').annotate(total=Count('pk')).filter(total__gt=limit)
+        .values_list('user', flat=True)
+    )
+    for user_id in list(over_limit):
+        entries = FeedEntry.objects.filter(user_id=user_id)
+        last_kept = entries.order_by('-published_at', '-blog_id').values_list('published_at', 'blog_id')[limit - 1]
+        removed, _ = _before(entries, last_kept, 'published_at', 'blog_id').delete()
+        deleted += removed
+    return deleted
@@ -0,0 +1,139 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from profiles import search
+from profiles.models import AuthorProfile, AuthorStats
+
+User = get_user_model()
+
+FIRST_NAMES = ['ada', 'alan', 'grace', 'linus', 'margaret', 'dennis', 'barbara', 'ken', 'frances', 'edsger',
+               'radia', 'guido', 'katherine', 'john', 'sophie', 'tim', 'anita', 'donald', 'hedy', 'niklaus']
+LAST_NAMES = ['lovelace', 'turing', 'hopper', 'torvalds', 'hamilton', 'ritchie', 'liskov', 'thompson', 'allen',
+              'dijkstra', 'perlman', 'rossum', 'johnson', 'backus', 'wilson', 'berners', 'borg', 'knuth', 'lamarr', 'wirth']
+BIO_WORDS = ['python', 'django', 'databases', 'travel', 'cooking', 'design', 'security', 'music', 'science',
+             'history', 'photography', 'writing', 'startups', 'gardening', 'robotics', 'teaching']
+
+# Stand-in for the site template so the benchmark measures the view, not missing files
+LIST_TEMPLATE = (
+    '{% for author in page_obj %}{{ author.get_full_name }} {{ author.author_stats.published_count }} '
+    '{{ author.author_profile.bio|truncatewords:10 }}\n{% endfor %}'
+    '{{ page_obj.next_cursor|default:"" }}'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure authors_list_view latency for every sort, deep cursor pages and search '
+        'against a synthetic directory built in a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=100_000, help='Synthetic authors to create')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--depth', type=int, default=50, help='Pages to follow for the deep-page scenario')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            search._fts_available = None
+            started = time.perf_counter()
+            self.populate(options['authors'], random.Random(options['seed']))
+            self.stdout.write(f'Built {options["authors"]} authors in {time.perf_counter() - started:.1f}s')
+            templates = [{
+                'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                'OPTIONS': {'loaders': [('django.template.loaders.locmem.Loader', {
+                    'profiles/authors_list.html': LIST_TEMPLATE,
+                })]},
+            }]
+            with override_settings(TEMPLATES=templates, ALLOWED_HOSTS=['*'], PAGE_CACHE={'ENABLED': False}):
+                self.run_scenarios(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            search._fts_available = None
+
+    def populate(self, total, rng):
+        chunk = 5000
+        for offset in range(0, total, chunk):
+            numbers = range(offset, min(offset + chunk, total))
+            users = User.objects.bulk_create([
+                User(
+                    username=f'author{number}',
+                    email=f'author{number}@example.com',
+                    first_name=rng.choice(FIRST_NAMES).title(),
+                    last_name=rng.choice(LAST_NAMES).title(),
+                    role='author',
+                    password='!',
+                )
+                for number in numbers
+            ])
+            AuthorProfile.objects.bulk_create([
+                AuthorProfile(user=user, bio=' '.join(rng.choices(BIO_WORDS, k=8))) for user in users
+            ])
+            stats = []
+            for user in users:
+                rating_count = rng.randint(0, 200)
+                stats.append(AuthorStats(
+                    user=user,
+                    published_count=int(rng.paretovariate(1.2)),
+                    followers_count=int(rng.paretovariate(1.0)) - 1,
+                    rating_count=rating_count,
+                    rating_sum=sum(rng.randint(1, 6) for _ in range(rating_count)),
+                ))
+            AuthorStats.objects.bulk_create(stats)
+        AuthorStats.sync_directory()
+        AuthorStats.objects.filter(rating_count__gt=0).update(
+            rating_average=AuthorStats._rating_average('rating_sum', 'rating_count')
+        )
+        search.rebuild_index()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run_scenarios(self, options):
+        client = Client()
+        rng = random.Random(options['seed'])
+        for sort in ('name', 'blogs', 'followers', 'rating'):
+            self.report(f'sort={sort} first page', self.time_requests(
+                client, lambda: f'/profiles/authors/?sort={sort}', options['requests']
+            ))
+            cursors = self.walk(client, sort, options['depth'])
+            self.report(f'sort={sort} pages 1-{len(cursors)}', self.time_requests(
+                client, lambda: f'/profiles/authors/?sort={sort}&cursor={rng.choice(cursors)}', options['requests']
+            ))
+        terms = [rng.choice(FIRST_NAMES + LAST_NAMES + BIO_WORDS)[:5] for _ in range(50)]
+        self.report('search', self.time_requests(
+            client, lambda: f'/profiles/authors/?sort=followers&search={rng.choice(terms)}', options['requests']
+        ))
+
+    def walk(self, client, sort, depth):
+        cursors = ['']
+        for _ in range(depth - 1):
+            response = client.get(f'/profiles/authors/?sort={sort}&cursor={cursors[-1]}')
+            next_cursor = response.content.decode().rsplit('\n', 1)[-1]
+            if not next_cursor:
+                break
+            cursors.append(next_cursor)
+        return cursors
+
+    def time_requests(self, client, make_url, count):
+        timings = []
+        for _ in range(count):
+            url = make_url()
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+        return sorted(timings)
+
+    def report(self, label, timings):
+        p50 = timings[len(timings) // 2]
+        p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+        self.stdout.write(f'{label:<28} p50={p50:6.2f}ms  p99={p99:6.2f}ms')
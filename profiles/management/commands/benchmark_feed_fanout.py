@@ -0,0 +1,82 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from blog.models import Blog
+from profiles import feed
+from profiles.models import AuthorStats, FeedEntry, Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure fanning one post out to an author with many followers, and reading a '
+        'follower\'s timeline afterwards, in a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=100_000, help='Followers of the benchmark author')
+        parser.add_argument('--batch-sizes', default='1000,5000,20000', help='Comma-separated FEED BATCH_SIZE values')
+        parser.add_argument('--posts', type=int, default=3, help='Posts fanned out per batch size')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            author, follower_ids = self.populate(options['followers'])
+            config = dict(feed.get_config(), PULL_THRESHOLD=options['followers'] + 1)
+            for batch_size in [int(size) for size in options['batch_sizes'].split(',')]:
+                config['BATCH_SIZE'] = batch_size
+                timings = []
+                for _ in range(options['posts']):
+                    blog = Blog.objects.bulk_create([Blog(
+                        title='Fan-out benchmark', slug=f'fan-out-{time.perf_counter_ns()}', author=author,
+                        body='Benchmark post', status='published', published_at=timezone.now(),
+                    )])[0]
+                    started = time.perf_counter()
+                    written = feed.fan_out(blog.pk, config)
+                    timings.append(time.perf_counter() - started)
+                best = min(timings)
+                self.stdout.write(
+                    f'batch {batch_size:>6}: {written} entries in {best:.2f}s '
+                    f'({written / best:,.0f} rows/s, best of {len(timings)})'
+                )
+
+            reader = User.objects.get(pk=follower_ids[len(follower_ids) // 2])
+            started = time.perf_counter()
+            for _ in range(100):
+                page = feed.get_timeline(reader, per_page=10, config=config)
+            self.stdout.write(f'timeline page read: {(time.perf_counter() - started) * 10:.2f}ms ({len(page)} posts)')
+
+            config['PULL_THRESHOLD'] = 1
+            started = time.perf_counter()
+            for _ in range(100):
+                page = feed.get_timeline(reader, per_page=10, config=config)
+            self.stdout.write(f'timeline page read, author in pull mode: {(time.perf_counter() - started) * 10:.2f}ms')
+            self.stdout.write(f'feed table size: {FeedEntry.objects.count()} rows')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def populate(self, total):
+        author = User.objects.create_user(
+            username='fanout-author', email='fanout-author@example.com', password='!', role='author',
+        )
+        chunk = 10_000
+        follower_ids = []
+        for offset in range(0, total, chunk):
+            users = User.objects.bulk_create([
+                User(username=f'reader{number}', email=f'reader{number}@example.com', password='!')
+                for number in range(offset, min(offset + chunk, total))
+            ])
+            Follow.objects.bulk_create([Follow(follower=user, following=author) for user in users])
+            follower_ids.extend(user.pk for user in users)
+        AuthorStats.rebuild(user_ids=[author.pk])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return author, follower_ids
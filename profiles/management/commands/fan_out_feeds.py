@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from blog.models import Blog
+from profiles import feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Fan published posts out to their followers\' timelines now, e.g. to backfill '
+        'feeds or to recover jobs lost when a worker process stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('blog_ids', nargs='*', type=int, help='Posts to fan out (default: all within FEED MAX_AGE_DAYS)')
+
+    def handle(self, *args, **options):
+        config = feed.get_config()
+        blogs = Blog.objects.filter(status='published')
+        if options['blog_ids']:
+            blogs = blogs.filter(pk__in=options['blog_ids'])
+        else:
+            blogs = blogs.filter(published_at__gte=timezone.now() - timedelta(days=config['MAX_AGE_DAYS']))
+        written = 0
+        for blog_id in list(blogs.order_by('published_at').values_list('pk', flat=True)):
+            written += feed.fan_out(blog_id, config)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} feed entries.'))
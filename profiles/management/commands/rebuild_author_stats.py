@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from profiles import search
+from profiles.models import AuthorStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute every AuthorStats row and the author search index in one pass'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = AuthorStats.rebuild()
+            indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {updated} users; indexed {indexed} authors.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from profiles import feed
+
+
+class Command(BaseCommand):
+    help = 'Delete timeline entries past FEED MAX_AGE_DAYS or beyond MAX_ENTRIES per reader'
+
+    def handle(self, *args, **options):
+        deleted = feed.trim()
+        self.stdout.write(self.style.SUCCESS(f'Trimmed {deleted} feed entries.'))
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_author_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    AuthorStats = apps.get_model('profiles', 'AuthorStats')
+    Follow = apps.get_model('profiles', 'Follow')
+    Blog = apps.get_model('blog', 'Blog')
+    Rating = apps.get_model('blog', 'Rating')
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk) for pk in User.objects.values_list('pk', flat=True).iterator(chunk_size=2000)],
+        batch_size=2000,
+    )
+
+    def total(queryset, group_field, aggregate):
+        return Coalesce(Subquery(
+            queryset.filter(**{group_field: OuterRef('user_id')}).order_by()
+            .values(group_field).annotate(total=aggregate).values('total')
+        ), 0)
+
+    published = Blog.objects.filter(status='published')
+    AuthorStats.objects.update(
+        published_count=total(published, 'author', Count('pk')),
+        total_views=total(published, 'author', Sum('views_count')),
+        rating_sum=total(Rating.objects.all(), 'blog__author', Sum('score')),
+        rating_count=total(Rating.objects.all(), 'blog__author', Count('pk')),
+        followers_count=total(Follow.objects.all(), 'following', Count('pk')),
+        following_count=total(Follow.objects.all(), 'follower', Count('pk')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('profiles', '0001_initial'),
+        ('blog', '0006_related_blog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='author_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('published_count', models.PositiveIntegerField(default=0)),
+                ('total_views', models.PositiveBigIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'author stats',
+            },
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat, Lower, NullIf, Trim
+
+
+def backfill_directory(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    AuthorStats = apps.get_model('profiles', 'AuthorStats')
+    user = User.objects.filter(pk=OuterRef('user_id'))
+    AuthorStats.objects.update(
+        rating_average=Coalesce(
+            Cast('rating_sum', FloatField()) / NullIf('rating_count', 0),
+            0.0,
+            output_field=FloatField(),
+        ),
+        is_listed=Exists(user.filter(role__in=['author', 'admin'])),
+        sort_name=Subquery(user.values(
+            name=Lower(Trim(Concat('first_name', Value(' '), 'last_name')))
+        )[:1]),
+    )
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS profiles_author_fts "
+        "USING fts5(name, bio, tokenize='unicode61')"
+    )
+    schema_editor.execute(
+        "INSERT INTO profiles_author_fts (rowid, name, bio) "
+        "SELECT u.id, u.first_name || ' ' || u.last_name || ' ' || u.username, COALESCE(p.bio, '') "
+        "FROM accounts_user u LEFT JOIN profiles_authorprofile p ON p.user_id = u.id"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS profiles_author_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0002_author_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='is_listed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='authorstats',
+            name='rating_average',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='authorstats',
+            name='sort_name',
+            field=models.CharField(blank=True, max_length=301),
+        ),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(condition=models.Q(('is_listed', True)), fields=['sort_name', 'user'], name='authorstats_listed_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(condition=models.Q(('is_listed', True)), fields=['-published_count', '-user'], name='authorstats_listed_blogs_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(condition=models.Q(('is_listed', True)), fields=['-followers_count', '-user'], name='authorstats_listed_follows_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(condition=models.Q(('is_listed', True)), fields=['-rating_average', '-user'], name='authorstats_listed_rating_idx'),
+        ),
+        migrations.RunPython(backfill_directory, migrations.RunPython.noop),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, Exists, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Concat, Lower, NullIf, Trim
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
@@ -9,6 +11,8 @@ class AuthorProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='author_profile')
     bio = models.TextField(max_length=500, blank=True, help_text="Tell us about yourself")
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    # Resized/WebP copies of profile_picture, written by blog.images
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     website = models.URLField(blank=True, help_text="Your personal website")
     twitter = models.CharField(max_length=100, blank=True, help_text="Twitter username (without @)")
     linkedin = models.URLField(blank=True, help_text="LinkedIn profile URL")
@@ -43,18 +47,17 @@ class AuthorProfile(models.Model):
             links.append(('Instagram', f'https://instagram.com/{self.instagram}', 'fab fa-instagram'))
         return links
     
+    def get_stats(self):
+        return AuthorStats.for_user(self.user_id)
+    
     def get_blog_count(self):
-        return self.user.blogs.filter(status='published').count()
+        return self.get_stats().published_count
     
     def get_total_views(self):
-        return sum(blog.views_count for blog in self.user.blogs.filter(status='published'))
+        return self.get_stats().total_views
     
     def get_average_rating(self):
-        from blog.models import Rating
-        ratings = Rating.objects.filter(blog__author=self.user)
-        if ratings:
-            return sum(rating.score for rating in ratings) / len(ratings)
-        return 0
+        return self.get_stats().average_rating
 
 class Follow(models.Model):
     follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
@@ -64,6 +67,183 @@ class Follow(models.Model):
     class Meta:
         unique_together = ('follower', 'following')
         ordering = ['-created_at']
+        indexes = [
+            # Feed fan-out walks an author's followers in id order
+            models.Index(fields=['following', 'follower']),
+        ]
     
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
+
+
+
+class FeedEntry(models.Model):
+    """A published post in one reader's following timeline (see profiles.feed)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    blog = models.ForeignKey('blog.Blog', on_delete=models.CASCADE, related_name='+')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    published_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('user', 'blog')
+        indexes = [
+            models.Index(fields=['user', '-published_at', '-blog']),
+            models.Index(fields=['published_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.blog_id} in {self.user_id}'s feed"
+
+class AuthorStats(models.Model):
+    """
+    Materialized per-author counters for profile pages.
+
+    Kept current incrementally by blog.signals (publishing, ratings),
+    blog.viewcounts (view flushes) and profiles.signals (follows);
+    ``rebuild()`` recomputes every row in one pass.  Incremental updates
+    only touch existing rows; a missing row is computed in full the first
+    time ``for_user()`` asks for it.  ``total_views`` and
+    ``published_count`` cover published posts only, while the rating totals
+    cover ratings on all of the author's posts, as the old per-request
+    aggregates did.
+
+    The row doubles as the author directory entry: ``is_listed`` and
+    ``sort_name`` mirror the user's role and name, so every sort of
+    ``authors_list_view`` is a walk over one index of this table.
+    """
+    LISTED_ROLES = ('author', 'admin')
+    DIRECTORY_SOURCE_FIELDS = {'role', 'first_name', 'last_name', 'username'}
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='author_stats')
+    published_count = models.PositiveIntegerField(default=0)
+    total_views = models.PositiveBigIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(default=0)
+    is_listed = models.BooleanField(default=False)
+    sort_name = models.CharField(max_length=301, blank=True)
+    
+    class Meta:
+        verbose_name_plural = 'author stats'
+        # One partial index over listed authors per authors_list_view sort,
+        # keyset-paginated on user id
+        indexes = [
+            models.Index(fields=['sort_name', 'user'], condition=Q(is_listed=True), name='authorstats_listed_name_idx'),
+            models.Index(fields=['-published_count', '-user'], condition=Q(is_listed=True), name='authorstats_listed_blogs_idx'),
+            models.Index(fields=['-followers_count', '-user'], condition=Q(is_listed=True), name='authorstats_listed_follows_idx'),
+            models.Index(fields=['-rating_average', '-user'], condition=Q(is_listed=True), name='authorstats_listed_rating_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Stats for {self.user_id}"
+    
+    @property
+    def average_rating(self):
+        return self.rating_average
+    
+    @staticmethod
+    def _rating_average(rating_sum, rating_count):
+        return Coalesce(
+            Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+            0.0,
+            output_field=FloatField(),
+        )
+    
+    @classmethod
+    def _directory_values(cls):
+        """UPDATE expressions copying role and name from the user row"""
+        user = User.objects.filter(pk=OuterRef('user_id'))
+        return {
+            'is_listed': Exists(user.filter(role__in=cls.LISTED_ROLES)),
+            'sort_name': Subquery(user.values(
+                name=Lower(Trim(Concat('first_name', Value(' '), 'last_name')))
+            )[:1]),
+        }
+    
+    @classmethod
+    def sync_directory(cls, user_ids=None):
+        """Refresh the directory columns after a user's role or name changed"""
+        stats = cls.objects.all()
+        if user_ids is not None:
+            stats = stats.filter(user_id__in=user_ids)
+        return stats.update(**cls._directory_values())
+    
+    @classmethod
+    def for_user(cls, user_id):
+        try:
+            return cls.objects.get(user_id=user_id)
+        except cls.DoesNotExist:
+            cls.rebuild(user_ids=[user_id])
+            return cls.objects.get(user_id=user_id)
+    
+    @classmethod
+    def apply_delta(cls, user_id, **deltas):
+        """Add ``deltas`` (field -> increment) to one author's row with a single UPDATE"""
+        cls.objects.filter(user_id=user_id).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+    
+    @classmethod
+    def apply_blog_rating_delta(cls, blog_id, score_delta, count_delta):
+        """Apply a rating change on ``blog_id`` to its author's totals"""
+        from blog.models import Blog
+        
+        author = Blog.objects.filter(pk=blog_id).values('author_id')
+        new_sum = F('rating_sum') + score_delta
+        new_count = F('rating_count') + count_delta
+        cls.objects.filter(user_id=Subquery(author)).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_average=cls._rating_average(new_sum, new_count),
+        )
+    
+    @classmethod
+    def apply_publish_delta(cls, blog_id, sign):
+        """Count ``blog_id`` in (sign=1) or out of (sign=-1) its author's published totals"""
+        from blog.models import Blog
+        
+        blog = Blog.objects.filter(pk=blog_id)
+        cls.objects.filter(user_id=Subquery(blog.values('author_id'))).update(
+            published_count=F('published_count') + sign,
+            total_views=F('total_views') + sign * Subquery(blog.values('views_count')),
+        )
+    
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """Recompute the rows for ``user_ids`` (every user if None) from the source tables"""
+        from blog.models import Blog, Rating
+        
+        users = User.objects.all()
+        if user_ids is not None:
+            users = users.filter(pk__in=user_ids)
+        missing = users.filter(author_stats__isnull=True).values_list('pk', flat=True)
+        cls.objects.bulk_create(
+            [cls(user_id=pk) for pk in missing.iterator(chunk_size=2000)],
+            batch_size=2000,
+            ignore_conflicts=True,
+        )
+        
+        def total(queryset, group_field, aggregate):
+            return Coalesce(Subquery(
+                queryset.filter(**{group_field: OuterRef('user_id')}).order_by()
+                .values(group_field).annotate(total=aggregate).values('total')
+            ), 0)
+        
+        published = Blog.objects.filter(status='published')
+        rating_sum = total(Rating.objects.all(), 'blog__author', Sum('score'))
+        rating_count = total(Rating.objects.all(), 'blog__author', Count('pk'))
+        stats = cls.objects.all()
+        if user_ids is not None:
+            stats = stats.filter(user_id__in=user_ids)
+        return stats.update(
+            published_count=total(published, 'author', Count('pk')),
+            total_views=total(published, 'author', Sum('views_count')),
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating_average=cls._rating_average(rating_sum, rating_count),
+            followers_count=total(Follow.objects.all(), 'following', Count('pk')),
+            following_count=total(Follow.objects.all(), 'follower', Count('pk')),
+            **cls._directory_values(),
+        )
@@ -0,0 +1,96 @@
+"""
+Indexed name/bio search for the author directory.
+
+On SQLite every user is mirrored into an FTS5 table (``profiles_author_fts``,
+rowid = user id) holding their name and username plus their profile bio.
+It is kept in sync from profiles.signals and rebuilt by the
+``rebuild_author_stats`` command.  Other databases fall back to
+``icontains`` filters.
+"""
+from django.db import connection
+from django.db.models import Q
+
+from blog.search import build_match_query
+
+FTS_TABLE = 'profiles_author_fts'
+
+# Up to this many matches are fetched up front and filtered by primary key
+SMALL_MATCH_LIMIT = 1000
+
+# Name and bio of one user (or all users) as stored in the index
+INDEX_SELECT_SQL = (
+    "SELECT u.id, u.first_name || ' ' || u.last_name || ' ' || u.username, COALESCE(p.bio, '') "
+    "FROM accounts_user u LEFT JOIN profiles_authorprofile p ON p.user_id = u.id"
+)
+
+_fts_available = None
+
+
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def search_authors(queryset, query):
+    """Restrict an ``AuthorStats`` queryset to authors whose name or bio matches ``query``"""
+    if not fts_available():
+        return queryset.filter(
+            Q(user__first_name__icontains=query) |
+            Q(user__last_name__icontains=query) |
+            Q(user__username__icontains=query) |
+            Q(user__author_profile__bio__icontains=query)
+        )
+    match = build_match_query(query)
+    if not match:
+        return queryset.none()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM {fts} WHERE {fts} MATCH %s LIMIT %s'.format(fts=FTS_TABLE),
+            [match, SMALL_MATCH_LIMIT + 1],
+        )
+        user_ids = [row[0] for row in cursor.fetchall()]
+    if len(user_ids) <= SMALL_MATCH_LIMIT:
+        # Few matches: look them up by primary key and sort just those
+        return queryset.filter(user_id__in=user_ids)
+    # Many matches: the unary plus keeps SQLite from driving the query off
+    # the match set, so it walks the sort index and probes the set instead
+    return queryset.extra(
+        where=['+{stats}.user_id IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)'.format(
+            stats=queryset.model._meta.db_table, fts=FTS_TABLE,
+        )],
+        params=[match],
+    )
+
+
+def index_author(user_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [user_id])
+        cursor.execute(
+            'INSERT INTO {} (rowid, name, bio) {} WHERE u.id = %s'.format(FTS_TABLE, INDEX_SELECT_SQL),
+            [user_id],
+        )
+
+
+def unindex_author(user_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [user_id])
+
+
+def rebuild_index():
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+        cursor.execute('INSERT INTO {} (rowid, name, bio) {}'.format(FTS_TABLE, INDEX_SELECT_SQL))
+        indexed = cursor.rowcount
+        cursor.execute("INSERT INTO {fts} ({fts}) VALUES ('optimize')".format(fts=FTS_TABLE))
+    return indexed
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from blog import images
+from blog.pagecache import invalidate_tags
+from . import feed, search
+from .models import AuthorProfile, AuthorStats, Follow, User
+
+
+@receiver(post_save, sender=AuthorProfile)
+@receiver(post_delete, sender=AuthorProfile)
+def author_profile_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_author(instance.user_id)
+    if kwargs['signal'] is post_save:
+        images.image_saved(instance, 'profile_picture')
+    else:
+        images.image_deleted(instance, 'profile_picture')
+    tag = f'author:{instance.user_id}'
+    transaction.on_commit(lambda: invalidate_tags(tag))
+
+
+@receiver(images.variants_updated, sender=AuthorProfile)
+def profile_picture_variants_updated(sender, pk, **kwargs):
+    user_id = AuthorProfile.objects.filter(pk=pk).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_tags(f'author:{user_id}')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        AuthorStats.objects.bulk_create([AuthorStats(user=instance)], ignore_conflicts=True)
+    elif update_fields is not None and not AuthorStats.DIRECTORY_SOURCE_FIELDS & set(update_fields):
+        # e.g. the last_login update on every login
+        return
+    AuthorStats.sync_directory([instance.pk])
+    search.index_author(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    search.unindex_author(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.apply_delta(instance.following_id, followers_count=1)
+        AuthorStats.apply_delta(instance.follower_id, following_count=1)
+        feed.follow_added(instance.follower_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    AuthorStats.apply_delta(instance.following_id, followers_count=-1)
+    AuthorStats.apply_delta(instance.follower_id, following_count=-1)
+    feed.follow_removed(instance.follower_id, instance.following_id)
@@ -1,3 +1,175 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from blog.benchmarks import stand_in_template_settings
+from blog.models import Blog, Rating
+from blog.viewcounts import write_counts
+from blog_site.testing import QueryBudgetMixin
+
+from . import feed
+from .models import AuthorStats, FeedEntry, Follow
+
+User = get_user_model()
+
+STATS_FIELDS = [
+    field.name for field in AuthorStats._meta.concrete_fields if not field.primary_key
+]
+
+
+def make_user(username, role='reader', **extra):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='password', role=role, **extra
+    )
+
+
+def make_blog(author, title, status='published'):
+    return Blog.objects.create(author=author, title=title, body=f'{title} body text', status=status)
+
+
+class AuthorStatsTests(TestCase):
+    """The incrementally maintained AuthorStats rows against a full rebuild"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice', role='author', first_name='Alice', last_name='Liddell')
+        self.bob = make_user('bob', role='author')
+        self.readers = [make_user(f'reader{number}') for number in range(3)]
+
+    def snapshot(self):
+        return {row['user']: row for row in AuthorStats.objects.values('user', *STATS_FIELDS)}
+
+    def assertStatsMatchRebuild(self):
+        incremental = self.snapshot()
+        AuthorStats.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_publishing_views_and_ratings(self):
+        published = make_blog(self.alice, 'Published')
+        draft = make_blog(self.alice, 'Draft', status='draft')
+        other = make_blog(self.bob, 'Bob post')
+        write_counts({published.pk: 5, other.pk: 2})
+        for score, reader in enumerate(self.readers, 2):
+            Rating.objects.create(user=reader, blog=published, score=score)
+        Rating.objects.create(user=self.readers[0], blog=draft, score=1)
+        self.assertStatsMatchRebuild()
+
+        draft.status = 'published'
+        draft.save()
+        published = Blog.objects.get(pk=published.pk)
+        published.status = 'draft'
+        published.save()
+        Rating.objects.filter(user=self.readers[1]).delete()
+        self.assertStatsMatchRebuild()
+
+        stats = AuthorStats.objects.get(user=self.alice)
+        self.assertEqual(stats.published_count, 1)
+        self.assertEqual(stats.rating_count, 3)
+
+    def test_moving_a_post_to_another_author(self):
+        blog = make_blog(self.alice, 'Moving')
+        Rating.objects.create(user=self.readers[0], blog=blog, score=4)
+        blog = Blog.objects.get(pk=blog.pk)
+        blog.author = self.bob
+        blog.save()
+        self.assertStatsMatchRebuild()
+        self.assertEqual(AuthorStats.objects.get(user=self.bob).rating_sum, 4)
+
+    def test_follows(self):
+        for reader in self.readers:
+            Follow.objects.create(follower=reader, following=self.alice)
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        Follow.objects.filter(follower=self.readers[0]).delete()
+        self.assertStatsMatchRebuild()
+        self.assertEqual(AuthorStats.objects.get(user=self.alice).followers_count, 2)
+
+    def test_directory_columns_follow_role_and_name(self):
+        self.readers[0].role = 'author'
+        self.readers[0].first_name = 'Zed'
+        self.readers[0].save()
+        self.bob.role = 'reader'
+        self.bob.save(update_fields=['role'])
+        self.assertStatsMatchRebuild()
+        listed = AuthorStats.objects.filter(is_listed=True).order_by('sort_name')
+        self.assertEqual([stats.user_id for stats in listed], [self.alice.pk, self.readers[0].pk])
+        self.assertEqual(listed[0].sort_name, 'alice liddell')
+
+
+class FeedTests(TestCase):
+    """Fan-out on write (run inline by the test settings) and the timeline reads"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author', role='author')
+        self.reader = make_user('reader')
+        Follow.objects.create(follower=self.reader, following=self.author)
+
+    def test_publishing_fans_out_to_followers(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            blog = make_blog(self.author, 'Fresh')
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader, blog=blog).exists())
+
+        blog.status = 'draft'
+        blog.save()
+        self.assertFalse(FeedEntry.objects.filter(blog=blog).exists())
+
+    def test_timeline_pages(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            blogs = [make_blog(self.author, f'Post {number}') for number in range(5)]
+        seen, token = [], None
+        while True:
+            page = feed.get_timeline(self.reader, token, per_page=2)
+            seen += [blog.pk for blog in page]
+            token = page.next_cursor
+            if token is None:
+                break
+        self.assertEqual(seen, [blog.pk for blog in reversed(blogs)])
+
+    def test_following_backfills_and_unfollowing_clears(self):
+        other = make_user('other', role='author')
+        blog = make_blog(other, 'Older post')
+        Follow.objects.create(follower=self.reader, following=other)
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader, blog=blog).exists())
+        Follow.objects.filter(follower=self.reader, following=other).delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader, author=other).exists())
+
+
+@override_settings(TEMPLATES=stand_in_template_settings())
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every budgeted profiles page, with enough rows per page for an N+1 to show"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author', role='author', first_name='Ada')
+        self.reader = make_user('reader')
+        others = [make_user(f'writer{number}', role='author') for number in range(8)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(8):
+                make_blog(self.author, f'Post {number}')
+        for other in others:
+            Follow.objects.create(follower=other, following=self.author)
+            Follow.objects.create(follower=self.author, following=other)
+            make_blog(other, f'Post by {other.username}')
+        Follow.objects.create(follower=self.reader, following=self.author)
+
+    def test_authors_list(self):
+        self.assertWithinQueryBudget('profiles:authors_list')
+        self.assertWithinQueryBudget('profiles:authors_list', data={'sort': 'followers'})
+
+    def test_author_detail(self):
+        self.assertWithinQueryBudget('profiles:author_detail', kwargs={'username': self.author.username})
+        self.client.force_login(self.reader)
+        self.assertWithinQueryBudget('profiles:author_detail', kwargs={'username': self.author.username})
+
+    def test_timeline(self):
+        self.client.force_login(self.reader)
+        response = self.assertWithinQueryBudget('profiles:timeline')
+        self.assertEqual(len(response.context['page_obj']), 8)
+
+    def test_followers(self):
+        self.client.force_login(self.reader)
+        self.assertWithinQueryBudget('profiles:followers', kwargs={'username': self.author.username})
+
+    def test_following(self):
+        self.client.force_login(self.reader)
+        self.assertWithinQueryBudget('profiles:following', kwargs={'username': self.author.username})
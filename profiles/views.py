@@ -4,49 +4,53 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.contrib.auth import get_user_model
-from django.db.models import Avg, Count, Q
-from .models import AuthorProfile, Follow
+from . import feed, search
+from .models import AuthorProfile, AuthorStats, Follow
 from .forms import AuthorProfileForm
 from blog.models import Blog
+from blog.pagination import paginate
 
 User = get_user_model()
 
 def author_detail_view(request, username):
-    author = get_object_or_404(User, username=username)
-    
-    # Get or create author profile
-    profile, created = AuthorProfile.objects.get_or_create(user=author)
+    # Profile and statistics come with the user in one joined query
+    author = get_object_or_404(
+        User.objects.select_related('author_profile', 'author_stats'), username=username
+    )
+    
+    # An author who never edited their profile gets a blank one; reading the
+    # page does not create it (edit_profile_view does)
+    try:
+        profile = author.author_profile
+    except AuthorProfile.DoesNotExist:
+        profile = AuthorProfile(user=author)
+    try:
+        stats = author.author_stats
+    except AuthorStats.DoesNotExist:
+        stats = AuthorStats.for_user(author.pk)
     
     # Get author's published blogs
-    blogs = Blog.objects.filter(author=author, status='published').order_by('-published_at')
+    blogs = Blog.objects.filter(author=author, status='published').select_related('category')
     
-    # Pagination
-    paginator = Paginator(blogs, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination (the published count comes from the stats row)
+    page_obj = paginate(request, blogs, 6, ('-published_at',))
     
     # Check if current user is following this author
     is_following = False
     if request.user.is_authenticated and request.user != author:
         is_following = Follow.objects.filter(follower=request.user, following=author).exists()
     
-    # Get statistics
-    total_blogs = blogs.count()
-    total_views = profile.get_total_views()
-    average_rating = profile.get_average_rating()
-    followers_count = author.followers.count()
-    following_count = author.following.count()
-    
     context = {
         'author': author,
         'profile': profile,
+        'stats': stats,
         'page_obj': page_obj,
         'is_following': is_following,
-        'total_blogs': total_blogs,
-        'total_views': total_views,
-        'average_rating': average_rating,
-        'followers_count': followers_count,
-        'following_count': following_count,
+        'total_blogs': stats.published_count,
+        'total_views': stats.total_views,
+        'average_rating': stats.average_rating,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
     }
     return render(request, 'profiles/author_detail.html', context)
 
@@ -88,12 +92,18 @@ def toggle_follow_view(request, username):
         return JsonResponse({
             'is_following': is_following, 
             'message': message,
-            'followers_count': author.followers.count()
+            'followers_count': AuthorStats.for_user(author.pk).followers_count
         })
     
     messages.success(request, message)
     return redirect('profiles:author_detail', username=username)
 
+@login_required
+def timeline_view(request):
+    # Newest posts from followed authors, read from the fanned-out feed
+    page_obj = feed.paginate_timeline(request, per_page=10)
+    return render(request, 'profiles/timeline.html', {'page_obj': page_obj})
+
 @login_required
 def followers_view(request, username):
     author = get_object_or_404(User, username=username)
@@ -124,44 +134,36 @@ def following_view(request, username):
         'title': 'Following'
     })
 
-def authors_list_view(request):
-    # Get all authors (users with author or admin role)
-    authors = User.objects.filter(role__in=['author', 'admin']).select_related('author_profile')
-    
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        authors = authors.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(username__icontains=search_query) |
-            Q(author_profile__bio__icontains=search_query)
-        )
-    
-    # Sorting
+def authors_list_ordering(request):
+    """The directory sort requested, and its ordering over AuthorStats"""
     sort_by = request.GET.get('sort', 'name')
     if sort_by == 'blogs':
         # Sort by number of published blogs
-        authors = authors.annotate(
-            blog_count=Count('blogs', filter=Q(blogs__status='published'))
-        ).order_by('-blog_count')
+        ordering = ('-published_count',)
     elif sort_by == 'followers':
         # Sort by number of followers
-        authors = authors.annotate(
-            followers_count=Count('followers')
-        ).order_by('-followers_count')
+        ordering = ('-followers_count',)
     elif sort_by == 'rating':
         # Sort by average rating
-        authors = authors.annotate(
-            avg_rating=Avg('blogs__ratings__score')
-        ).order_by('-avg_rating')
+        ordering = ('-rating_average',)
     else:  # name
-        authors = authors.order_by('first_name', 'last_name')
+        ordering = ('sort_name',)
+    return sort_by, ordering
+
+def authors_list_view(request):
+    # The directory is served from AuthorStats, whose stored sort keys are indexed
+    authors = AuthorStats.objects.filter(is_listed=True).select_related('user', 'user__author_profile')
     
-    # Pagination
-    paginator = Paginator(authors, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Search functionality
+    search_query = request.GET.get('search', '')
+    if search_query:
+        authors = search.search_authors(authors, search_query)
+    
+    sort_by, ordering = authors_list_ordering(request)
+    
+    # Keyset pagination; the page lists users, each with its stats attached
+    page_obj = paginate(request, authors, 12, ordering)
+    page_obj.object_list = [stats.user for stats in page_obj.object_list]
     
     context = {
         'page_obj': page_obj,